@@ -1,9 +1,22 @@
 __version__ = '0.2.0'
 
-from .tools import (
-    PXTextRegion,
-    PXTextLine,
-    PXWord,
-    DisplayWord,
-    IdDispenser
-)
+# the re-exports from tools are resolved on first access, so importing a light submodule like
+# globalise_tools.run_state does not pull in pagexml, intervaltree and dataclasses_json
+_TOOLS_EXPORTS = {
+    'PXTextRegion',
+    'PXTextLine',
+    'PXWord',
+    'DisplayWord',
+    'IdDispenser'
+}
+
+
+def __getattr__(name):
+    if name in _TOOLS_EXPORTS:
+        from . import tools
+        return getattr(tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_TOOLS_EXPORTS))
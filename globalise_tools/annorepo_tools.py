@@ -0,0 +1,257 @@
+import hashlib
+import random
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from globalise_tools import json_codec
+from globalise_tools.run_state import RunState
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+PAYLOAD_TOO_LARGE = 413
+
+
+class BatchUploadError(Exception):
+    pass
+
+
+@dataclass
+class Batch:
+    start: int
+    end: int
+    payloads: list[bytes]
+
+    @property
+    def key(self) -> str:
+        return f"{self.start}-{self.end}"
+
+    def body(self) -> bytes:
+        return b"[" + b",".join(self.payloads) + b"]"
+
+    def digest(self) -> str:
+        return _digest(self.payloads)
+
+    def halves(self) -> tuple['Batch', 'Batch']:
+        middle = len(self.payloads) // 2
+        return (Batch(self.start, self.start + middle, self.payloads[:middle]),
+                Batch(self.start + middle, self.end, self.payloads[middle:]))
+
+
+@dataclass
+class UploadReport:
+    uploaded: int = 0
+    skipped: int = 0
+    batches: int = 0
+    retries: int = 0
+    batch_sizes: list[int] = field(default_factory=list)
+
+
+class AdaptiveBatchSize:
+    """
+    Grows the batch size while batches come back fast, and halves it when they are slow or fail.
+    """
+
+    def __init__(self, initial: int = 200, minimum: int = 10, maximum: int = 5000, target_seconds: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.value = max(minimum, min(initial, maximum))
+
+    def observe(self, batch_size: int, seconds: float):
+        if seconds > self.target_seconds:
+            self.value = max(self.minimum, min(self.value, batch_size) // 2)
+        elif seconds < self.target_seconds / 2 and batch_size >= self.value:
+            self.value = min(self.maximum, self.value + max(1, self.value // 2))
+
+    def failed(self):
+        self.value = max(self.minimum, self.value // 2)
+
+
+class BulkUploader:
+    """
+    Uploads annotations to an AnnoRepo container with the annotations-batch endpoint, with up to max_in_flight batch
+    requests running at the same time over one pooled session.
+
+    The batch size adapts to the time the server takes per batch (see AdaptiveBatchSize), and a batch never exceeds
+    max_payload_bytes. Batches failing with a connection error, a timeout or a 429/5xx response are retried with
+    exponential backoff; batches that are too large for the server (413) are split in two.
+
+    With a journal_path, every uploaded batch is recorded (as the range of positions of its annotations in the
+    upload, a digest of its annotations, and the annotation names AnnoRepo gave them), and a later upload of the same
+    annotations, in the same order, skips everything that was uploaded before. When the annotations at a recorded
+    range differ from the ones uploaded before, the upload is refused with a BatchUploadError.
+    """
+
+    def __init__(self, base_uri: str, container_name: str, api_key: str = None, max_in_flight: int = 4,
+                 batch_size: AdaptiveBatchSize = None, max_payload_bytes: int = 8 * 1024 * 1024,
+                 max_retries: int = 5, backoff_seconds: float = 1.0, timeout_in_seconds: float = 60,
+                 journal_path: str = None):
+        self.batch_url = f"{base_uri.rstrip('/')}/services/{container_name}/annotations-batch"
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size or AdaptiveBatchSize()
+        self.max_payload_bytes = max_payload_bytes
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_in_seconds = timeout_in_seconds
+        self.journal = RunState(journal_path) if journal_path else None
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight))
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def upload(self, annotations: Iterable[dict[str, any]]) -> UploadReport:
+        report = UploadReport()
+        in_flight: dict[Future, Batch] = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="annorepo-upload") as executor:
+            try:
+                for batch in self._batches(annotations, report):
+                    while len(in_flight) >= self.max_in_flight:
+                        self._collect(in_flight, report)
+                    in_flight[executor.submit(self._post, batch)] = batch
+                while in_flight:
+                    self._collect(in_flight, report)
+            finally:
+                # record what did get uploaded, also when a batch failed for good
+                while in_flight:
+                    self._collect(in_flight, report, raise_errors=False)
+        return report
+
+    def _batches(self, annotations: Iterable[dict[str, any]], report: UploadReport) -> Iterator[Batch]:
+        done = self._uploaded_ranges()
+        batch = None
+        size = 0
+        uploaded_before = []
+        for i, annotation in enumerate(annotations):
+            payload = json_codec.encode(annotation, ensure_ascii=False, separators=(",", ":")).encode('utf8')
+            uploaded_range = done.range_of(i)
+            if uploaded_range:
+                start, end, digest = uploaded_range
+                uploaded_before.append(payload)
+                if i + 1 == end:
+                    if _digest(uploaded_before) != digest:
+                        raise BatchUploadError(f"annotations {start}-{end} differ from the ones uploaded before"
+                                               f" according to {self.journal.path}; use a new journal")
+                    uploaded_before = []
+                report.skipped += 1
+                continue
+            if batch and (batch.end != i or len(batch.payloads) >= self.batch_size.value
+                          or size + len(payload) > self.max_payload_bytes):
+                yield batch
+                batch = None
+            if batch is None:
+                batch = Batch(i, i, [])
+                size = 0
+            batch.payloads.append(payload)
+            batch.end = i + 1
+            size += len(payload)
+        if batch:
+            yield batch
+
+    def _uploaded_ranges(self) -> '_UploadedRanges':
+        if self.journal is None:
+            return _UploadedRanges([])
+        return _UploadedRanges([(v["start"], v["end"], v.get("digest")) for _, v in self.journal.items()])
+
+    def _collect(self, in_flight: dict[Future, Batch], report: UploadReport, raise_errors: bool = True):
+        done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight.pop(future)
+            results, retries, error = future.result()
+            report.retries += retries
+            for batch, seconds, annotation_names in results:
+                self.batch_size.observe(len(batch.payloads), seconds)
+                report.uploaded += len(batch.payloads)
+                report.batches += 1
+                report.batch_sizes.append(len(batch.payloads))
+                if self.journal is not None:
+                    self.journal[batch.key] = {"start": batch.start, "end": batch.end, "digest": batch.digest(),
+                                               "annotation_names": annotation_names}
+            if error:
+                if raise_errors:
+                    raise BatchUploadError(error)
+                logger.error(error)
+
+    def _post(self, batch: Batch) -> tuple[list[tuple[Batch, float, list[str]]], int, Optional[str]]:
+        # the uploaded (parts of the) batch, the number of retries, and the error when (a part of) it failed for good
+        results = []
+        retries = 0
+        pending = [batch]
+        while pending:
+            current = pending.pop(0)
+            attempt = 0
+            while True:
+                before = time.perf_counter()
+                try:
+                    response = self.session.post(self.batch_url, data=current.body(),
+                                                 timeout=self.timeout_in_seconds)
+                    status_code = response.status_code
+                    error = f"{status_code} {response.text[:200]}"
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    status_code = None
+                    error = str(e)
+                seconds = time.perf_counter() - before
+                if status_code is not None and 200 <= status_code < 300:
+                    results.append((current, seconds, _annotation_names(response)))
+                    break
+                if status_code == PAYLOAD_TOO_LARGE and len(current.payloads) > 1:
+                    self.batch_size.failed()
+                    pending[:0] = current.halves()
+                    break
+                if (status_code is not None and status_code not in RETRY_STATUS_CODES) \
+                        or attempt >= self.max_retries:
+                    return results, retries, f"uploading annotations {current.key} failed: {error}"
+                self.batch_size.failed()
+                attempt += 1
+                retries += 1
+                delay = self.backoff_seconds * 2 ** (attempt - 1) * (0.5 + random.random())
+                logger.warning(f"uploading annotations {current.key} failed ({error}), retrying in {delay:.1f} s")
+                time.sleep(delay)
+        return results, retries, None
+
+
+def _annotation_names(response: requests.Response) -> list[str]:
+    try:
+        return [r.get("annotationName") for r in response.json()]
+    except (ValueError, AttributeError, TypeError):
+        return []
+
+
+def _digest(payloads: list[bytes]) -> str:
+    h = hashlib.sha256()
+    for payload in payloads:
+        h.update(len(payload).to_bytes(8, 'little'))
+        h.update(payload)
+    return h.hexdigest()
+
+
+class _UploadedRanges:
+    # the sorted, disjoint [start, end) ranges of the annotations uploaded before, with the digest of their payloads
+
+    def __init__(self, ranges: list[tuple[int, int, str]]):
+        self.ranges = sorted(ranges)
+        self.starts = [start for start, _, _ in self.ranges]
+
+    def range_of(self, i: int) -> Optional[tuple[int, int, str]]:
+        index = bisect_right(self.starts, i) - 1
+        if index >= 0 and i < self.ranges[index][1]:
+            return self.ranges[index]
+        return None
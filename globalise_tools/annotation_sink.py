@@ -0,0 +1,101 @@
+import gzip
+import io
+import os
+from typing import Iterable, Optional, Type, TextIO
+
+from loguru import logger
+
+from globalise_tools import json_codec
+
+JSON = "json"
+NDJSON = "ndjson"
+
+_NDJSON_EXTENSIONS = (".jsonl", ".ndjson")
+_COMPACT_SEPARATORS = (",", ":")
+
+
+class AnnotationSink:
+    """
+    Writes annotations to a file one by one, instead of dumping a list of all of them at the end.
+
+    The file is either a json array (the default), written so it is identical to a json.dump of the list, or ndjson
+    with one compact annotation per line (for paths ending in .jsonl or .ndjson, or with output_format=NDJSON).
+    Paths ending in .gz are gzip-compressed, paths ending in .zst zstd-compressed (which needs the zstandard package,
+    installed with the zstd extra).
+
+    The file is flushed every flush_every annotations, so the output grows on disk while a run is in progress.
+    The json array is closed when the sink is, also when leaving the with block on an error.
+    """
+
+    def __init__(self, path: str, output_format: Optional[str] = None, encoder_cls: Optional[Type] = None,
+                 indent: Optional[int] = None, ensure_ascii: bool = False, flush_every: int = 1000):
+        self.path = path
+        self.output_format = output_format or _format_for(path)
+        if self.output_format not in (JSON, NDJSON):
+            raise ValueError(f"unknown output format: {self.output_format}")
+        self.flush_every = flush_every
+        self.count = 0
+        # ndjson has one annotation per line, so it is never indented
+        self._indent = indent if self.output_format == JSON else None
+        self._ensure_ascii = ensure_ascii
+        self._default = encoder_cls().default if encoder_cls else None
+        self._separators = _COMPACT_SEPARATORS if self.output_format == NDJSON else None
+        self._padding = "\n" + " " * self._indent if self._indent is not None else ""
+        logger.info(f"=> {path}")
+        self._file = _open_text(path)
+        if self.output_format == JSON:
+            self._file.write("[")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, annotation: any):
+        encoded = json_codec.encode(annotation, default=self._default, indent=self._indent,
+                                    ensure_ascii=self._ensure_ascii, separators=self._separators)
+        if self.output_format == NDJSON:
+            self._file.write(encoded)
+            self._file.write("\n")
+        else:
+            if self.count > 0:
+                self._file.write("," if self._padding else ", ")
+            if self._padding:
+                encoded = self._padding + encoded.replace("\n", self._padding)
+            self._file.write(encoded)
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def write_all(self, annotations: Iterable[any]):
+        for annotation in annotations:
+            self.write(annotation)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.output_format == JSON:
+            if self.count > 0 and self._padding:
+                self._file.write("\n")
+            self._file.write("]")
+        self._file.close()
+
+
+def _format_for(path: str) -> str:
+    base, extension = os.path.splitext(path)
+    if extension in (".gz", ".zst"):
+        extension = os.path.splitext(base)[1]
+    return NDJSON if extension in _NDJSON_EXTENSIONS else JSON
+
+
+def _open_text(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f"writing {path} requires the zstandard package (install the zstd extra)") from e
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf8")
+    return open(path, "w", encoding="utf8")
@@ -0,0 +1,200 @@
+import json
+import mmap
+import os
+import tempfile
+from typing import Optional, Iterator, Callable, IO
+
+from loguru import logger
+
+DEFAULT_DOCUMENT_DATA_PATH = "data/document_data.json"
+
+
+class DocumentDataStore:
+    """
+    Read access to data/document_data.json without loading all of it into every process.
+
+    On first use, the json is converted once into two sidecar files: <path>.entries, with every document entry
+    as a separate compact json blob, and <path>.index.json, with the offset, length and plain_text_md5 of every entry.
+    The entries file is memory-mapped, so forked workers share its pages, and an entry is only parsed when it is
+    requested. Entries added at runtime are kept in memory and can be retrieved with added_items().
+
+    Call prepare() in the parent process before starting workers, so the sidecar files are built (or validated)
+    once, instead of by every worker.
+    """
+
+    def __init__(self, path: str = DEFAULT_DOCUMENT_DATA_PATH):
+        self.path = path
+        self._offsets = None
+        self._md5_index = None
+        self._mmap = None
+        self._added = {}
+        self._added_md5_index = {}
+
+    def __getstate__(self):
+        # only pass the path and the runtime additions when pickled, the sidecar files are reopened lazily
+        return {'path': self.path, '_added': self._added}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+        self._added = state['_added']
+        self._added_md5_index = {data['plain_text_md5']: document_id for document_id, data in self._added.items()}
+
+    def __getitem__(self, document_id: str) -> dict[str, any]:
+        if document_id in self._added:
+            return self._added[document_id]
+        self._ensure_loaded()
+        offset, length, _ = self._offsets[document_id]
+        return json.loads(self._mmap[offset:offset + length])
+
+    def __setitem__(self, document_id: str, data: dict[str, any]):
+        self._added[document_id] = data
+        self._added_md5_index[data['plain_text_md5']] = document_id
+
+    def __contains__(self, document_id: str) -> bool:
+        self._ensure_loaded()
+        return document_id in self._added or document_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def keys(self) -> list[str]:
+        self._ensure_loaded()
+        keys = list(self._offsets.keys())
+        keys.extend(k for k in self._added.keys() if k not in self._offsets)
+        return keys
+
+    def items(self) -> Iterator[tuple[str, dict[str, any]]]:
+        for document_id in self.keys():
+            yield document_id, self[document_id]
+
+    def added_items(self) -> dict[str, dict[str, any]]:
+        return dict(self._added)
+
+    def take_added_items(self) -> dict[str, dict[str, any]]:
+        added = self._added
+        self._added = {}
+        self._added_md5_index = {}
+        return added
+
+    def update(self, entries: dict[str, dict[str, any]]):
+        for document_id, data in entries.items():
+            self[document_id] = data
+
+    def plain_text_md5(self, document_id: str) -> Optional[str]:
+        if document_id in self._added:
+            return self._added[document_id]['plain_text_md5']
+        self._ensure_loaded()
+        if document_id in self._offsets:
+            return self._offsets[document_id][2]
+        return None
+
+    def document_id_for_md5(self, md5: str) -> Optional[str]:
+        if md5 in self._added_md5_index:
+            return self._added_md5_index[md5]
+        self._ensure_loaded()
+        return self._md5_index.get(md5, None)
+
+    def find_by_md5(self, md5: str) -> tuple[Optional[str], Optional[dict[str, any]]]:
+        document_id = self.document_id_for_md5(md5)
+        if document_id is None:
+            return None, None
+        return document_id, self[document_id]
+
+    def prepare(self):
+        """
+        Build the sidecar files when they are missing or stale, and open them.
+        """
+        self._ensure_loaded()
+
+    def save(self, path: Optional[str] = None):
+        """
+        Write the stored entries plus the runtime additions to a json file, and the sidecar files for it,
+        so the next run reading it does not have to rebuild them.
+        Without a path, the json file of this store is rewritten, and the additions become stored entries.
+        """
+        path = path or self.path
+        document_data = {document_id: data for document_id, data in self.items()}
+        logger.info(f"=> {path}")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _write_replacing(path, 'w', lambda f: json.dump(document_data, f, ensure_ascii=False))
+        if path == self.path:
+            self._close()
+            self._added = {}
+            self._added_md5_index = {}
+        self._write_sidecar_files(document_data, path)
+
+    def _close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._mmap = None
+        self._offsets = None
+        self._md5_index = None
+
+    def _ensure_loaded(self):
+        if self._offsets is not None:
+            return
+        entries_path = f"{self.path}.entries"
+        index_path = f"{self.path}.index.json"
+        index = self._read_index(index_path)
+        if not index:
+            index = self._build_sidecar_files()
+        self._offsets = {}
+        self._md5_index = {}
+        for document_id, (offset, length, md5) in index['entries'].items():
+            self._offsets[document_id] = (offset, length, md5)
+            self._md5_index[md5] = document_id
+        if os.path.getsize(entries_path) > 0:
+            with open(entries_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._mmap = b''
+
+    def _read_index(self, index_path: str) -> Optional[dict[str, any]]:
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('source_mtime_ns') != os.stat(self.path).st_mtime_ns:
+            return None
+        return index
+
+    def _build_sidecar_files(self) -> dict[str, any]:
+        logger.info(f"<= {self.path}")
+        with open(self.path) as f:
+            document_data = json.load(f)
+        return self._write_sidecar_files(document_data, self.path)
+
+    @staticmethod
+    def _write_sidecar_files(document_data: dict[str, dict[str, any]], path: str) -> dict[str, any]:
+        entries_path = f"{path}.entries"
+        index_path = f"{path}.index.json"
+        index = {'source_mtime_ns': os.stat(path).st_mtime_ns, 'entries': {}}
+
+        def write_entries(f: IO):
+            offset = 0
+            for document_id, data in document_data.items():
+                blob = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+                f.write(blob)
+                index['entries'][document_id] = (offset, len(blob), data['plain_text_md5'])
+                offset += len(blob)
+
+        logger.info(f"=> {entries_path}")
+        _write_replacing(entries_path, 'wb', write_entries)
+        logger.info(f"=> {index_path}")
+        _write_replacing(index_path, 'w', lambda f: json.dump(index, f))
+        return index
+
+
+def _write_replacing(path: str, mode: str, write: Callable[[IO], None]):
+    # write to a temporary file with a unique name next to path, then move it into place, so processes writing
+    # the same file at the same time do not trip over each other's temporary files
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,15 +1,20 @@
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import TextIO, Union
+from typing import TextIO, Union, Iterable, Callable, Optional
 
 import requests
 from dataclasses_json import dataclass_json
-from icecream import ic
 from loguru import logger
 from requests import Response
+from requests.adapters import HTTPAdapter
 from requests.cookies import cookiejar_from_dict
+from urllib3.util.retry import Retry
 
 PROJECTS_PATH = "/api/aero/v1/projects"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 
 @dataclass_json
@@ -50,17 +55,46 @@ class InceptionAPIResponse:
     messages: list[Message]
 
 
+@dataclass
+class DocumentUpload:
+    file_path: str
+    name: str
+    file_format: str
+    state: str = None
+
+
 class InceptionClient:
+    """
+    pool_size is the number of connections kept open to the server; it should be at least max_workers, the number of
+    calls the batch methods (create_project_documents, get_project_documents_contents) run at the same time.
+    Idempotent calls (GET) are retried up to max_retries times on connection errors and 429/5xx responses, with
+    exponential backoff; POST calls are not retried, as they could create a document twice.
+
+    get_project_by_name and get_project_document_by_name look the name up in a cache of the project (document) list,
+    which is only downloaded again after a create or delete through this client, after cache_ttl seconds (when set),
+    or for a name that is not in the cache.
+    """
 
     def __init__(self,
                  base_uri: str,
                  user: str = None,
                  password: str = None,
                  authorization: str = None,
-                 oauth2_proxy: str = None):
+                 oauth2_proxy: str = None,
+                 pool_size: int = 10,
+                 max_workers: int = 4,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 cache_ttl: Optional[float] = None):
         self.base_uri = base_uri.rstrip("/")
         self.user = user
+        self.max_workers = max_workers
+        self.cache_ttl = cache_ttl
+        self._projects = _NameCache(cache_ttl)
+        self._documents: dict[int, _NameCache] = {}
+        self._documents_lock = threading.Lock()
         self._prepare_session(authorization, oauth2_proxy, password, user)
+        self._mount_adapter(pool_size, max_retries, backoff_factor)
 
     def _prepare_session(self, authorization: str, oauth2_proxy: str, password: str, user: str):
         self.session = requests.Session()
@@ -73,6 +107,16 @@ class InceptionClient:
         else:
             self.session.auth = (user, password)
 
+    def _mount_adapter(self, pool_size: int, max_retries: int, backoff_factor: float):
+        retry = Retry(total=max_retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
     def __enter__(self):
         return self
 
@@ -86,18 +130,16 @@ class InceptionClient:
     def get_projects(self) -> list[Project]:
         path = f"{PROJECTS_PATH}"
         result = self.__get(path)
-        return [Project.from_dict(d) for d in result.body]
+        projects = [Project.from_dict(d) for d in result.body]
+        self._projects.fill({p.name: p for p in projects})
+        return projects
 
     def get_project_by_id(self, project_id: int) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}/{project_id}"
         return self.__get(path)
 
     def get_project_by_name(self, name: str) -> Union[Project, None]:
-        matches = [p for p in (self.get_projects()) if p.name == name]
-        if matches:
-            return matches[0]
-        else:
-            return None
+        return self._projects.get(name, self.get_projects)
 
     def create_project(self, name: str, title: str = None) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}"
@@ -107,7 +149,16 @@ class InceptionClient:
         }
         if title:
             params['title'] = title
-        return self.__post(path, params=params)
+        response = self.__post(path, params=params)
+        self._projects.invalidate()
+        return response
+
+    def delete_project(self, project_id: int) -> InceptionAPIResponse:
+        path = f"{PROJECTS_PATH}/{project_id}"
+        response = self.__delete(path)
+        self._projects.invalidate()
+        self._document_cache(project_id).invalidate()
+        return response
 
     def get_project_user_permissions(self, project_id: int, user_id: str) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}/{project_id}/permissions/{user_id}"
@@ -115,7 +166,13 @@ class InceptionClient:
 
     def get_project_documents(self, project_id: int) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}/{project_id}/documents"
-        return self.__get(path)
+        response = self.__get(path)
+        self._document_cache(project_id).fill({d['name']: Document.from_dict(d) for d in response.body})
+        return response
+
+    def get_project_document_by_name(self, project_id: int, name: str) -> Union[Document, None]:
+        return self._document_cache(project_id).get(acceptable_document_name(name),
+                                                    lambda: self.get_project_documents(project_id))
 
     def get_project_document(self, project_id: int, document_id: int,
                              export_format: str = "xmi-xml1.1") -> str:
@@ -125,16 +182,53 @@ class InceptionClient:
     def create_project_document(self, project_id: int, file_path: str, name: str, file_format: str,
                                 state: str = None) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}/{project_id}/documents"
-        rx = '[' + re.escape(''.join('\x00!"#$%&\'*+/:<=>?@\\`{|}')) + ']'
-        acceptable_name = re.sub(rx, '', name)[:200].strip()
         params = {
-            'name': acceptable_name,
+            'name': acceptable_document_name(name),
             'format': file_format
         }
         if state:
             params['state'] = state
         with open(file_path) as file:
-            return self.__post(path, params=params, file=file)
+            response = self.__post(path, params=params, file=file)
+        self._document_cache(project_id).invalidate()
+        return response
+
+    def delete_project_document(self, project_id: int, document_id: int) -> InceptionAPIResponse:
+        path = f"{PROJECTS_PATH}/{project_id}/documents/{document_id}"
+        response = self.__delete(path)
+        self._document_cache(project_id).invalidate()
+        return response
+
+    def _document_cache(self, project_id: int) -> '_NameCache':
+        with self._documents_lock:
+            if project_id not in self._documents:
+                self._documents[project_id] = _NameCache(self.cache_ttl)
+            return self._documents[project_id]
+
+    def create_project_documents(self, project_id: int,
+                                 documents: Iterable[DocumentUpload]) -> list[InceptionAPIResponse]:
+        """
+        Upload the documents with up to max_workers uploads at the same time; the responses are in the order of
+        the documents.
+        """
+        return self._run_concurrently(
+            lambda d: self.create_project_document(project_id=project_id, file_path=d.file_path, name=d.name,
+                                                   file_format=d.file_format, state=d.state),
+            documents)
+
+    def get_project_documents_contents(self, project_id: int, document_ids: Iterable[int],
+                                       export_format: str = "xmi-xml1.1") -> list[str]:
+        """
+        Export the documents with up to max_workers exports at the same time; the contents are in the order of
+        the document_ids.
+        """
+        return self._run_concurrently(
+            lambda document_id: self.get_project_document(project_id, document_id, export_format=export_format),
+            document_ids)
+
+    def _run_concurrently(self, call: Callable[[any], any], items: Iterable[any]) -> list[any]:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inception") as executor:
+            return list(executor.map(call, items))
 
     def get_document_curation(self, project_id: int, document_id: str) -> InceptionAPIResponse:
         path = f"{PROJECTS_PATH}/{project_id}/documents/{document_id}/curation"
@@ -153,6 +247,12 @@ class InceptionClient:
         else:
             return as_inception_api_response(response)
 
+    def __delete(self, path: str) -> InceptionAPIResponse:
+        url = self.base_uri + path
+        logger.debug(f"DELETE {url}")
+        response = self.session.delete(url)
+        return as_inception_api_response(response)
+
     def __post(self, path: str, params: dict, file: TextIO = None) -> InceptionAPIResponse:
         url = self.base_uri + path
         logger.debug(f"POST {url}")
@@ -162,7 +262,47 @@ class InceptionClient:
         return as_inception_api_response(response)
 
 
+class _NameCache:
+    # name -> value, filled from a complete listing; a name that is not found, or an expired cache, reloads the listing
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self._entries: Optional[dict[str, any]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def fill(self, entries: dict[str, any]):
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+    def get(self, name: str, load: Callable[[], any]) -> any:
+        with self._lock:
+            entries = self._entries if not self._expired() else None
+        if entries is not None and name in entries:
+            return entries[name]
+        load()  # calls fill()
+        with self._lock:
+            return (self._entries or {}).get(name)
+
+    def _expired(self) -> bool:
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+
+
+_UNACCEPTABLE_NAME_CHARACTERS = re.compile('[' + re.escape(''.join('\x00!"#$%&\'*+/:<=>?@\\`{|}')) + ']')
+
+
+def acceptable_document_name(name: str) -> str:
+    # the name inception stores for a document uploaded with this name
+    return _UNACCEPTABLE_NAME_CHARACTERS.sub('', name)[:200].strip()
+
+
 def as_inception_api_response(response):
     json = response.json()
-    ic(response, json)
+    # lazy: the response body is only formatted when debug messages are logged
+    logger.opt(lazy=True).debug("{} {}", lambda: response, lambda: json)
     return InceptionAPIResponse(response=response, body=json['body'], messages=json['messages'])
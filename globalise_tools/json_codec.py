@@ -0,0 +1,107 @@
+import json
+import re
+from typing import Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_COMPACT_SEPARATORS = (",", ":")
+# orjson writes exponents as 1e16 where json writes 1e+16
+_EXPONENT_CANDIDATE = re.compile(rb"e-?[0-9]+")
+_SMALL_FLOAT_START = b"0.0000"
+_DIGITS = frozenset(b"0123456789")
+_NUMBER_CHARACTERS = frozenset(b"0123456789.-")
+_BEFORE_NUMBER = frozenset(b"[:, \n")
+_AFTER_NUMBER = frozenset(b",]}\n")
+_NON_ASCII = re.compile(r"[\x7f-\uffff]")
+_ASTRAL = re.compile("[\U00010000-\U0010ffff]")
+
+
+def encode(obj: any, default: Optional[Callable] = None, indent: Optional[int] = None, ensure_ascii: bool = True,
+           separators: Optional[tuple[str, str]] = None) -> str:
+    """
+    The same as json.dumps(obj, default=default, indent=indent, ensure_ascii=ensure_ascii, separators=separators),
+    but with orjson (when it is installed) for the layouts orjson writes identically: indent=2, or no indent with
+    compact separators. The json module is used for other layouts, and for the (rare) documents where orjson
+    would differ: floats with an exponent, floats below 1e-4 (orjson writes 5e-05 as 0.00005), integers over 64 bits
+    and non-str dict keys.
+
+    Dataclasses and datetimes are passed to default, as with json; values orjson serializes itself where json would
+    call default (uuids, enums), and NaN, which orjson writes as null, are not expected in the documents here.
+    orjson passes tuple subclasses (namedtuples like intervaltree.Interval) to default, where json writes them as
+    lists; those documents, and the ones where default returns None, are also left to json.
+    """
+    if orjson is not None:
+        option = _orjson_option(indent, separators)
+        if option is not None:
+            try:
+                encoded = orjson.dumps(obj, default=_strict(default), option=option)
+            except orjson.JSONEncodeError:
+                encoded = None
+            if encoded is not None and not _has_exponent(encoded) and not _has_small_float(encoded):
+                encoded = encoded.decode('utf8')
+                if ensure_ascii and (not encoded.isascii() or "\x7f" in encoded):
+                    return _ascii_escaped(encoded)
+                return encoded
+    return json.dumps(obj, default=default, indent=indent, ensure_ascii=ensure_ascii, separators=separators)
+
+
+def _strict(default: Optional[Callable]) -> Callable:
+    # a TypeError makes orjson fail, and encode() fall back to json
+    def strict_default(obj):
+        if default is None or isinstance(obj, tuple):
+            raise TypeError(f"left to json: {type(obj).__name__}")
+        value = default(obj)
+        if value is None:
+            raise TypeError(f"left to json: {type(obj).__name__}")
+        return value
+
+    return strict_default
+
+
+def _orjson_option(indent: Optional[int], separators: Optional[tuple[str, str]]) -> Optional[int]:
+    option = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+    if indent is None and separators is not None and tuple(separators) == _COMPACT_SEPARATORS:
+        return option
+    if indent == 2 and (separators is None or tuple(separators) == (",", ": ")):
+        return option | orjson.OPT_INDENT_2
+    return None
+
+
+def _has_exponent(encoded: bytes) -> bool:
+    # a number with an exponent: e-digits after a digit, within a token delimited like a number;
+    # the same sequence inside a string only makes the caller fall back to json
+    for match in _EXPONENT_CANDIDATE.finditer(encoded):
+        start, end = match.span()
+        if start == 0 or encoded[start - 1] not in _DIGITS:
+            continue
+        i = start - 1
+        while i >= 0 and encoded[i] in _NUMBER_CHARACTERS:
+            i -= 1
+        if (i < 0 or encoded[i] in _BEFORE_NUMBER) and (end == len(encoded) or encoded[end] in _AFTER_NUMBER):
+            return True
+    return False
+
+
+def _has_small_float(encoded: bytes) -> bool:
+    # a float in [1e-5, 1e-4), which orjson writes as 0.0000d..., where json writes an exponent;
+    # as with _has_exponent, a match inside a string only makes the caller fall back to json
+    start = encoded.find(_SMALL_FLOAT_START)
+    while start != -1:
+        if start == 0 or encoded[start - 1] not in _DIGITS:
+            return True
+        start = encoded.find(_SMALL_FLOAT_START, start + 1)
+    return False
+
+
+def _ascii_escaped(encoded: str) -> str:
+    # non-ascii characters only occur in strings, where json.dumps(ensure_ascii=True) writes them as \uXXXX
+    encoded = _ASTRAL.sub(_surrogate_pair, encoded)
+    return _NON_ASCII.sub(lambda m: f"\\u{ord(m.group()):04x}", encoded)
+
+
+def _surrogate_pair(match: re.Match) -> str:
+    n = ord(match.group()) - 0x10000
+    return f"\\u{0xd800 | (n >> 10):04x}\\u{0xdc00 | (n & 0x3ff):04x}"
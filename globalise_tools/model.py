@@ -1,6 +1,8 @@
+import itertools
+import os
 import uuid
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from json import JSONEncoder
 from typing import Optional
@@ -8,7 +10,7 @@ from typing import Optional
 from dataclasses_json import dataclass_json
 from pagexml.model.physical_document_model import Coords
 
-import globalise_tools.tools as gt
+from globalise_tools import json_codec
 
 
 @dataclass
@@ -83,13 +85,12 @@ class WebAnnotation:
     custom: dict[str, any] = field(default_factory=dict, hash=False)
 
     def wrapped(self):
-        anno_uuid = uuid.uuid4()
         anno_dict = {
             "@context": "http://www.w3.org/ns/anno.jsonld",
-            "id": f"urn:globalise:annotation:{anno_uuid}",
+            "id": f"urn:globalise:annotation:{self.annotation_id()}",
             "type": "Annotation",
             "motivation": "classifying",
-            "generated": datetime.today().isoformat(),  # use last-modified from pagexml for px: types
+            "generated": generated_timestamp(),  # use last-modified from pagexml for px: types
             "generator": {  # use creator metadata from pagexml for px: types
                 "id": "https://github.com/knaw-huc/loghi-htr",
                 "type": "Software",
@@ -102,6 +103,61 @@ class WebAnnotation:
             anno_dict.update(self.custom)
         return anno_dict
 
+    def annotation_id(self) -> str:
+        id_strategy = _web_annotation_config['id_strategy']
+        if id_strategy == ID_UUID5:
+            name = json_codec.encode([self.body, self.target], default=json_data, ensure_ascii=False,
+                                     separators=(",", ":"))
+            return str(uuid.uuid5(ANNOTATION_ID_NAMESPACE, name))
+        if id_strategy == ID_COUNTER:
+            return str(next(_web_annotation_config['counter']))
+        return str(uuid.uuid4())
+
+
+ID_UUID4 = "uuid4"
+ID_UUID5 = "uuid5"
+ID_COUNTER = "counter"
+ID_STRATEGIES = (ID_UUID4, ID_UUID5, ID_COUNTER)
+ANNOTATION_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "urn:globalise:annotation")
+
+_web_annotation_config = {
+    'id_strategy': ID_UUID4,
+    'generated': None,
+    'counter': itertools.count(1)
+}
+
+
+def configure_web_annotations(id_strategy: str = ID_UUID4, generated: Optional[str] = None):
+    """
+    Set how WebAnnotation.wrapped() makes the annotation id and the generated timestamp, for this process.
+
+    - id_strategy "uuid4": a random uuid (the default)
+    - id_strategy "uuid5": a uuid derived from the body and target, so the same annotation gets the same id in
+      every run
+    - id_strategy "counter": 1, 2, 3, ...; only unique within one process
+
+    generated is the timestamp for all annotations. By default, it is the time of the first wrapped() call,
+    or the time in SOURCE_DATE_EPOCH, when that is set. With uuid5 ids and SOURCE_DATE_EPOCH,
+    exporting the same input again gives the same output.
+    """
+    if id_strategy not in ID_STRATEGIES:
+        raise ValueError(f"unknown id strategy {id_strategy}, expected one of {', '.join(ID_STRATEGIES)}")
+    _web_annotation_config['id_strategy'] = id_strategy
+    _web_annotation_config['generated'] = generated
+    _web_annotation_config['counter'] = itertools.count(1)
+
+
+def generated_timestamp() -> str:
+    generated = _web_annotation_config['generated']
+    if generated is None:
+        source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+        if source_date_epoch:
+            generated = datetime.fromtimestamp(int(source_date_epoch), timezone.utc).replace(tzinfo=None).isoformat()
+        else:
+            generated = datetime.today().isoformat()
+        _web_annotation_config['generated'] = generated
+    return generated
+
 
 @dataclass
 class TRVersions:
@@ -117,6 +173,10 @@ class GTToken:
     text_with_ws: str
     offset: int
 
+    def as_json_dict(self) -> dict[str, any]:
+        # the same as to_dict(), without the dataclasses_json machinery
+        return {"text": self.text, "text_with_ws": self.text_with_ws, "offset": self.offset}
+
 
 @dataclass_json
 @dataclass
@@ -125,19 +185,57 @@ class ScanCoords:
     canvas_id: str
     coords: Coords
 
+    def as_json_dict(self) -> dict[str, any]:
+        return {"iiif_base_uri": self.iiif_base_uri, "canvas_id": self.canvas_id, "coords": self.coords.points}
+
+
+def json_data(obj):
+    """
+    The json-serializable form of the models; None for other objects.
+    """
+    converter = _JSON_CONVERTERS.get(type(obj))
+    if converter is None:
+        converter = _json_converter(obj)
+        _JSON_CONVERTERS[type(obj)] = converter
+    return converter(obj)
+
+
+def _json_converter(obj):
+    # imported here, as tools imports model
+    import globalise_tools.tools as gt
+    if isinstance(obj, gt.Annotation) \
+            or isinstance(obj, gt.PXTextRegion) \
+            or isinstance(obj, gt.PXTextLine) \
+            or isinstance(obj, ScanCoords) \
+            or isinstance(obj, GTToken):
+        return lambda o: o.to_dict()
+    elif isinstance(obj, WebAnnotation):
+        return WebAnnotation.wrapped
+    elif isinstance(obj, Coords):
+        return lambda c: c.points
+    return lambda o: None
+
+
+# the conversion per type, so the isinstance chain is only run once per type
+_JSON_CONVERTERS = {
+    WebAnnotation: WebAnnotation.wrapped,
+    ScanCoords: ScanCoords.as_json_dict,
+    GTToken: GTToken.as_json_dict,
+}
+
+
+def dumps(obj: any, indent: Optional[int] = None, ensure_ascii: bool = True,
+          separators: Optional[tuple[str, str]] = None) -> str:
+    """
+    The same as json.dumps(obj, cls=AnnotationEncoder, ...), faster: with orjson when installed (see
+    json_codec.encode) and with a type lookup instead of the AnnotationEncoder isinstance chain otherwise.
+    """
+    return json_codec.encode(obj, default=json_data, indent=indent, ensure_ascii=ensure_ascii, separators=separators)
+
 
 class AnnotationEncoder(JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, gt.Annotation) \
-                or isinstance(obj, gt.PXTextRegion) \
-                or isinstance(obj, gt.PXTextLine) \
-                or isinstance(obj, ScanCoords) \
-                or isinstance(obj, GTToken):
-            return obj.to_dict()
-        elif isinstance(obj, WebAnnotation):
-            return obj.wrapped()
-        elif isinstance(obj, Coords):
-            return obj.points
+        return json_data(obj)
 
 
 CAS_SENTENCE = "de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Sentence"
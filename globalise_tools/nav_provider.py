@@ -1,16 +1,35 @@
 import json
 import os
+import sqlite3
+from typing import Optional, Iterable
 
 from loguru import logger
 
+DEFAULT_NAV_INDEX_PATH = 'out/page_nav_idx.sqlite'
+
 
 class NavProvider:
+    """
+    Provides the prev/next page ids of a page.
+
+    When the corpus-wide index built by gt-extract-page-nav (out/page_nav_idx.sqlite) exists, every lookup is a
+    primary key query on it, whatever the order of the inventories. Otherwise, the per-inventory page_nav_idx.json
+    files are used, loading a new one whenever the inventory changes.
+    """
 
-    def __init__(self):
+    def __init__(self, nav_index_path: str = DEFAULT_NAV_INDEX_PATH):
+        self.nav_index_path = nav_index_path
+        self._connection = None
         self.inv_nr = None
         self.index_path = None
         self.index = {}
 
+    def __getstate__(self):
+        # sqlite connections can not be shared between processes, every process opens its own
+        state = dict(self.__dict__)
+        state['_connection'] = None
+        return state
+
     def load_index(self, inv_nr):
         self.inv_nr = inv_nr
         self.index_path = index_path_for_inv_nr(inv_nr)
@@ -22,25 +41,53 @@ class NavProvider:
             self.index = {}
 
     def nav_fields(self, page_id: str) -> dict[str, str]:
-        try_match = True
-        nav = {}
-        while try_match:
-            if page_id in self.index:
-                nav = self.index[page_id]
-                try_match = False
-            else:
-                inv_nr = page_id.split('_')[-2]
-                if inv_nr == self.inv_nr:
-                    logger.error(f'page_id {page_id} not found in {self.index_path}')
-                    nav = self._deduced_nav(page_id)
-                    try_match = False
-                else:
-                    self.load_index(inv_nr)
+        connection = self._nav_index()
+        if connection:
+            nav = self._indexed_nav(connection, page_id)
+        else:
+            nav = self._inventory_nav(page_id)
         x_nav = {}
         for k, v in nav.items():
             x_nav[f'{k}PageId'] = f'urn:globalise:{v}'
         return x_nav
 
+    def page_number(self, page_id: str) -> Optional[int]:
+        connection = self._nav_index()
+        if not connection:
+            return None
+        row = connection.execute("SELECT page_no FROM page_nav WHERE page_id = ?", (page_id,)).fetchone()
+        return row[0] if row else None
+
+    def _nav_index(self) -> Optional[sqlite3.Connection]:
+        if self._connection is None and os.path.exists(self.nav_index_path):
+            logger.info(f"<= {self.nav_index_path}")
+            self._connection = sqlite3.connect(f"file:{self.nav_index_path}?mode=ro", uri=True,
+                                               check_same_thread=False)
+        return self._connection
+
+    def _indexed_nav(self, connection: sqlite3.Connection, page_id: str) -> dict[str, str]:
+        row = connection.execute("SELECT prev, next FROM page_nav WHERE page_id = ?", (page_id,)).fetchone()
+        if row is None:
+            logger.error(f'page_id {page_id} not found in {self.nav_index_path}')
+            return self._deduced_nav(page_id)
+        prev_page_id, next_page_id = row
+        nav = {}
+        if prev_page_id:
+            nav['prev'] = prev_page_id
+        if next_page_id:
+            nav['next'] = next_page_id
+        return nav
+
+    def _inventory_nav(self, page_id: str) -> dict[str, str]:
+        while True:
+            if page_id in self.index:
+                return self.index[page_id]
+            inv_nr = page_id.split('_')[-2]
+            if inv_nr == self.inv_nr:
+                logger.error(f'page_id {page_id} not found in {self.index_path}')
+                return self._deduced_nav(page_id)
+            self.load_index(inv_nr)
+
     @staticmethod
     def _deduced_nav(page_id: str):
         nav = {}
@@ -55,3 +102,51 @@ class NavProvider:
 
 def index_path_for_inv_nr(inv_nr):
     return f'out/NL-HaNA_1.04.02_{inv_nr}/page_nav_idx.json'
+
+
+class NavIndexWriter:
+    """
+    Builds the corpus-wide navigation index in a temporary file, which replaces the index when the writer is closed.
+    """
+
+    def __init__(self, nav_index_path: str = DEFAULT_NAV_INDEX_PATH):
+        self.nav_index_path = nav_index_path
+        self._tmp_path = f"{nav_index_path}.tmp"
+        os.makedirs(os.path.dirname(nav_index_path) or '.', exist_ok=True)
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._connection = sqlite3.connect(self._tmp_path)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        self._connection.execute(
+            "CREATE TABLE page_nav (page_id TEXT PRIMARY KEY, inv_nr TEXT, page_no INTEGER, prev TEXT, next TEXT)"
+            " WITHOUT ROWID"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self._connection.close()
+            os.remove(self._tmp_path)
+
+    def add_inventory(self, inv_nr: str, pagexml_ids: list[str], prev_next_idx: dict[str, dict[str, str]]):
+        rows = ((pid, inv_nr, i + 1, prev_next_idx[pid].get('prev'), prev_next_idx[pid].get('next'))
+                for i, pid in enumerate(pagexml_ids))
+        self._connection.executemany("INSERT OR REPLACE INTO page_nav VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+        logger.info(f"=> {self.nav_index_path}")
+        os.replace(self._tmp_path, self.nav_index_path)
+
+
+def write_nav_index(inventories: Iterable[tuple[str, list[str], dict[str, dict[str, str]]]],
+                    nav_index_path: str = DEFAULT_NAV_INDEX_PATH):
+    with NavIndexWriter(nav_index_path) as writer:
+        for inv_nr, pagexml_ids, prev_next_idx in inventories:
+            writer.add_inventory(inv_nr, pagexml_ids, prev_next_idx)
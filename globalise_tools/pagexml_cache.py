@@ -0,0 +1,187 @@
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from importlib.metadata import version, PackageNotFoundError
+from typing import Optional, Iterable, TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from pagexml.model.physical_document_model import PageXMLScan
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/globalise-tools/pagexml")
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024  # 10 GiB
+PRUNE_TARGET_RATIO = 0.9
+
+
+def _parser_version() -> str:
+    try:
+        return version("pagexml-tools")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+PARSER_VERSION = _parser_version()
+
+
+class PageXMLCache:
+    """
+    On-disk cache of parsed PageXML scans.
+
+    Entries are zlib-compressed pickles of the PageXMLScan, keyed by the absolute path, mtime and size of the
+    source file and the version of the pagexml parser, so a changed file or an updated parser never hits a stale
+    entry. Reads bump the mtime of the cache entry; when the cache grows beyond max_size, the least recently used
+    entries are removed.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._size = None
+
+    def parse_pagexml_file(self, pagexml_file: str) -> 'PageXMLScan':
+        scan_doc = self.get(pagexml_file)
+        if scan_doc is None:
+            scan_doc = _parse(pagexml_file)
+            self.put(pagexml_file, scan_doc)
+        return scan_doc
+
+    def get(self, pagexml_file: str) -> Optional['PageXMLScan']:
+        entry_path = self._entry_path(pagexml_file)
+        try:
+            with open(entry_path, 'rb') as f:
+                scan_doc = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"dropping unreadable cache entry {entry_path} for {pagexml_file}: {e}")
+            self._remove(entry_path)
+            return None
+        os.utime(entry_path)
+        return scan_doc
+
+    def put(self, pagexml_file: str, scan_doc: 'PageXMLScan'):
+        entry_path = self._entry_path(pagexml_file)
+        data = zlib.compress(pickle.dumps(scan_doc, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        entry_dir = os.path.dirname(entry_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, entry_path)
+        self._add_to_size(len(data))
+
+    def contains(self, pagexml_file: str) -> bool:
+        return os.path.exists(self._entry_path(pagexml_file))
+
+    def invalidate(self, pagexml_file: str) -> bool:
+        return self._remove(self._entry_path(pagexml_file))
+
+    def warm(self, pagexml_files: Iterable[str]) -> int:
+        parsed = 0
+        for path in pagexml_files:
+            if not self.contains(path):
+                self.put(path, _parse(path))
+                parsed += 1
+        return parsed
+
+    def prune(self, max_size: int = None) -> tuple[int, int]:
+        """
+        Remove the least recently used entries until the cache is at most max_size bytes.
+        Returns the number of entries removed and the number of bytes freed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = []
+        total_size = 0
+        for entry_path in self.entry_paths():
+            try:
+                stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_size += stat.st_size
+        entries.sort()
+        removed = 0
+        freed = 0
+        for _, size, entry_path in entries:
+            if total_size - freed <= max_size:
+                break
+            if self._remove(entry_path):
+                removed += 1
+                freed += size
+        self._size = total_size - freed
+        return removed, freed
+
+    def size(self) -> int:
+        total_size = 0
+        for entry_path in self.entry_paths():
+            try:
+                total_size += os.path.getsize(entry_path)
+            except FileNotFoundError:
+                pass
+        self._size = total_size
+        return total_size
+
+    def _add_to_size(self, entry_size: int):
+        if self._size is None:
+            self.size()
+        else:
+            self._size += entry_size
+        if self._size > self.max_size:
+            removed, freed = self.prune(int(self.max_size * PRUNE_TARGET_RATIO))
+            logger.info(f"pagexml cache: evicted {removed} entries ({freed} bytes) from {self.cache_dir}")
+
+    def entry_paths(self) -> list[str]:
+        return glob.glob(f"{self.cache_dir}/*/*.pkl.z")
+
+    def _entry_path(self, pagexml_file: str) -> str:
+        key = cache_key(pagexml_file)
+        return f"{self.cache_dir}/{key[:2]}/{key}.pkl.z"
+
+    @staticmethod
+    def _remove(entry_path: str) -> bool:
+        try:
+            os.remove(entry_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def cache_key(pagexml_file: str) -> str:
+    path = os.path.abspath(pagexml_file)
+    stat = os.stat(path)
+    key_source = f"{CACHE_FORMAT_VERSION}|{PARSER_VERSION}|{path}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(key_source.encode()).hexdigest()
+
+
+_default_cache = None
+
+
+def default_cache() -> PageXMLCache:
+    global _default_cache
+    if _default_cache is None:
+        cache_dir = os.environ.get("GT_PAGEXML_CACHE_DIR", DEFAULT_CACHE_DIR)
+        max_size = int(os.environ.get("GT_PAGEXML_CACHE_MAX_SIZE", DEFAULT_MAX_SIZE))
+        _default_cache = PageXMLCache(cache_dir=cache_dir, max_size=max_size)
+    return _default_cache
+
+
+def _parse(pagexml_file: str) -> 'PageXMLScan':
+    # pagexml-tools is only imported when a file actually has to be parsed
+    import pagexml.parser as px
+    return px.parse_pagexml_file(pagexml_file=pagexml_file)
+
+
+def parse_pagexml_file(pagexml_file: str) -> 'PageXMLScan':
+    """
+    Drop-in replacement for pagexml.parser.parse_pagexml_file that goes through the default cache.
+    Set GT_PAGEXML_CACHE_DIR to an empty string to bypass the cache.
+    """
+    if os.environ.get("GT_PAGEXML_CACHE_DIR") == "":
+        return _parse(pagexml_file)
+    return default_cache().parse_pagexml_file(pagexml_file)
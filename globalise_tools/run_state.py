@@ -0,0 +1,167 @@
+import json
+import os
+from typing import Optional, Iterator, Type
+
+from loguru import logger
+
+COMPACTION_MIN_LINES = 1000
+
+
+class RunState:
+    """
+    Append-only record of the work done by a long running script, so an interrupted run can be resumed.
+
+    Every mark_done() appends one json line ({"key": ..., "value": ...}) to the log and flushes it, so marking an item
+    as done costs the same however many items were done before; remove() appends {"key": ..., "removed": true}.
+    When the log is opened, it is replayed (a later line for the same key wins), and a partially written last line,
+    left behind by a crash, is cut off. With truncate=True, the log is started empty instead.
+    When the log holds many superseded lines, it is compacted on opening.
+
+    Only one process should write to the log; parallel scripts mark items as done in the parent process.
+    """
+
+    def __init__(self, path: str, legacy_path: str = None, encoder_cls: Type[json.JSONEncoder] = None,
+                 sync: bool = False, truncate: bool = False):
+        self.path = path
+        self.encoder_cls = encoder_cls
+        self.sync = sync
+        self._entries = {}
+        self._line_count = 0
+        self._file = None
+        if truncate:
+            if os.path.exists(path):
+                os.remove(path)
+        elif os.path.exists(path):
+            self._replay()
+            if self._line_count > max(2 * len(self._entries), COMPACTION_MIN_LINES):
+                self.compact()
+        elif legacy_path and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+            self.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def mark_done(self, key: str, value: any = None):
+        self._append({"key": key, "value": value})
+        self._entries[key] = value
+
+    def remove(self, key: str):
+        """
+        Forget key, so it is no longer done; a key that is not done is ignored.
+        """
+        if key in self._entries:
+            self._append({"key": key, "removed": True})
+            del self._entries[key]
+
+    def _append(self, record: dict[str, any]):
+        line = json.dumps(record, cls=self.encoder_cls, ensure_ascii=False)
+        f = self._log_file()
+        f.write(line + "\n")
+        f.flush()
+        if self.sync:
+            os.fsync(f.fileno())
+        self._line_count += 1
+
+    def is_done(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, default: any = None) -> any:
+        return self._entries.get(key, default)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def items(self):
+        return self._entries.items()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __getitem__(self, key: str) -> any:
+        return self._entries[key]
+
+    def __setitem__(self, key: str, value: any):
+        self.mark_done(key, value)
+
+    def __delitem__(self, key: str):
+        self.remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def compact(self):
+        """
+        Rewrite the log with one line per key.
+        """
+        self.close()
+        logger.info(f"=> {self.path}")
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            for key, value in self._entries.items():
+                f.write(json.dumps({"key": key, "value": value}, cls=self.encoder_cls, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._line_count = len(self._entries)
+
+    def write_snapshot(self, path: str, keys_only: bool = False, indent: Optional[int] = None):
+        """
+        Write the state as a single json document: a list of the keys, or an object mapping the keys to their values.
+        """
+        logger.info(f"=> {path}")
+        with open(f"{path}.tmp", 'w', encoding='utf8') as f:
+            if keys_only:
+                json.dump(list(self._entries.keys()), fp=f)
+            else:
+                json.dump(self._entries, fp=f, cls=self.encoder_cls, indent=indent, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    def _log_file(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf8')
+        return self._file
+
+    def _replay(self):
+        logger.info(f"<= {self.path}")
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if record.get("removed"):
+                    self._entries.pop(record["key"], None)
+                else:
+                    self._entries[record["key"]] = record.get("value")
+                self._line_count += 1
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self.path):
+            logger.warning(f"{self.path}: dropping incomplete records after byte {valid_size}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def _import_legacy(self, legacy_path: str):
+        logger.info(f"<= {legacy_path}")
+        with open(legacy_path, encoding='utf8') as f:
+            legacy = json.load(f)
+        if isinstance(legacy, dict):
+            self._entries.update(legacy)
+        else:
+            self._entries.update((key, None) for key in legacy)
@@ -0,0 +1,36 @@
+class TextBuilder:
+    """
+    Collects text fragments and joins them once, instead of growing a str with +=.
+
+    append() returns the (begin, end) offsets of the fragment in the final text, so ranges can be recorded while
+    the text is being assembled.
+    """
+
+    def __init__(self):
+        self._fragments = []
+        self._length = 0
+        self._text = None
+
+    def append(self, fragment: str) -> tuple[int, int]:
+        begin = self._length
+        if fragment:
+            self._fragments.append(fragment)
+            self._length += len(fragment)
+            self._text = None
+        return begin, self._length
+
+    def extend(self, fragments: list[str]):
+        for fragment in fragments:
+            self.append(fragment)
+
+    def build(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._fragments)
+            self._fragments = [self._text] if self._text else []
+        return self._text
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __str__(self) -> str:
+        return self.build()
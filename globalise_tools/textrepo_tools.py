@@ -1,4 +1,12 @@
-from textrepo.client import TextRepoClient, FileType
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterable, Optional
+
+from requests.adapters import HTTPAdapter
+from textrepo.client import TextRepoClient, FileType, DocumentIdentifier
+
+# the number of textrepo calls for one document that run at the same time
+MAX_CONCURRENT_CALLS = 8
 
 
 def get_file_type(client: TextRepoClient, file_type_name, mimetype) -> FileType:
@@ -15,3 +23,144 @@ def get_plain_text_file_type(client: TextRepoClient) -> FileType:
 
 def get_xmi_file_type(client: TextRepoClient) -> FileType:
     return get_file_type(client, 'xmi', 'application/vnd.xmi+xml')
+
+
+def use_pooled_session(client: TextRepoClient, pool_size: int = MAX_CONCURRENT_CALLS) -> TextRepoClient:
+    """
+    Keep up to pool_size connections to the server open in the session of the client, so the concurrent calls
+    (update_document_metadata, map_concurrently) reuse them for the whole run.
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    client.session.mount("http://", adapter)
+    client.session.mount("https://", adapter)
+    return client
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix="textrepo")
+        return _executor
+
+
+def map_concurrently(call: Callable[[any], any], items: Iterable[any]) -> list[any]:
+    """
+    call(item) for every item, running independent textrepo calls at the same time; the results are in item order.
+    """
+    items = list(items)
+    if len(items) < 2:
+        return [call(item) for item in items]
+    return list(_shared_executor().map(call, items))
+
+
+def metadata_changes(current: dict[str, str], wanted: dict[str, any]) -> dict[str, str]:
+    """
+    The metadata values to write: the wanted values (as str; None means: leave as it is) that differ from the current.
+    """
+    changes = {}
+    for key, value in wanted.items():
+        if value is None:
+            continue
+        value = str(value)
+        if current.get(key) != value:
+            changes[key] = value
+    return changes
+
+
+def update_document_metadata(client: TextRepoClient, document_identifier: DocumentIdentifier,
+                             metadata: dict[str, any], current: Optional[dict[str, str]] = None) -> dict[str, str]:
+    """
+    Write the metadata values that differ from the current metadata of the document (read from the server when
+    current is None), concurrently. Returns the values written.
+    """
+    if current is None:
+        current = client.read_document_metadata(document_identifier)
+    changes = metadata_changes(current, metadata)
+    map_concurrently(lambda item: client.set_document_metadata(document_id=document_identifier.id, key=item[0],
+                                                               value=item[1]),
+                     changes.items())
+    return changes
+
+
+def create_or_update_document(client: TextRepoClient, external_id: str,
+                              metadata: dict[str, any]) -> DocumentIdentifier:
+    """
+    The document with this external id, created when it does not exist yet, with its metadata updated to the given
+    values: one call to find the document, one to read its metadata, and one per changed value.
+    """
+    document_identifier = client.read_document_by_external_id(external_id)
+    if document_identifier:
+        current = client.read_document_metadata(document_identifier)
+    else:
+        document_identifier = client.create_document(external_id=external_id)
+        current = {}
+    update_document_metadata(client, document_identifier, metadata, current=current)
+    return document_identifier
+
+
+def completed_future(result: any) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class TextRepoUploader:
+    """
+    Runs TextRepo calls on a thread pool. Every thread keeps its own TextRepoClient, so its http connections are
+    reused. At most max_pending calls are queued or running; submit() blocks until there is room.
+    """
+
+    def __init__(self, base_uri: str, api_key: str = None, max_workers: int = 4, max_pending: int = 16,
+                 timeout_in_seconds: int = None):
+        self.base_uri = base_uri
+        self.api_key = api_key
+        self.timeout_in_seconds = timeout_in_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="textrepo-upload")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._local = threading.local()
+        self._clients = []
+        self._clients_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._clients_lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+    def submit(self, call: Callable[..., any], *args, **kwargs) -> Future:
+        """
+        Schedule call(client, *args, **kwargs) with the TextRepoClient of the executing thread.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._run, call, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, call: Callable[..., any], *args, **kwargs) -> any:
+        return call(self._client(), *args, **kwargs)
+
+    def _client(self) -> TextRepoClient:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = TextRepoClient(self.base_uri, api_key=self.api_key, verbose=False,
+                                    timeout_in_seconds=self.timeout_in_seconds)
+            self._local.client = client
+            with self._clients_lock:
+                self._clients.append(client)
+        return client
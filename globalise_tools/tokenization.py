@@ -0,0 +1,89 @@
+from typing import Iterable, Iterator
+
+from loguru import logger
+
+DEFAULT_MODEL = "nl_core_news_lg"
+DEFAULT_BATCH_SIZE = 64
+
+# the components of the nl_core_news pipelines that are not needed for tokens and sentences
+_UNUSED_COMPONENTS = ["ner", "lemmatizer", "attribute_ruler", "morphologizer", "tagger"]
+_ALL_COMPONENTS = ["tok2vec", "parser", "senter"] + _UNUSED_COMPONENTS
+
+
+class Tokenizer:
+    """
+    Tokenizes texts with a spaCy pipeline that is trimmed to what the caller needs, loaded on first use.
+
+    - sentences=False: only the tokenizer of the model is loaded; the tokens are the same as with the full pipeline.
+    - sentences=True: the model's parser (or, with sentence_component="senter", its faster sentence recognizer)
+      sets the sentence boundaries; ner, lemmatizer, tagger and morphologizer are never loaded.
+    - rule_based=True: no model is loaded at all, a blank pipeline for the language is used, with the rule-based
+      sentencizer when sentences are needed.
+
+    Use pipe() to stream many texts through the pipeline in batches, optionally on several processes.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, sentences: bool = True, sentence_component: str = "parser",
+                 rule_based: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, n_process: int = 1):
+        self.model = model
+        self.sentences = sentences
+        self.sentence_component = sentence_component
+        self.rule_based = rule_based
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self._nlp = None
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = self._load()
+        return self._nlp
+
+    def __call__(self, text: str):
+        return self.nlp(text)
+
+    def pipe(self, texts: Iterable[str]) -> Iterator:
+        return self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process)
+
+    def _load(self):
+        import spacy
+        if self.rule_based:
+            language = self.model.split("_")[0]
+            logger.info(f"using the rule-based {language} tokenizer")
+            nlp = spacy.blank(language)
+            if self.sentences:
+                nlp.add_pipe("sentencizer")
+            return nlp
+        if not self.sentences:
+            exclude = _ALL_COMPONENTS
+        elif self.sentence_component == "senter":
+            exclude = _UNUSED_COMPONENTS + ["parser"]
+        else:
+            exclude = _UNUSED_COMPONENTS + ["senter"]
+        logger.info(f"loading {self.model} without {', '.join(exclude)}")
+        nlp = spacy.load(self.model, exclude=exclude)
+        if self.sentences and self.sentence_component == "senter":
+            nlp.enable_pipe("senter")
+        return nlp
+
+
+_tokenizers = {}
+
+
+def get_tokenizer(model: str = DEFAULT_MODEL, sentences: bool = True, sentence_component: str = "parser",
+                  rule_based: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, n_process: int = 1) -> Tokenizer:
+    """
+    A shared Tokenizer per configuration, so a pipeline is loaded only once per process.
+    """
+    key = (model, sentences, sentence_component, rule_based, batch_size, n_process)
+    if key not in _tokenizers:
+        _tokenizers[key] = Tokenizer(model=model, sentences=sentences, sentence_component=sentence_component,
+                                     rule_based=rule_based, batch_size=batch_size, n_process=n_process)
+    return _tokenizers[key]
+
+
+def tokens(doc) -> Iterator:
+    """
+    The tokens of the doc, leaving out the newline tokens.
+    """
+    return (t for t in doc if t.text != "\n")
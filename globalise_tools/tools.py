@@ -1,17 +1,21 @@
 import csv
 import re
 from dataclasses import dataclass, field
-from typing import Tuple, Union
+from typing import Tuple, Union, TYPE_CHECKING, NamedTuple
 
 from dataclasses_json import dataclass_json
-from icecream import ic
-from intervaltree import IntervalTree
 from loguru import logger
 from pagexml.model.physical_document_model import Coords, PageXMLScan, PageXMLTextRegion, PageXMLWord
 
 from globalise_tools.lang_deduction import LangDeduction
 from globalise_tools.model import Document, WebAnnotation, DocumentMetadata
 from globalise_tools.nav_provider import NavProvider
+from globalise_tools.text_builder import TextBuilder
+from globalise_tools.url_index import UrlIndex, read_url_mapping
+from globalise_tools.word_offsets import WordOffsets
+
+if TYPE_CHECKING:
+    from intervaltree import IntervalTree
 
 PAGE_TYPE = "px:Page"
 
@@ -108,37 +112,56 @@ class IdDispenser:
 class WebAnnotationFactory:
     ANNO_CONTEXT = "https://knaw-huc.github.io/ns/huc-di-tt.jsonld"
 
+    PAGE_CACHE_SIZE = 1024
+
     def __init__(self, iiif_mapping_file: str, textrepo_base_uri: str):
-        self.iiif_base_url_idx = {}
         self.textrepo_base_uri = textrepo_base_uri
-        self._init_iiif_base_url_idx(iiif_mapping_file)
         self._iiif_mapping_file = iiif_mapping_file
+        self._iiif_base_url_idx = None
+        self._page_targets_cache = {}
+        self._version_uris = {}
+
+    @property
+    def iiif_base_url_idx(self) -> Union[UrlIndex, dict[str, str]]:
+        # read on first use; with a url index (see gt-extract-scan-url-mapping) this only maps the file
+        if self._iiif_base_url_idx is None:
+            self._iiif_base_url_idx = read_url_mapping(self._iiif_mapping_file)
+        return self._iiif_base_url_idx
 
     @logger.catch
     def annotation_targets(self, annotation: Annotation):
+        return self._annotation_targets(annotation)
+
+    def annotation_targets_batch(self, annotations: list[Annotation]) -> list[list[dict[str, any]]]:
+        """
+        The targets of all annotations, in one pass. The strings derived from the page (canvas id, iiif urls) and
+        from the text versions are made once per page and version, which pays off when the annotations are grouped
+        per page, as they are when exported.
+        """
+        return [self.annotation_targets(a) for a in annotations]
+
+    def _annotation_targets(self, annotation: Annotation) -> list[dict[str, any]]:
         targets = []
-        page_id = annotation.page_id
-        canvas_id = self._get_canvas_id(page_id)
+        page = self._page_targets(annotation.page_id)
         if "coords" in annotation.metadata:
             coords = annotation.metadata["coords"]
             if isinstance(coords, Coords):
                 coords = [coords]
-            targets.extend(self._make_image_targets(page_id, coords))
+            svg_selector = self._svg_selector([c.points for c in coords])
+            targets.extend(self._make_image_targets(page, coords, svg_selector))
             xywh_list = [self._to_xywh(c) for c in coords]
-            points = [c.points for c in coords]
-            canvas_target = self._canvas_target(canvas_url=canvas_id, xywh_list=xywh_list, coords_list=points)
+            canvas_target = self._canvas_target(canvas_url=page.canvas_id, xywh_list=xywh_list,
+                                                svg_selector=dict(svg_selector))
             targets.append(canvas_target)
         if annotation.type == PAGE_TYPE:
-            iiif_base_url = self.get_iiif_base_url(page_id)
-            iiif_url = f"{iiif_base_url}/full/max/0/default.jpg"
             targets.extend([
                 {
-                    "source": iiif_url,
+                    "source": page.iiif_url,
                     "type": "Image"
                 },
                 {
                     '@context': self.ANNO_CONTEXT,
-                    'source': canvas_id,
+                    'source': page.canvas_id,
                     'type': "Canvas",
                 }
             ])
@@ -147,6 +170,17 @@ class WebAnnotationFactory:
         )
         return targets
 
+    def _page_targets(self, page_id: str) -> '_PageTargets':
+        page = self._page_targets_cache.get(page_id)
+        if page is None:
+            if len(self._page_targets_cache) >= self.PAGE_CACHE_SIZE:
+                self._page_targets_cache.clear()
+            iiif_base_url = self.get_iiif_base_url(page_id)
+            page = _PageTargets(canvas_id=self._get_canvas_id(page_id), iiif_base_url=iiif_base_url,
+                                iiif_url=f"{iiif_base_url}/full/max/0/default.jpg")
+            self._page_targets_cache[page_id] = page
+        return page
+
     @staticmethod
     def _to_xywh(coords: Coords):
         return f"{coords.left},{coords.top},{coords.width},{coords.height}"
@@ -159,18 +193,10 @@ class WebAnnotationFactory:
         canvas_id = f"https://data.globalise.huygens.knaw.nl/manifests/inventories/{inventory_number}.json/canvas/p{page_num}"
         return canvas_id
 
-    def _init_iiif_base_url_idx(self, path: str):
-        logger.info(f"<= {path}...")
-        with open(path) as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                self.iiif_base_url_idx[row["pagexml_id"]] = row["iiif_base_url"]
-        logger.info("... done")
-
-    def _make_image_targets(self, page_id: str, coords: list[Coords]) -> list[dict[str, any]]:
+    def _make_image_targets(self, page: '_PageTargets', coords: list[Coords], svg_selector: dict[str, str]) \
+            -> list[dict[str, any]]:
         targets = []
-        iiif_base_url = self.get_iiif_base_url(page_id)
-        iiif_url = f"{iiif_base_url}/full/max/0/default.jpg"
+        iiif_base_url = page.iiif_base_url
         selectors = []
         for c in coords:
             xywh = f"{c.box['x']},{c.box['y']},{c.box['w']},{c.box['h']}"
@@ -187,10 +213,9 @@ class WebAnnotationFactory:
             }
             targets.append(target)
 
-        svg_target = self._image_target_wth_svg_selector(iiif_url, [c.points for c in coords])
-        selectors.append(svg_target['selector'])
+        selectors.append(svg_selector)
         target = {
-            "source": iiif_url,
+            "source": page.iiif_url,
             "type": "Image",
             "selector": selectors
         }
@@ -199,12 +224,11 @@ class WebAnnotationFactory:
         return targets
 
     def get_iiif_base_url(self, page_id: str) -> str:
-        if page_id not in self.iiif_base_url_idx:
+        iiif_base_url = self.iiif_base_url_idx.get(page_id)
+        if iiif_base_url is None:
             logger.error(f"{page_id} not found in {self._iiif_mapping_file}")
-        if page_id not in self.iiif_base_url_idx:
-            logger.error(f"page_id {page_id} not in .iiif_base_url_idx")
             return ""
-        return self.iiif_base_url_idx[page_id]
+        return iiif_base_url
 
     def _make_text_targets(self, annotation: Annotation):
         _physical_text_anchor_selector_target = self.physical_text_anchor_selector_target(annotation.physical_span)
@@ -232,7 +256,7 @@ class WebAnnotationFactory:
 
     def _text_anchor_selector_target(self, target_type: str, text_span: TextSpan) -> dict[str, any]:
         target = {
-            'source': f"{self.textrepo_base_uri}/rest/versions/{text_span.textrepo_version_id}/contents",
+            'source': self._version_uri(text_span.textrepo_version_id) + "/contents",
             'type': target_type,
             "selector": {
                 '@context': self.ANNO_CONTEXT,
@@ -253,6 +277,15 @@ class WebAnnotationFactory:
 
         return target
 
+    def _version_uri(self, version_id: str) -> str:
+        version_uri = self._version_uris.get(version_id)
+        if version_uri is None:
+            if len(self._version_uris) >= self.PAGE_CACHE_SIZE:
+                self._version_uris.clear()
+            version_uri = f"{self.textrepo_base_uri}/rest/versions/{version_id}"
+            self._version_uris[version_id] = version_uri
+        return version_uri
+
     def physical_text_cutout_target(self, text_span: TextSpan) -> dict[str, str]:
         return self._text_cutout_target("Text", text_span)
 
@@ -274,7 +307,7 @@ class WebAnnotationFactory:
             }
 
     def _canvas_target(self, canvas_url: str, xywh_list: list[str] = None,
-                       coords_list: list[list[Tuple[int, int]]] = None) -> dict:
+                       coords_list: list[list[Tuple[int, int]]] = None, svg_selector: dict[str, str] = None) -> dict:
         selectors = []
         if xywh_list:
             for xywh in xywh_list:
@@ -283,7 +316,9 @@ class WebAnnotationFactory:
                     "type": "iiif:ImageApiSelector",
                     "region": xywh
                 })
-        if coords_list:
+        if svg_selector:
+            selectors.append(svg_selector)
+        elif coords_list:
             selectors.append(self._svg_selector(coords_list))
         return {
             '@context': self.ANNO_CONTEXT,
@@ -306,11 +341,10 @@ class WebAnnotationFactory:
         height = 0
         width = 0
         for coords in coords_list:
-            height = max(height, max([c[1] for c in coords]))
-            width = max(width, max([c[0] for c in coords]))
-            path_def = ' '.join([f"L{c[0]} {c[1]}" for c in coords]) + " Z"
-            path_def = 'M' + path_def[1:]
-            path_defs.append(path_def)
+            xs, ys = zip(*coords)
+            height = max(height, max(ys))
+            width = max(width, max(xs))
+            path_defs.append("M" + " L".join(f"{x} {y}" for x, y in coords) + " Z")
         path = f"""<path d="{' '.join(path_defs)}"/>"""
         return {
             'type': "SvgSelector",
@@ -318,6 +352,12 @@ class WebAnnotationFactory:
         }
 
 
+class _PageTargets(NamedTuple):
+    canvas_id: str
+    iiif_base_url: str
+    iiif_url: str
+
+
 def na_url(file_path):
     file_name = file_path.split('/')[-1]
     file = file_name.replace('.xml', '')
@@ -648,6 +688,12 @@ def to_web_annotation(annotation: Annotation, webannotation_factory: WebAnnotati
     return WebAnnotation(body=body, target=targets)
 
 
+def to_web_annotations(annotations: list[Annotation], webannotation_factory: WebAnnotationFactory) \
+        -> list[WebAnnotation]:
+    targets_list = webannotation_factory.annotation_targets_batch(annotations)
+    return [WebAnnotation(body=annotation_body(a), target=targets) for a, targets in zip(annotations, targets_list)]
+
+
 def annotation_body(annotation: Annotation):
     body = {
         "@context": {"tt": "https://knaw-huc.github.io/ns/team-text#", "px": "https://knaw-huc.github.io/ns/pagexml#"},
@@ -690,22 +736,23 @@ break_chars = [break_char1, break_char2]
 
 
 def paragraph_text(lines: list[str]) -> str:
-    if lines:
-        # ic(lines)
-        for i in range(0, len(lines) - 1):
-            line0 = lines[i]
-            line1 = lines[i + 1]
-            if line0 and line0[-1] in break_chars:
-                lines[i] = line0.rstrip(line0[-1])
-                lines[i + 1] = line1.lstrip(break_char1).lstrip(break_char2)
-            # elif line0 and line1[0] in break_chars:
-            #     lines[i + 1] = line1[1:]
-            else:
-                lines[i] = f"{line0} "
-        # ic(lines)
-        return "".join(lines) + "\n"
-    else:
+    if not lines:
         return ""
+    builder = TextBuilder()
+    line = lines[0]
+    for next_line in lines[1:]:
+        if line and line[-1] in break_chars:
+            builder.append(line.rstrip(line[-1]))
+            next_line = next_line.lstrip(break_char1).lstrip(break_char2)
+        # elif line and next_line[0] in break_chars:
+        #     next_line = next_line[1:]
+        else:
+            builder.append(line)
+            builder.append(" ")
+        line = next_line
+    builder.append(line)
+    builder.append("\n")
+    return builder.build()
 
 
 def print_annotations(cas):
@@ -716,20 +763,20 @@ def print_annotations(cas):
 
 
 def join_words(px_words):
-    text = ""
+    builder = TextBuilder()
     last_text_region = None
     last_line = None
     for w in px_words:
         if w.text_region_id == last_text_region:
             if w.line_id != last_line:
-                text += "|\n"
-            text += " "
+                builder.append("|\n")
+            builder.append(" ")
         else:
-            text += "\n\n"
-        text += w.text
+            builder.append("\n\n")
+        builder.append(w.text)
         last_text_region = w.text_region_id
         last_line = w.line_id
-    return text.strip()
+    return builder.build().strip()
 
 
 def seconds_to_hhmmss(seconds):
@@ -770,19 +817,20 @@ class TextPair:
 SEARCH_WINDOW = 10000
 
 
-def make_word_interval_tree(
+def make_word_offsets(
         text: str,
         iiif_base_uri: str,
         canvas_id: str,
         text_words: list[PageXMLWord],
         debug: bool = False
-) -> IntervalTree:
+) -> WordOffsets:
     if debug:
+        from icecream import ic
         text_from_words = " ".join([w.text for w in text_words])
         ic(text, text_from_words)
-    itree = IntervalTree()
+    word_offsets = WordOffsets()
     find_start = 0
-    for w in text_words:
+    for word_index, w in enumerate(text_words):
         substring = w.text.strip(WORD_BREAK_CHARACTERS)
         if needs_finding(substring):
             notice = ''
@@ -803,13 +851,20 @@ def make_word_interval_tree(
                 end_exc = offset + len(substring)
                 if debug:
                     print(f"[{offset:4}:{end_exc:4}]{notice} <{substring}> | <{text[offset:end_exc]}>")
-                itree[offset:end_exc] = {
-                    "iiif_base_uri": iiif_base_uri,
-                    "canvas_id": canvas_id,
-                    "coords": w.coords.points
-                }
+                word_offsets.append(offset, end_exc, w.coords.points, iiif_base_uri, canvas_id, word_index)
                 find_start = end_exc
-    return itree
+    return word_offsets
+
+
+def make_word_interval_tree(
+        text: str,
+        iiif_base_uri: str,
+        canvas_id: str,
+        text_words: list[PageXMLWord],
+        debug: bool = False
+) -> 'IntervalTree':
+    return make_word_offsets(text=text, iiif_base_uri=iiif_base_uri, canvas_id=canvas_id, text_words=text_words,
+                             debug=debug).as_interval_tree()
 
 
 def needs_finding(substring):
@@ -820,7 +875,9 @@ def needs_finding0(substring):
     return substring not in WORD_BREAK_CHARACTERS and substring not in ['„.', '.„', '-„', '„-', '_„', '„_']
 
 
-def make_word_interval_tree0(text: str, text_words: list[PageXMLWord]) -> IntervalTree:
+def make_word_interval_tree0(text: str, text_words: list[PageXMLWord]) -> 'IntervalTree':
+    from icecream import ic
+    from intervaltree import IntervalTree
     text_from_words = " ".join([w.text for w in text_words])
     ic(text, text_from_words)
     itree = IntervalTree()
@@ -852,7 +909,7 @@ def extract_paragraph_text(
         iiif_base_uri: str = "<missing iiif_base_uri>",
         canvas_id: str = "<missing canvas_id>",
         verbose: bool = False,
-) -> Tuple[str, list[Tuple[int, int]], Tuple[int, int], list[Tuple[int, int]], IntervalTree]:
+) -> Tuple[str, list[Tuple[int, int]], Tuple[int, int], list[Tuple[int, int]], WordOffsets]:
     paragraphs = []
     headers = []
     marginalia = []
@@ -883,32 +940,25 @@ def extract_paragraph_text(
     marginalia_ranges = []
     header_range = None
     paragraph_ranges = []
-    offset = 0
-    text = ""
+    builder = TextBuilder()
     for m in marginalia:
-        text += m.text
-        text_len = len(text)
-        marginalia_ranges.append((offset, text_len))
-        offset = text_len
+        marginalia_ranges.append(builder.append(m.text))
         text_words.extend(m.words)
     if headers:
         h = headers[0]
-        text += f"\n{h.text}\n"
-        text_len = len(text)
-        header_range = (offset + 1, text_len - 1)
-        offset = text_len
+        builder.append("\n")
+        header_range = builder.append(h.text)
+        builder.append("\n")
         text_words.extend(h.words)
     for m in paragraphs:
-        text += m.text
-        text_len = len(text)
-        paragraph_ranges.append((offset, text_len))
-        offset = text_len
+        paragraph_ranges.append(builder.append(m.text))
         text_words.extend(m.words)
-    itree = make_word_interval_tree(text=text, text_words=text_words, iiif_base_uri=iiif_base_uri, canvas_id=canvas_id,
-                                    debug=False)
+    text = builder.build()
+    word_offsets = make_word_offsets(text=text, text_words=text_words, iiif_base_uri=iiif_base_uri,
+                                     canvas_id=canvas_id, debug=False)
     # if '  ' in text:
     #     logger.error('double space in text')
-    return text, marginalia_ranges, header_range, paragraph_ranges, itree
+    return text, marginalia_ranges, header_range, paragraph_ranges, word_offsets
 
 
 _RE_COMBINE_WHITESPACE = re.compile(r"\s+")
@@ -0,0 +1,170 @@
+import csv
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Iterator, Optional, Union
+
+from loguru import logger
+
+# magic, format version, number of keys, length of the keys blob, length of the values blob
+_HEADER = struct.Struct("=4sIQQQ")
+_MAGIC = b"GTUI"
+_FORMAT_VERSION = 1
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class UrlIndex:
+    """
+    A read-only str -> str mapping (page id -> scan url), kept in a sorted, memory-mapped file written by
+    write_url_index().
+
+    The file is mapped on first lookup, so creating a UrlIndex costs nothing, and the pages of the mapping are shared
+    by all processes reading the same file. Lookups bisect the sorted keys. Pickling a UrlIndex only passes the path,
+    every process maps the file itself.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mapped = None
+        self._size = 0
+        self._key_offsets = None
+        self._value_offsets = None
+        self._keys = None
+        self._values = None
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mapped)
+        magic, version, n, keys_length, values_length = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"{self.path}: not a url index (magic={magic}, version={version})")
+        position = _HEADER.size
+        offsets_size = (n + 1) * 8
+        self._key_offsets = view[position:position + offsets_size].cast('q')
+        position += offsets_size
+        self._value_offsets = view[position:position + offsets_size].cast('q')
+        position += offsets_size
+        self._keys = view[position:position + keys_length]
+        position = _padded(position + keys_length)
+        self._values = view[position:position + values_length]
+        self._size = n
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._keys[self._key_offsets[i]:self._key_offsets[i + 1]])
+
+    def _value(self, i: int) -> str:
+        return str(self._values[self._value_offsets[i]:self._value_offsets[i + 1]], 'utf8')
+
+    def _index_of(self, key: str) -> int:
+        if self._mapped is None:
+            self._open()
+        encoded = key.encode('utf8')
+        i = bisect_left(_Keys(self), encoded)
+        if i < self._size and self._key(i) == encoded:
+            return i
+        return -1
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        i = self._index_of(key)
+        return default if i < 0 else self._value(i)
+
+    def __getitem__(self, key: str) -> str:
+        i = self._index_of(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._value(i)
+
+    def __contains__(self, key: str) -> bool:
+        return self._index_of(key) >= 0
+
+    def __len__(self) -> int:
+        if self._mapped is None:
+            self._open()
+        return self._size
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield str(self._key(i), 'utf8')
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for i in range(len(self)):
+            yield str(self._key(i), 'utf8'), self._value(i)
+
+
+class _Keys:
+    # the sorted keys of a UrlIndex as a sequence, for bisect
+
+    def __init__(self, url_index: UrlIndex):
+        self.url_index = url_index
+
+    def __len__(self):
+        return self.url_index._size
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.url_index._key(i)
+
+
+def write_url_index(mapping: dict[str, str], path: str):
+    keys = sorted(mapping, key=lambda k: k.encode('utf8'))
+    key_offsets = [0]
+    value_offsets = [0]
+    encoded_keys = []
+    encoded_values = []
+    for k in keys:
+        encoded_key = k.encode('utf8')
+        encoded_value = mapping[k].encode('utf8')
+        encoded_keys.append(encoded_key)
+        encoded_values.append(encoded_value)
+        key_offsets.append(key_offsets[-1] + len(encoded_key))
+        value_offsets.append(value_offsets[-1] + len(encoded_value))
+    keys_blob = b''.join(encoded_keys)
+    values_blob = b''.join(encoded_values)
+    tmp_path = f"{path}.tmp"
+    logger.info(f"=> {path}")
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(keys), len(keys_blob), len(values_blob)))
+        f.write(struct.pack(f"={len(key_offsets)}q", *key_offsets))
+        f.write(struct.pack(f"={len(value_offsets)}q", *value_offsets))
+        f.write(keys_blob)
+        f.write(bytes(_padded(len(keys_blob)) - len(keys_blob)))
+        f.write(values_blob)
+    os.replace(tmp_path, path)
+
+
+def is_url_index(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(_MAGIC)) == _MAGIC
+
+
+def index_path_for(mapping_path: str) -> str:
+    return f"{os.path.splitext(mapping_path)[0]}.idx"
+
+
+def read_url_mapping(path: str, key_field: str = "pagexml_id", value_field: str = "iiif_base_url") \
+        -> Union[UrlIndex, dict[str, str]]:
+    """
+    The mapping in path, which can be a url index, a json object, or a csv file with key_field and value_field columns.
+    When a url index exists next to a json or csv file (with the .idx extension), that index is used instead.
+    """
+    if is_url_index(path):
+        return UrlIndex(path)
+    index_path = index_path_for(path)
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+        return UrlIndex(index_path)
+    logger.info(f"<= {path}")
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return {row[key_field]: row[value_field] for row in csv.DictReader(f)}
@@ -0,0 +1,242 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple, Iterable, Iterator, Union, Optional
+
+
+class WordInterval(NamedTuple):
+    begin: int
+    end: int
+    data: dict[str, any]
+
+
+# magic, format version, number of words, number of coordinate points, length of the sources json
+_HEADER = struct.Struct("=4sIQQQ")
+_MAGIC = b"GTWO"
+_FORMAT_VERSION = 1
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class WordOffsets:
+    """
+    Maps text offsets to the PageXML words they were taken from.
+
+    The intervals are kept in parallel integer arrays sorted on begin offset, with the word coordinates (flattened,
+    with a start offset per word) and the (iiif_base_uri, canvas_id) of every word stored separately. Overlap queries
+    use bisect, and support the slice syntax of intervaltree.IntervalTree, so a WordOffsets can be used where the
+    interval tree used to be: `word_offsets[begin:end]` returns the intervals overlapping [begin, end).
+
+    to_bytes() serializes the columns as is; from_buffer() reads them back as memoryviews over the buffer,
+    without copying.
+    """
+
+    def __init__(self):
+        self.begins = array('q')
+        self.ends = array('q')
+        self.word_indexes = array('q')
+        self._max_ends = array('q')
+        self._source_indexes = array('q')
+        self._coord_offsets = array('q', [0])
+        self._flat_coords = array('i')
+        self._sources = []
+        self._source_index = {}
+
+    @classmethod
+    def from_intervals(cls, intervals: Iterable[Union[WordInterval, tuple, list]]) -> 'WordOffsets':
+        """
+        Build from (begin, end, data) triples, as stored in the text_intervals of older document data.
+        """
+        word_offsets = cls()
+        for word_index, (begin, end, data) in enumerate(sorted(intervals, key=lambda iv: (iv[0], iv[1]))):
+            word_offsets.append(begin, end, data["coords"], data["iiif_base_uri"], data["canvas_id"], word_index)
+        return word_offsets
+
+    @classmethod
+    def from_buffer(cls, buffer) -> 'WordOffsets':
+        view = memoryview(buffer).cast('B')
+        magic, version, n, n_points, sources_length = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"not a word offsets buffer (magic={magic}, version={version})")
+        position = _HEADER.size
+
+        def column(type_code: str, count: int) -> memoryview:
+            nonlocal position
+            size = count * struct.calcsize(type_code)
+            values = view[position:position + size].cast(type_code)
+            position = _padded(position + size)
+            return values
+
+        word_offsets = cls()
+        word_offsets._sources = [tuple(s) for s in json.loads(bytes(column('B', sources_length)))]
+        word_offsets.begins = column('q', n)
+        word_offsets.ends = column('q', n)
+        word_offsets._max_ends = column('q', n)
+        word_offsets.word_indexes = column('q', n)
+        word_offsets._source_indexes = column('q', n)
+        word_offsets._coord_offsets = column('q', n + 1)
+        word_offsets._flat_coords = column('i', 2 * n_points)
+        return word_offsets
+
+    def to_bytes(self) -> bytes:
+        sources = json.dumps(self._sources, ensure_ascii=False).encode('utf8')
+        parts = [
+            _HEADER.pack(_MAGIC, _FORMAT_VERSION, len(self.begins), len(self._flat_coords) // 2, len(sources)),
+            sources
+        ]
+        columns = [self.begins, self.ends, self._max_ends, self.word_indexes, self._source_indexes,
+                   self._coord_offsets, self._flat_coords]
+        parts.extend(bytes(c) for c in columns)
+        return b''.join(part + bytes(_padded(len(part)) - len(part)) for part in parts)
+
+    def append(self, begin: int, end: int, coords: Iterable[tuple[int, int]], iiif_base_uri: str, canvas_id: str,
+               word_index: int = None):
+        if self.begins and begin < self.begins[-1]:
+            raise ValueError(f"intervals must be appended in order of begin offset: {begin} < {self.begins[-1]}")
+        source = (iiif_base_uri, canvas_id)
+        source_index = self._source_index.get(source)
+        if source_index is None:
+            source_index = len(self._sources)
+            self._sources.append(source)
+            self._source_index[source] = source_index
+        self.word_indexes.append(len(self.begins) if word_index is None else word_index)
+        self.begins.append(begin)
+        self.ends.append(end)
+        self._max_ends.append(max(end, self._max_ends[-1]) if self._max_ends else end)
+        self._source_indexes.append(source_index)
+        for x, y in coords:
+            self._flat_coords.append(x)
+            self._flat_coords.append(y)
+        self._coord_offsets.append(len(self._flat_coords) // 2)
+
+    def coords(self, i: int) -> list[tuple[int, int]]:
+        flat = self._flat_coords[2 * self._coord_offsets[i]:2 * self._coord_offsets[i + 1]]
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def overlap_indexes(self, begin: int, end: int) -> range:
+        """
+        The range of candidate positions for intervals overlapping [begin, end); only those with ends[i] > begin
+        actually overlap, which is all of them when the intervals do not overlap each other.
+        """
+        if begin >= end:
+            return range(0)
+        first = bisect_right(self._max_ends, begin)
+        last = bisect_left(self.begins, end)
+        return range(first, max(first, last))
+
+    def overlap(self, begin: int, end: int) -> list[WordInterval]:
+        return [self.interval(i) for i in self.overlap_indexes(begin, end) if self.ends[i] > begin]
+
+    def at(self, point: int) -> list[WordInterval]:
+        return self.overlap(point, point + 1)
+
+    def interval(self, i: int) -> WordInterval:
+        iiif_base_uri, canvas_id = self._sources[self._source_indexes[i]]
+        return WordInterval(
+            self.begins[i],
+            self.ends[i],
+            {"iiif_base_uri": iiif_base_uri, "canvas_id": canvas_id, "coords": self.coords(i)}
+        )
+
+    def as_interval_tree(self):
+        from intervaltree import IntervalTree, Interval
+        return IntervalTree(Interval(*iv) for iv in self)
+
+    def __getitem__(self, index: Union[slice, int]) -> list[WordInterval]:
+        if isinstance(index, slice):
+            return self.overlap(index.start, index.stop)
+        return self.at(index)
+
+    def __iter__(self) -> Iterator[WordInterval]:
+        return (self.interval(i) for i in range(len(self.begins)))
+
+    def __len__(self) -> int:
+        return len(self.begins)
+
+    def __bool__(self) -> bool:
+        return len(self.begins) > 0
+
+
+class WordOffsetsWriter:
+    """
+    Appends serialized WordOffsets to a sidecar file, and returns the reference to store in the document data.
+    The file is only ever appended to, so references written by earlier runs stay valid.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def write(self, word_offsets: WordOffsets, previous_ref: Optional[dict[str, any]] = None) -> dict[str, any]:
+        blob = word_offsets.to_bytes()
+        if previous_ref and read_blob(previous_ref) == blob:
+            return previous_ref
+        offset = self._file.tell()
+        self._file.write(blob)
+        self._file.flush()
+        return {"path": self.path, "offset": offset, "length": len(blob)}
+
+
+# the most recently used sidecar file mappings; a run over all inventories reads one file per inventory
+MAX_MAPPED_FILES = 8
+_mmaps: OrderedDict[str, mmap.mmap] = OrderedDict()
+
+
+def read_blob(ref: dict[str, any]) -> Optional[memoryview]:
+    path, offset, length = ref["path"], ref["offset"], ref["length"]
+    mapped = _mmaps.get(path)
+    if mapped is None or offset + length > len(mapped):
+        # not mapped yet, or the file has grown since it was mapped
+        if not os.path.exists(path) or os.path.getsize(path) < offset + length:
+            return None
+        if mapped is not None:
+            _release(_mmaps.pop(path))
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _mmaps[path] = mapped
+        while len(_mmaps) > MAX_MAPPED_FILES:
+            _release(_mmaps.popitem(last=False)[1])
+    _mmaps.move_to_end(path)
+    return memoryview(mapped)[offset:offset + length]
+
+
+def close_mapped_files():
+    while _mmaps:
+        _release(_mmaps.popitem()[1])
+
+
+def _release(mapped: mmap.mmap):
+    try:
+        mapped.close()
+    except BufferError:
+        # WordOffsets loaded from it still use its pages; it is unmapped when the last of them is released
+        pass
+
+
+def load_word_offsets(document_data_entry: dict[str, any]) -> WordOffsets:
+    """
+    The WordOffsets of a document data entry, either from its text_intervals_ref into a sidecar file,
+    or from the inline text_intervals of older entries.
+    """
+    if "text_intervals_ref" in document_data_entry:
+        blob = read_blob(document_data_entry["text_intervals_ref"])
+        if blob is None:
+            raise ValueError(f"missing text intervals: {document_data_entry['text_intervals_ref']}")
+        return WordOffsets.from_buffer(blob)
+    return WordOffsets.from_intervals(document_data_entry.get("text_intervals", []))
@@ -1,10 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 import json
-from itertools import zip_longest
+from typing import Iterator
 
-from annorepo.client import AnnoRepoClient
-from icecream import ic
 from loguru import logger
 
 ids = ["NL-HaNA_1.04.02_1092_0017",
@@ -107,40 +105,43 @@ wa = [
 
 
 @logger.catch
-def access_annorepo(base_uri: str, api_key: str, container_name: str):
+def access_annorepo(base_uri: str, api_key: str, container_name: str, max_in_flight: int = 4,
+                    batch_size: int = 200, journal_path: str = None):
+    from annorepo.client import AnnoRepoClient
+    from icecream import ic
     arc = AnnoRepoClient(base_uri, api_key=api_key)
     ic(arc.get_about())
     # container_name = "tmp"
     # container_name = "globalise-demo-1"
     if not arc.has_container(container_name):
         make_container(arc, container_name)
-    upload_annotations(arc, container_name)
+    upload_annotations(base_uri, api_key, container_name, max_in_flight, batch_size, journal_path)
     # r = arc.delete_container(container_name, eTag)
     # ic(r)
 
 
-def make_chunks_of_size(chunk_size, big_list):
-    chunked_list = [list(item) for item in list(zip_longest(*[iter(big_list)] * chunk_size, fillvalue=''))]
-    chunked_list[-1] = [x for x in chunked_list[-1] if x]
-    return chunked_list
-
-
-def upload_annotations(arc, container_name):
-    print(f"uploading annotations to container {container_name}:")
-    for a in wa:
+def read_annotations(paths: list[str]) -> Iterator[dict[str, any]]:
+    for a in paths:
         print(f"reading {a}")
         with open(a) as f:
             annotations = json.load(f)
-
         print(f"uploading {len(annotations)} annotations")
-        chunks = make_chunks_of_size(200, annotations)
-        for annos in chunks:
-            # ic(annos)
-            r = arc.add_annotations(container_name, annotation_list=annos)
-            # ic(r)
+        yield from annotations
+
+
+def upload_annotations(base_uri: str, api_key: str, container_name: str, max_in_flight: int, batch_size: int,
+                       journal_path: str):
+    from globalise_tools.annorepo_tools import BulkUploader, AdaptiveBatchSize
+    print(f"uploading annotations to container {container_name}:")
+    with BulkUploader(base_uri, container_name, api_key=api_key, max_in_flight=max_in_flight,
+                      batch_size=AdaptiveBatchSize(initial=batch_size), journal_path=journal_path) as uploader:
+        report = uploader.upload(read_annotations(wa))
+    print(f"uploaded {report.uploaded} annotations in {report.batches} batches ({report.retries} retries),"
+          f" skipped {report.skipped} annotations uploaded before")
 
 
 def make_container(arc, container_name):
+    from icecream import ic
     (eTag, location, json_content) = arc.create_container(container_name, "Container for globalise annotations")
     ic(eTag, location, json_content)
 
@@ -165,9 +166,26 @@ def get_arguments():
                         required=False,
                         help="The API key for authorization",
                         type=str)
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of batch uploads to run at the same time",
+                        default=4,
+                        type=int)
+    parser.add_argument("-b",
+                        "--batch-size",
+                        help="The initial number of annotations per batch; it adapts to the server's response times",
+                        default=200,
+                        type=int)
+    parser.add_argument("-j",
+                        "--journal",
+                        required=False,
+                        help="The file recording the uploaded batches, to resume an interrupted upload of the same"
+                             " annotation files; use a new file for every other upload",
+                        type=str)
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     args = get_arguments()
-    access_annorepo(args.annorepo_url, args.api_key, args.container_name)
+    access_annorepo(args.annorepo_url, args.api_key, args.container_name, args.workers, args.batch_size,
+                    args.journal)
@@ -14,7 +14,7 @@ from pagexml.model.physical_document_model import PageXMLScan
 from textrepo.client import TextRepoClient
 
 import globalise_tools.tools as gt
-from globalise_tools.model import WebAnnotation, AnnotationEncoder
+from globalise_tools.model import WebAnnotation, dumps
 
 
 @dataclass_json
@@ -118,7 +118,7 @@ def parse_pagexmls(
         document_lines.extend(lines)
         document_annotations.extend(annotations)
     segmented_text = {"_ordered_segments": document_lines}
-    web_annotations = [gt.to_web_annotation(a, waf) for a in document_annotations]
+    web_annotations = gt.to_web_annotations(document_annotations, waf)
     return segmented_text, web_annotations
 
 
@@ -134,7 +134,7 @@ def store_annotations(base_dir: str, web_annotations: list[WebAnnotation]) -> st
     path = f"{base_dir}/web_annotations.json"
     logger.debug(f"=> {path}")
     with open(path, 'w') as f:
-        json.dump(web_annotations, fp=f, indent=4, cls=AnnotationEncoder, ensure_ascii=False)
+        f.write(dumps(web_annotations, indent=4, ensure_ascii=False))
     return path
 
 
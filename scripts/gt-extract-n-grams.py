@@ -3,9 +3,10 @@ import argparse
 from collections import Counter
 
 import pagexml.helper.pagexml_helper as pxh
-import pagexml.parser as pxp
 from loguru import logger
 
+import globalise_tools.pagexml_cache as pxc
+
 
 @logger.catch
 def get_arguments():
@@ -26,7 +27,7 @@ def extract_ngrams(page_xml_paths: list[str]):
     word_counter = Counter()
     for page_xml_path in page_xml_paths:
         logger.info(f"<= {page_xml_path}")
-        scan_doc = pxp.parse_pagexml_file(page_xml_path)
+        scan_doc = pxc.parse_pagexml_file(page_xml_path)
         for tr in scan_doc.get_text_regions_in_reading_order():
             tr_text, _ = pxh.make_text_region_text(tr.lines,
                                                    word_break_chars=word_break_chars)
@@ -2,15 +2,17 @@
 import glob
 import json
 import os
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
 import progressbar
 from loguru import logger
 
-from globalise_tools.nav_provider import index_path_for_inv_nr
+from globalise_tools.nav_provider import index_path_for_inv_nr, NavIndexWriter, DEFAULT_NAV_INDEX_PATH
 
 
 @logger.catch
 def main() -> None:
+    args = get_arguments()
     widgets = [
         '[',
         progressbar.SimpleProgress(),
@@ -20,10 +22,11 @@ def main() -> None:
         progressbar.ETA(),
         ']'
     ]
-    paths = manifest_paths("/Users/bram/e/globalise/manifests/inventories")
-    with progressbar.ProgressBar(widgets=widgets, max_value=len(paths), redirect_stdout=True) as bar:
+    paths = manifest_paths(args.manifest_dir)
+    with progressbar.ProgressBar(widgets=widgets, max_value=len(paths), redirect_stdout=True) as bar, \
+            NavIndexWriter(args.nav_index) as nav_index_writer:
         for i, path in enumerate(paths):
-            process_manifest(path)
+            process_manifest(path, nav_index_writer)
             bar.update(i)
 
 
@@ -44,13 +47,14 @@ def generate_prev_next_map(pagexml_ids: list[str]) -> dict[str, dict[str, str]]:
     return prev_next_idx
 
 
-def process_manifest(path):
+def process_manifest(path, nav_index_writer: NavIndexWriter):
     # logger.info(f"<= {path}")
     with open(path) as f:
         manifest = json.load(f)
     inv_nr = path.split('/')[-1].replace('.json', '')
     pagexml_ids = [i["label"]['en'][0] for i in manifest['items']]
     nav_idx = generate_prev_next_map(pagexml_ids)
+    nav_index_writer.add_inventory(inv_nr, pagexml_ids, nav_idx)
 
     path = index_path_for_inv_nr(inv_nr)
     dir_path = "/".join(path.split('/')[:-1])
@@ -60,5 +64,22 @@ def process_manifest(path):
         json.dump(nav_idx, fp=f, indent=4)
 
 
+def get_arguments():
+    parser = ArgumentParser(
+        description="Extract the prev/next page navigation from the inventory manifests",
+        formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m",
+                        "--manifest-dir",
+                        help="The directory with the inventory manifests",
+                        default="/Users/bram/e/globalise/manifests/inventories",
+                        type=str)
+    parser.add_argument("-n",
+                        "--nav-index",
+                        help="The global navigation index to build, used by NavProvider",
+                        default=DEFAULT_NAV_INDEX_PATH,
+                        type=str)
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
     main()
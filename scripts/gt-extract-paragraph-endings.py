@@ -3,9 +3,10 @@ import csv
 import json
 from collections import defaultdict
 
-import spacy
 from loguru import logger
 
+import globalise_tools.tokenization as tk
+
 file = "/Users/bram/workspaces/globalise/globalise-tools/data/globalise-word-joins-MH.csv"
 
 
@@ -26,25 +27,18 @@ def main():
     print(json.dumps(paragraph_line_markers_per_pagexml, indent=2))
 
 
-def tokenize(nlp, text: str) -> list[str]:
-    tokens = []
-    doc = nlp(text)
-    for sentence in doc.sents:
-        for token in [t for t in sentence if t.text != "\n"]:
-            tokens.append(token.text)
-    return tokens
+def tokenize(doc) -> list[str]:
+    return [token.text for token in tk.tokens(doc)]
 
 
 def extract_tokenized_paragraph_markers(np_records):
-    spacy_core = "nl_core_news_lg"
-    nlp = spacy.load(spacy_core)
-    paragraph_markers = []
+    tokenizer = tk.get_tokenizer(sentences=False)
+    lines = []
     for np in np_records:
-        line_0 = np['line n']
-        line_1 = np['line n+1']
-        line_0_tokens = tokenize(nlp, line_0)
-        line_1_tokens = tokenize(nlp, line_1)
-        paragraph_markers.append((line_0_tokens, line_1_tokens))
+        lines.append(np['line n'])
+        lines.append(np['line n+1'])
+    line_tokens = [tokenize(doc) for doc in tokenizer.pipe(lines)]
+    paragraph_markers = list(zip(line_tokens[0::2], line_tokens[1::2]))
     print(json.dumps(paragraph_markers, indent=2))
 
 
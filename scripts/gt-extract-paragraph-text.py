@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
 import csv
 import glob
-import json
 import os
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
 import pagexml.helper.pagexml_helper as pxh
-import pagexml.parser as px
 from loguru import logger
 from tqdm import tqdm
 
+import globalise_tools.pagexml_cache as pxc
 import globalise_tools.tools as gt
+from globalise_tools.run_state import RunState
 
 
 class ParagraphTextExtractor:
@@ -19,8 +19,8 @@ class ParagraphTextExtractor:
     def __init__(self, input_dir: str, output_dir: str):
         self.input_dir = input_dir
         self.output_dir = output_dir
-        self.processed_file = f"{self.output_dir}/extract-paragraph-text-processed-inv-nrs.json"
-        self.processed_inv_nrs = self.load_processed_files()
+        self.processed_inv_nrs = RunState(f"{self.output_dir}/extract-paragraph-text-processed-inv-nrs.jsonl",
+                                          legacy_path=f"{self.output_dir}/extract-paragraph-text-processed-inv-nrs.json")
 
     def extract_paragraph_text(self):
         inv_nrs = sorted(
@@ -31,8 +31,8 @@ class ParagraphTextExtractor:
                 progress_bar.set_description(f"skipping {inv_nr}, already processed")
             else:
                 self._process_inv(inv_nr, progress_bar)
-                self.processed_inv_nrs.add(inv_nr)
-                self.store_processed_files()
+                self.processed_inv_nrs.mark_done(inv_nr)
+        self.processed_inv_nrs.close()
 
     def _pagexml_paths(self, inv_nr: str) -> list[str]:
         return sorted(glob.glob(f"{self.input_dir}/{inv_nr}/NL-HaNA_1.04.02_{inv_nr}_*.xml"))
@@ -46,7 +46,7 @@ class ParagraphTextExtractor:
             for path in self._pagexml_paths(inv_nr):
                 parts = path.split('/')
                 page_no = parts[-1].split('_')[-1].replace('.xml', '')
-                scan_doc = px.parse_pagexml_file(pagexml_file=path)
+                scan_doc = pxc.parse_pagexml_file(pagexml_file=path)
                 for tr in [tr for tr in scan_doc.get_text_regions_in_reading_order() if gt.is_paragraph(tr)]:
                     lines_with_text = [l for l in tr.lines if l.text]
                     tr_text, line_ranges = pxh.make_text_region_text(lines_with_text,
@@ -54,19 +54,6 @@ class ParagraphTextExtractor:
                     if tr_text:
                         writer.writerow([inv_nr, page_no, tr.id, tr_text])
 
-    def load_processed_files(self):
-        if os.path.exists(self.processed_file):
-            logger.info(f"<= {self.processed_file}")
-            with open(self.processed_file) as f:
-                processed = set(json.load(f))
-        else:
-            processed = set()
-        return processed
-
-    def store_processed_files(self):
-        with open(self.processed_file, 'w') as f:
-            json.dump(list(self.processed_inv_nrs), fp=f)
-
 
 @logger.catch
 def get_arguments():
@@ -3,6 +3,8 @@ import json
 
 from loguru import logger
 
+from globalise_tools.url_index import write_url_index, index_path_for
+
 
 @logger.catch
 def main() -> None:
@@ -23,6 +25,7 @@ def main() -> None:
     logger.info(f"=> {mapping_json_path}")
     with open(mapping_json_path, "w") as f:
         json.dump(scan_url_mapping, f, ensure_ascii=False, indent=4)
+    write_url_index(scan_url_mapping, index_path_for(mapping_json_path))
 
 
 if __name__ == '__main__':
@@ -4,27 +4,28 @@ import csv
 import itertools
 import json
 import os
-from typing import AnyStr, Tuple
+from bisect import bisect_left, bisect_right
+from typing import AnyStr, Tuple, Optional
 
 import pagexml.parser as pxp
-import spacy
 from icecream import ic
 from loguru import logger
 from pagexml.model.physical_document_model import PageXMLScan
 
+import globalise_tools.tokenization as tk
 import globalise_tools.tools as gt
-from globalise_tools.model import TRVersions, GTToken, WebAnnotation, AnnotationEncoder
-
-spacy_core = "nl_core_news_lg"
+from globalise_tools.model import TRVersions, GTToken, WebAnnotation, dumps, configure_web_annotations, \
+    ID_STRATEGIES, ID_UUID4
 
 metadata_csv = "data/metadata_1618-1793_2022-08-30.csv"
 ground_truth_csv = "data/globalise-word-joins-MH.csv"
 textrepo_version_csv = "data/tr-versions.csv"
 
 metadata_records = []
+metadata_records_per_index_nr: dict[str, list[Tuple[int, int, dict[str, str]]]] = {}
 ground_truth = []
 tr_versions: dict[str, TRVersions] = {}
-nlp = None
+tokenizer: tk.Tokenizer = None
 
 
 def list_pagexml_files(directory: str):
@@ -109,12 +110,18 @@ def export(base_name: AnyStr,
     file_name = f"{base_name}-tokens.json"
     print(f"exporting tokens to {file_name}")
     with open(file_name, 'w', encoding='utf-8') as f:
-        json.dump(tokens, f, indent=2, cls=AnnotationEncoder)
+        f.write(dumps(tokens, indent=2))
+
+    # collect the segments and the CoNLL lines in the same pass over the tokens
+    segments = []
+    conll_lines = []
+    for t in tokens:
+        segments.append(t.text_with_ws if t.text_with_ws else "\n")
+        conll_lines.append(to_conll2002(t.text))
 
     file_name = f"{base_name}-segmented-text.json"
     print(f"exporting token segments to {file_name}")
     with open(file_name, 'w', encoding='utf-8') as f:
-        segments = [t.text_with_ws if t.text_with_ws else "\n" for t in tokens]
         wrapper = {
             "_ordered_segments": segments
         }
@@ -122,19 +129,18 @@ def export(base_name: AnyStr,
 
     file_name = f"{base_name}.conll"
     print(f"exporting tokens as CoNLL 2002 to {file_name}")
-    token_texts = [t.text for t in tokens]
     with open(file_name, 'w', encoding='utf-8') as f:
-        f.writelines(as_conll2002(token_texts))
+        f.writelines(conll_lines)
 
     metadata_file_name = f"{base_name}-metadata.json"
     print(f"exporting metadata to {metadata_file_name}")
     with open(metadata_file_name, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, cls=AnnotationEncoder)
+        f.write(dumps(metadata, indent=2))
 
     file_name = f"{base_name}-web-annotations.json"
     print(f"exporting web annotations to {file_name}")
     with open(file_name, 'w', encoding='utf-8') as f:
-        json.dump(web_annotations, f, indent=2, cls=AnnotationEncoder)
+        f.write(dumps(web_annotations, indent=2))
 
     print()
 
@@ -157,9 +163,9 @@ def tokenize(all_pars: list[str]) -> (list[str], list[int]):
     tokens = []
     offsets = []
     text = ''.join(all_pars)
-    doc = nlp(text)
+    doc = tk.get_tokenizer(sentences=True)(text)
     for sentence in doc.sents:
-        for token in [t for t in sentence if t.text != "\n"]:
+        for token in tk.tokens(sentence):
             tokens.append(token.text)
             offsets.append(token.idx)
         tokens.append("")
@@ -170,12 +176,11 @@ def tokenize(all_pars: list[str]) -> (list[str], list[int]):
 def tokenize_per_paragraph(all_pars: list[str]) -> list[GTToken]:
     tokens = []
     text_offset = 0
-    for par in all_pars:
-        doc = nlp(par)
-        for sentence in doc.sents:
-            for token in [t for t in sentence if t.text != "\n"]:
-                offset = text_offset + token.idx
-                tokens.append(GTToken(token.text, token.text_with_ws, offset))
+    # only the tokens are used, so the paragraphs are streamed through the tokenizer without sentence detection
+    for par, doc in zip(all_pars, tokenizer.pipe(all_pars)):
+        for token in tk.tokens(doc):
+            offset = text_offset + token.idx
+            tokens.append(GTToken(token.text, token.text_with_ws, offset))
         tokens.append(GTToken("", "", -1))
         text_offset += len(par)
     return tokens
@@ -184,47 +189,65 @@ def tokenize_per_paragraph(all_pars: list[str]) -> list[GTToken]:
 def read_metadata(basename: str) -> dict[str, str]:
     (_a, _b, index_nr, scan_nr) = basename.split("_")
     scan = int(scan_nr)
-    relevant = [r for r in metadata_records if
-                r['Indexnr'] == index_nr and int(r['Scan-begin']) <= scan <= int(r['Scan-Eind'])]
+    relevant = [r for (scan_begin, scan_end, r) in metadata_records_per_index_nr.get(index_nr, [])
+                if scan_begin <= scan <= scan_end]
     if len(relevant) > 1:
-        raise ">1 metadata records relevant"
+        raise Exception(">1 metadata records relevant")
     else:
         return relevant[0]
 
 
-def get_page_id(offset: int, length: int, scan_ranges) -> str:
-    range_start = offset
-    range_end = offset + length
-    overlapping_ranges = [sr for sr in scan_ranges.items()
-                          if sr[1][0] <= range_start < sr[1][1]]
-    if len(overlapping_ranges) == 1:
-        return overlapping_ranges[0][0]
+class PageRanges:
+    """
+    The page ids of a document, with their character ranges sorted on begin offset, to find the page of an offset
+    with bisect.
+    """
+
+    def __init__(self, scan_ranges: dict[str, Tuple[int, int]]):
+        sorted_ranges = sorted(scan_ranges.items(), key=lambda sr: sr[1])
+        self.page_ids = [page_id for page_id, _ in sorted_ranges]
+        self.begins = [begin for _, (begin, _) in sorted_ranges]
+        self.ends = [end for _, (_, end) in sorted_ranges]
+
+    def page_id(self, offset: int) -> Optional[str]:
+        i = bisect_right(self.begins, offset) - 1
+        if i >= 0 and offset < self.ends[i]:
+            return self.page_ids[i]
+        return None
+
+
+def get_page_id(offset: int, length: int, page_ranges: PageRanges) -> str:
+    page_id = page_ranges.page_id(offset)
+    if page_id:
+        return page_id
     else:
-        ic(range_start, range_end, overlapping_ranges)
+        ic(offset, offset + length)
         return ":placeholder:"
 
 
 def make_token_annotations(base_name, tokens, scan_ranges):
+    page_ranges = PageRanges(scan_ranges)
     annotations = []
     par_offset = 0
     par_length = 0
     par_num = 1
-    par_text = ""
+    par_tokens = []
     for i, gp_token in enumerate(tokens):
         token = gp_token.text
-        par_text += token + " "
+        par_tokens.append(token)
         offset = gp_token.offset
         token_is_paragraph_end = offset < 0
         if token_is_paragraph_end:
-            page_id = get_page_id(par_offset, par_length, scan_ranges)
+            page_id = get_page_id(par_offset, par_length, page_ranges)
+            par_text = " ".join(par_tokens)
             annotations.append(
                 gt.paragraph_annotation(base_name, page_id, par_num, par_offset, par_length, par_text.strip()))
             par_offset += par_length
             par_num += 1
-            par_text = ""
+            par_tokens = []
         else:
             token_length = len(token)
-            page_id = get_page_id(offset, token_length, scan_ranges)
+            page_id = get_page_id(offset, token_length, page_ranges)
             annotations.append(
                 gt.token_annotation(base_name=base_name, page_id=page_id, token_num=i, offset=offset,
                                     token_length=token_length, token_text=token, sentence_num=par_num))
@@ -235,7 +258,7 @@ def make_token_annotations(base_name, tokens, scan_ranges):
 
 def make_web_annotations(annotations: list[gt.Annotation], webannotation_factory: gt.WebAnnotationFactory) \
         -> list[WebAnnotation]:
-    return [gt.to_web_annotation(a, webannotation_factory) for a in annotations]
+    return gt.to_web_annotations(annotations, webannotation_factory)
 
 
 def ranges_per_scan(annotations: list[gt.Annotation]) -> dict[str, Tuple[int, int]]:
@@ -246,24 +269,41 @@ def ranges_per_scan(annotations: list[gt.Annotation]) -> dict[str, Tuple[int, in
     }
 
 
+class SegmentIndex:
+    """
+    The character offsets of the tokens (leaving out the paragraph end markers) with their segment index,
+    to find the segments of a character range with bisect. Token offsets increase through the document.
+    """
+
+    def __init__(self, tokens: list[GTToken]):
+        self.offsets = []
+        self.segment_indexes = []
+        for i, token in enumerate(tokens):
+            if token.offset > -1:
+                self.offsets.append(token.offset)
+                self.segment_indexes.append(i)
+
+    def segment_range(self, char_range_begin: int, char_range_end: int) -> Tuple[int, int]:
+        # the first token starting at or after the end of the range
+        end_position = bisect_left(self.offsets, char_range_end)
+        end_idx = self.segment_indexes[end_position - 1] if end_position > 0 else 0
+        begin_position = bisect_right(self.offsets, char_range_begin, 0,
+                                      min(end_position + 1, len(self.offsets))) - 1
+        begin_idx = self.segment_indexes[begin_position] if begin_position >= 0 else 0
+        return begin_idx, end_idx
+
+
 def segment_range(tokens: list[GTToken], char_range_begin: int, char_range_end: int):
-    begin_idx = 0
-    end_idx = 0
-    for i, token in enumerate(tokens):
-        if -1 < token.offset <= char_range_begin:
-            begin_idx = i
-        if -1 < token.offset < char_range_end:
-            end_idx = i
-        elif -1 < token.offset:
-            break
-    return begin_idx, end_idx
+    return SegmentIndex(tokens).segment_range(char_range_begin, char_range_end)
 
 
 def add_anchor_range(all_annotations: list[gt.Annotation], tokens: list[GTToken]):
+    segment_index = SegmentIndex(tokens)
     for a in all_annotations:
         char_range_begin = a.offset
         char_range_end = a.offset + a.length
-        a.physical_begin_anchor, a.physical_end_anchor = segment_range(tokens, char_range_begin, char_range_end)
+        a.physical_begin_anchor, a.physical_end_anchor = segment_index.segment_range(char_range_begin,
+                                                                                     char_range_end)
 
 
 def doc_annotation(base_name: str):
@@ -362,9 +402,9 @@ def add_tr_versions(all_annotations, external_id):
         a.txt_version_id = tr_versions[external_id].txt
 
 
-def init_spacy():
-    global nlp
-    nlp = spacy.load(spacy_core)
+def init_tokenizer(batch_size: int, processes: int, rule_based: bool):
+    global tokenizer
+    tokenizer = tk.get_tokenizer(sentences=False, rule_based=rule_based, batch_size=batch_size, n_process=processes)
 
 
 def load_metadata():
@@ -373,6 +413,8 @@ def load_metadata():
         reader = csv.DictReader(f)
         for i, row in enumerate(reader):
             metadata_records.append(row)
+            metadata_records_per_index_nr.setdefault(row['Indexnr'], []).append(
+                (int(row['Scan-begin']), int(row['Scan-Eind']), row))
     print()
 
 
@@ -412,6 +454,28 @@ def get_arguments():
                         required=False,
                         help="Set this to merge sections into one document",
                         action="store_true")
+    parser.add_argument("-b",
+                        "--batch-size",
+                        help="The number of paragraphs per spaCy batch",
+                        default=tk.DEFAULT_BATCH_SIZE,
+                        type=int)
+    parser.add_argument("-p",
+                        "--processes",
+                        help="The number of processes to use for tokenizing",
+                        default=1,
+                        type=int)
+    parser.add_argument("-r",
+                        "--rule-based",
+                        required=False,
+                        help="Set this to use the rule-based tokenizer instead of loading the spaCy model",
+                        action="store_true")
+    parser.add_argument("-a",
+                        "--annotation-ids",
+                        help="How to make the web annotation ids: random (uuid4), derived from the annotation (uuid5),"
+                             " or counting",
+                        choices=ID_STRATEGIES,
+                        default=ID_UUID4,
+                        type=str)
     parser.add_argument("directory",
                         help="A directory containing the PageXML files to extract the text from.",
                         nargs='+',
@@ -419,9 +483,10 @@ def get_arguments():
     return parser.parse_args()
 
 
-def process(directories, iiif_mapping_file, merge_sections):
+def process(directories, iiif_mapping_file, merge_sections, batch_size: int = tk.DEFAULT_BATCH_SIZE,
+            processes: int = 1, rule_based: bool = False):
     webannotation_factory = gt.WebAnnotationFactory(iiif_mapping_file)
-    init_spacy()
+    init_tokenizer(batch_size, processes, rule_based)
     load_metadata()
     load_ground_truth()
     load_tr_versions()
@@ -441,8 +506,10 @@ def process(directories, iiif_mapping_file, merge_sections):
 @logger.catch
 def main():
     args = get_arguments()
+    configure_web_annotations(id_strategy=args.annotation_ids)
     if args.directory:
-        process(args.directory, args.iiif_mapping_file, args.merge_sections)
+        process(args.directory, args.iiif_mapping_file, args.merge_sections, args.batch_size, args.processes,
+                args.rule_based)
 
 
 if __name__ == '__main__':
@@ -2,12 +2,13 @@
 import glob
 import json
 import sys
-from collections import defaultdict
+from contextlib import ExitStack
 from itertools import groupby
 
 import progressbar
 from loguru import logger
 
+from globalise_tools.annotation_sink import AnnotationSink
 from globalise_tools.nav_provider import NavProvider
 
 
@@ -23,20 +24,20 @@ def main(root_path) -> None:
         ']'
     ]
     paths = annotations_paths(path)
-    grouped_annotations = defaultdict(list)
     nav_provider = NavProvider()
-    with progressbar.ProgressBar(widgets=widgets, max_value=len(paths), redirect_stdout=True) as bar:
+    with progressbar.ProgressBar(widgets=widgets, max_value=len(paths), redirect_stdout=True) as bar, \
+            ExitStack() as sinks_stack:
+        sinks = {}
         for i, file_path in enumerate(paths):
             grouped = group_annotations(file_path)
             for body_type, annotations in grouped:
-                grouped_annotations[body_type].extend(post_process(annotations, body_type, nav_provider))
+                if body_type not in sinks:
+                    out_path = f"{root_path}/{body_type.lower().replace(':', '_')}_annotations.json"
+                    sinks[body_type] = sinks_stack.enter_context(AnnotationSink(out_path, ensure_ascii=True))
+                sinks[body_type].write_all(post_process(annotations, body_type, nav_provider))
             bar.update(i)
-    for body_type in grouped_annotations.keys():
-        annotations = grouped_annotations[body_type]
-        out_path = f"{root_path}/{body_type.lower().replace(':', '_')}_annotations.json"
-        print(f"writing {len(annotations)} {body_type} annotations to {out_path}")
-        with open(out_path, 'w') as f:
-            json.dump(annotations, fp=f)
+    for body_type, sink in sinks.items():
+        print(f"wrote {sink.count} {body_type} annotations to {sink.path}")
 
 
 def annotations_paths(apath: str) -> list[str]:
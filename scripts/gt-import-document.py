@@ -8,10 +8,10 @@ import subprocess
 import sys
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import groupby
 from pathlib import Path
 
 import hydra
-import spacy
 from cassis import *
 from cassis.typesystem import TYPE_NAME_STRING
 from icecream import ic
@@ -22,14 +22,15 @@ from pagexml.model.physical_document_model import PageXMLScan
 from pagexml.parser import parse_pagexml_file
 from provenance.client import ProvenanceClient, ProvenanceData, ProvenanceHow, ProvenanceWhy, ProvenanceResource
 from pycaprio.core.mappings import InceptionFormat
-from spacy import Language
 from textrepo.client import TextRepoClient
 from uri import URI
 
 import globalise_tools.textrepo_tools as tt
+import globalise_tools.tokenization as tk
 from globalise_tools.document_metadata import DocumentMetadata, read_document_selection
-from globalise_tools.inception_client import InceptionClient
-from globalise_tools.model import CAS_SENTENCE, CAS_TOKEN, AnnotationEncoder, ScanCoords
+from globalise_tools.inception_client import InceptionClient, DocumentUpload
+from globalise_tools.model import CAS_SENTENCE, CAS_TOKEN, ScanCoords, dumps
+from globalise_tools.text_builder import TextBuilder
 from globalise_tools.tools import is_paragraph, is_marginalia, paragraph_text, is_header, is_signature
 
 typesystem_xml = 'data/typesystem.xml'
@@ -48,13 +49,12 @@ class TextRegionSummary:
 
 
 @dataclass
-class TextRepoDocumentWrapper:
-    textrepo_client: TextRepoClient
-    document_id: str
-
-    def set_metadata(self, key: str, value: any):
-        if value or value == False:
-            self.textrepo_client.set_document_metadata(document_id=self.document_id, key=key, value=value)
+class PreparedDocument:
+    dm: DocumentMetadata
+    links: dict[str, any]
+    xmi_path: str
+    xmi_provenance: ProvenanceData
+    xmi_version_uri: str
 
 
 class DocumentsProcessor:
@@ -70,8 +70,8 @@ class DocumentsProcessor:
         self.plain_text_file_type = tt.get_plain_text_file_type(self.textrepo_client)
         self.document_data = read_document_data()
 
-        logger.info(f"loading {spacy_core}")
-        self.nlp: Language = spacy.load(spacy_core)
+        # only the tokens are used, so the sentence detection is not loaded
+        self.tokenizer = tk.get_tokenizer(model=spacy_core, sentences=False)
 
         self.itree = IntervalTree()
         self.document_id_idx = {}
@@ -92,6 +92,22 @@ class DocumentsProcessor:
         self._write_document_data()
 
     def process(self, dm: DocumentMetadata):
+        self.process_all([dm])
+
+    def process_all(self, dms: list[DocumentMetadata]):
+        # the documents are prepared one by one, and then uploaded to inception concurrently
+        prepared = [self._prepare(dm) for dm in dms]
+        responses = self.inception_client.create_project_documents(
+            project_id=self.project_id,
+            documents=[DocumentUpload(file_path=p.xmi_path,
+                                      name=self._inception_document_name(p.dm),
+                                      file_format=InceptionFormat.UIMA_CAS_XMI_XML_1_1)
+                       for p in prepared]
+        )
+        for p, response in zip(prepared, responses):
+            self._finish(p, response.body['id'])
+
+    def _prepare(self, dm: DocumentMetadata) -> PreparedDocument:
         self.itree.clear()
         inventory_id = dm.inventory_number
         trc = self.textrepo_client
@@ -130,32 +146,30 @@ class DocumentsProcessor:
         trc.set_file_metadata(file_id=xmi_version_identifier.file_id, key='file_name', value=file_name)
         self.document_id_idx[dm.external_id] = xmi_version_identifier.document_id
 
-        response = self.inception_client.create_project_document(
-            project_id=self.project_id,
-            file_path=xmi_path,
-            name=self._inception_document_name(dm),
-            file_format=InceptionFormat.UIMA_CAS_XMI_XML_1_1
-        )
-        idoc_id = response.body['id']
+        md5 = hashlib.md5(plain_text.encode()).hexdigest()
+        self.document_data[dm.external_id] = {
+            "plain_text_source": f"{txt_version_uri}/contents",
+            "plain_text_md5": md5,
+            "text_intervals": list(self.itree)
+        }
+        return PreparedDocument(dm=dm, links=links, xmi_path=xmi_path, xmi_provenance=xmi_provenance,
+                                xmi_version_uri=xmi_version_uri)
+
+    def _finish(self, prepared: PreparedDocument, idoc_id: int):
+        links = prepared.links
         inception_view = f"{self.inception_client.base_uri}/p/{self.project_name}/annotate#!d={idoc_id}"
         links['inception_view'] = inception_view
 
         provenance = dataclasses.replace(
             self.base_provenance,
-            sources=[ProvenanceResource(resource=URI(xmi_version_uri), relation='primary')],
+            sources=[ProvenanceResource(resource=URI(prepared.xmi_version_uri), relation='primary')],
             targets=[ProvenanceResource(resource=URI(inception_view), relation='primary')],
         )
         prc = self.provenance_client
-        xmi_provenance_id = prc.add_provenance(xmi_provenance)
+        xmi_provenance_id = prc.add_provenance(prepared.xmi_provenance)
         provenance_id = prc.add_provenance(provenance)
         links['provenance_links'] = [str(xmi_provenance_id.location), str(provenance_id.location)]
-        self.results[dm.external_id] = links
-        md5 = hashlib.md5(plain_text.encode()).hexdigest()
-        self.document_data[dm.external_id] = {
-            "plain_text_source": f"{txt_version_uri}/contents",
-            "plain_text_md5": md5,
-            "text_intervals": list(self.itree)
-        }
+        self.results[prepared.dm.external_id] = links
 
     @staticmethod
     def _inception_document_name(dm):
@@ -174,41 +188,33 @@ class DocumentsProcessor:
         return f'{dm.external_id}{esta} - {year} - {title}'
 
     def _create_or_update_tr_document(self, metadata: DocumentMetadata):
-        document_identifier = self.textrepo_client.read_document_by_external_id(metadata.external_id)
-        if not document_identifier:
-            document_identifier = self.textrepo_client.create_document(external_id=metadata.external_id)
-        doc_wrapper = TextRepoDocumentWrapper(textrepo_client=self.textrepo_client,
-                                              document_id=document_identifier.id)
-        doc_wrapper.set_metadata(key='title', value=metadata.title)
-        doc_wrapper.set_metadata(key='year_creation_or_dispatch',
-                                 value=metadata.year_creation_or_dispatch)
-        doc_wrapper.set_metadata(key='inventory_number',
-                                 value=metadata.inventory_number)
-        doc_wrapper.set_metadata(key='folio_or_page', value=metadata.folio_or_page)
-        doc_wrapper.set_metadata(key='folio_or_page_range',
-                                 value=metadata.folio_or_page_range)
-        doc_wrapper.set_metadata(key='scan_range', value=metadata.scan_range)
-        doc_wrapper.set_metadata(key='scan_start', value=metadata.scan_start)
-        doc_wrapper.set_metadata(key='scan_end', value=metadata.scan_end)
-        doc_wrapper.set_metadata(key='no_of_scans',
-                                 value=str(metadata.no_of_scans))
-        doc_wrapper.set_metadata(key='no_of_pages',
-                                 value=str(metadata.no_of_pages))
-        doc_wrapper.set_metadata(key='GM_id', value=metadata.GM_id)
-        doc_wrapper.set_metadata(key='tanap_id', value=metadata.tanap_id)
-        doc_wrapper.set_metadata(key='tanap_description',
-                                 value=metadata.tanap_description)
-        doc_wrapper.set_metadata(key='remarks', value=metadata.remarks)
-        doc_wrapper.set_metadata(key='marginalia', value=metadata.marginalia)
-        doc_wrapper.set_metadata(key='partOf500_filename',
-                                 value=metadata.partOf500_filename)
-        doc_wrapper.set_metadata(key='partOf500_folio',
-                                 value=metadata.partOf500_folio)
-        doc_wrapper.set_metadata(key='ESTA_voyage_id',
-                                 value=metadata.esta_voyage_id)
-        doc_wrapper.set_metadata(key='ESTA_subvoyage_id',
-                                 value=metadata.esta_subvoyage_id)
-        return document_identifier
+        wanted = {
+            'title': metadata.title,
+            'year_creation_or_dispatch': metadata.year_creation_or_dispatch,
+            'inventory_number': metadata.inventory_number,
+            'folio_or_page': metadata.folio_or_page,
+            'folio_or_page_range': metadata.folio_or_page_range,
+            'scan_range': metadata.scan_range,
+            'scan_start': metadata.scan_start,
+            'scan_end': metadata.scan_end,
+            'no_of_scans': str(metadata.no_of_scans),
+            'no_of_pages': str(metadata.no_of_pages),
+            'GM_id': metadata.GM_id,
+            'tanap_id': metadata.tanap_id,
+            'tanap_description': metadata.tanap_description,
+            'remarks': metadata.remarks,
+            'marginalia': metadata.marginalia,
+            'partOf500_filename': metadata.partOf500_filename,
+            'partOf500_folio': metadata.partOf500_folio,
+            'ESTA_voyage_id': metadata.esta_voyage_id,
+            'ESTA_subvoyage_id': metadata.esta_subvoyage_id,
+        }
+        # empty values are not set; only the changed values are written
+        return tt.create_or_update_document(
+            self.textrepo_client,
+            metadata.external_id,
+            {key: value for key, value in wanted.items() if value or value == False}
+        )
 
     def _generate_xmi(self, document_id: str, inventory_id: str, pagexml_ids: list[str], links: dict[str, any]) -> \
             tuple[str, ProvenanceData, str]:
@@ -236,14 +242,12 @@ class DocumentsProcessor:
 
         textrepo_client = self.textrepo_client
 
-        for external_id in pagexml_ids:
+        # the textrepo calls for the pages are independent, so they run concurrently
+        page_sources = tt.map_concurrently(lambda e: fetch_page_sources(inventory_id, e, textrepo_client), pagexml_ids)
+        for external_id, (page_xml_path, version_location, iiif_url) in zip(pagexml_ids, page_sources):
             page_links = {}
-            page_xml_path = download_page_xml(inventory_id, external_id, textrepo_client)
-            version_identifier = textrepo_client.find_latest_version(external_id, "pagexml")
-            version_location = textrepo_client.version_uri(version_identifier.id)
             provenance.sources.append(ProvenanceResource(resource=URI(version_location), relation="primary"))
 
-            iiif_url = get_iiif_url(external_id, textrepo_client)
             canvas_id = self._get_canvas_id(external_id)
             logger.info(f"iiif_url={iiif_url}")
             page_links['iiif_url'] = iiif_url
@@ -261,37 +265,31 @@ class DocumentsProcessor:
         marginalia_ranges = []
         header_range = None
         paragraph_ranges = []
-        offset = 0
-        document_text = ""
+        builder = TextBuilder()
         for m in document_marginalia:
-            document_text += m.text
-            text_len = len(document_text)
-            marginalia_ranges.append((offset, text_len))
-            self.itree[offset:text_len] = m.scan_coords
-            offset = text_len
+            begin, end = builder.append(m.text)
+            marginalia_ranges.append((begin, end))
+            self.itree[begin:end] = m.scan_coords
         if document_headers:
             h = document_headers[0]
-            document_text += f"\n{h.text}\n"
-            text_len = len(document_text)
-            header_range = (offset + 1, text_len - 1)
-            self.itree[offset + 1:text_len - 1] = h.scan_coords
-            offset = text_len
+            builder.append("\n")
+            header_range = builder.append(h.text)
+            builder.append("\n")
+            self.itree[header_range[0]:header_range[1]] = h.scan_coords
         for m in document_paragraphs:
-            document_text += m.text
-            text_len = len(document_text)
-            paragraph_ranges.append((offset, text_len))
-            self.itree[offset:text_len] = m.scan_coords
-            offset = text_len
+            begin, end = builder.append(m.text)
+            paragraph_ranges.append((begin, end))
+            self.itree[begin:end] = m.scan_coords
+        document_text = builder.build()
         if '  ' in document_text:
             logger.error('double space in text')
 
         cas.sofa_string = document_text
-        doc = self.nlp(document_text)
-        for sentence in doc.sents:
-            for token in [t for t in sentence if t.text != "\n"]:
-                begin = token.idx
-                end = begin + len(token.text)
-                cas.add(TokenAnnotation(begin=begin, end=end))
+        doc = self.tokenizer(document_text)
+        for token in tk.tokens(doc):
+            begin = token.idx
+            end = begin + len(token.text)
+            cas.add(TokenAnnotation(begin=begin, end=end))
 
         ranges = marginalia_ranges
         if header_range:
@@ -317,7 +315,7 @@ class DocumentsProcessor:
     def _write_document_data(self):
         logger.info(f"=> {document_data_path}")
         with open(document_data_path, "w") as f:
-            json.dump(self.document_data, fp=f, ensure_ascii=False, cls=AnnotationEncoder)
+            f.write(dumps(self.document_data, ensure_ascii=False))
 
     @staticmethod
     def _get_canvas_id(page_id):
@@ -332,7 +330,9 @@ class DocumentsProcessor:
 def main(cfg: DictConfig) -> None:
     base_provenance = make_base_provenance(cfg)
 
-    textrepo_client = TextRepoClient(cfg.textrepo.base_uri, api_key=cfg.textrepo.api_key, verbose=False)
+    textrepo_client = tt.use_pooled_session(
+        TextRepoClient(cfg.textrepo.base_uri, api_key=cfg.textrepo.api_key, verbose=False)
+    )
     inception_client, project_id = init_inception_client(cfg)
     provenance_client = ProvenanceClient(base_url=cfg.provenance.base_uri, api_key=cfg.provenance.api_key)
 
@@ -344,8 +344,9 @@ def main(cfg: DictConfig) -> None:
                                         project_id=project_id, project_name=cfg.inception.project_name,
                                         typesystem=init_typesystem())
     with docs_processor:
-        for dm in quality_checked_metadata:
-            docs_processor.process(dm)
+        # one inventory at a time, so its documents are uploaded to inception in parallel
+        for _, dms in groupby(quality_checked_metadata, key=lambda m: m.inventory_number):
+            docs_processor.process_all(list(dms))
 
 
 acceptable_quality_codes = {'3.1.1', '3.1.2', '3.2', 'TRUE'}
@@ -499,6 +500,14 @@ def extract_text_region_summaries(
     return marginalia, headers, paragraphs
 
 
+def fetch_page_sources(inventory_id, external_id, textrepo_client) -> tuple[str, str, str]:
+    page_xml_path = download_page_xml(inventory_id, external_id, textrepo_client)
+    version_identifier = textrepo_client.find_latest_version(external_id, "pagexml")
+    version_location = textrepo_client.version_uri(version_identifier.id)
+    iiif_url = get_iiif_url(external_id, textrepo_client)
+    return page_xml_path, version_location, iiif_url
+
+
 def get_iiif_url(external_id, textrepo_client):
     meta = textrepo_client.find_document_metadata(external_id)[1]
     scan_url = meta['scan_url'].replace('/info.json', '')
@@ -544,10 +553,15 @@ def init_inception_client(cfg) -> (InceptionClient, int):
     authorization = inception_cfg.get('authorization', None)
     base = inception_cfg.base_uri
     logger.info(f"connecting to INCEpTION server at {base}...")
+    max_workers = inception_cfg.get('max_workers', 4)
+    pool_size = inception_cfg.get('pool_size', max(10, max_workers))
+    cache_ttl = inception_cfg.get('cache_ttl', None)
     if authorization:
-        client = InceptionClient(base_uri=base, authorization=authorization, oauth2_proxy=inception_cfg.oauth2_proxy)
+        client = InceptionClient(base_uri=base, authorization=authorization, oauth2_proxy=inception_cfg.oauth2_proxy,
+                                 pool_size=pool_size, max_workers=max_workers, cache_ttl=cache_ttl)
     else:
-        client = InceptionClient(base_uri=base, user=inception_cfg.user, password=inception_cfg.password)
+        client = InceptionClient(base_uri=base, user=inception_cfg.user, password=inception_cfg.password,
+                                 pool_size=pool_size, max_workers=max_workers, cache_ttl=cache_ttl)
     project = client.get_project_by_name(name=inception_cfg.project_name)
     if not project:
         result = client.create_project(name=inception_cfg.project_name)
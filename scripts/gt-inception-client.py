@@ -32,26 +32,26 @@ def create_project(client: InceptionClient):
 
 
 def list_all(client: InceptionClient):
-    for project in client.get_projects():
-        if project.name == 'globalise-2023':
-            ic(project)
-            print(project.name)
-            response = client.get_project_documents(project.id)
-            documents = [Document.from_dict(d) for d in response.body]
-            for document in documents:
-                ic(document)
-                print(f"\t{document.name}")
-                xmi = client.get_project_document(project.id, document.id)
-                path = f"out/{document.name.split(' ')[0]}.xmi"
-                logger.debug(f"=> {path}")
-                with open(path, "w") as f:
-                    f.write(xmi)
-                response = client.get_document_annotations(project.id, document.id)
-                # annotations = [Annotation.from_dict(d) for d in response.body]
-                # for annotation in annotations:
-                #     if annotation.state == 'COMPLETE':
-                #         ic(annotation)
-                #         print(f"\t\t{annotation.user} | {annotation.state} | {annotation.timestamp}")
+    project = client.get_project_by_name('globalise-2023')
+    if project:
+        ic(project)
+        print(project.name)
+        response = client.get_project_documents(project.id)
+        documents = [Document.from_dict(d) for d in response.body]
+        for document in documents:
+            ic(document)
+            print(f"\t{document.name}")
+            xmi = client.get_project_document(project.id, document.id)
+            path = f"out/{document.name.split(' ')[0]}.xmi"
+            logger.debug(f"=> {path}")
+            with open(path, "w") as f:
+                f.write(xmi)
+            response = client.get_document_annotations(project.id, document.id)
+            # annotations = [Annotation.from_dict(d) for d in response.body]
+            # for annotation in annotations:
+            #     if annotation.state == 'COMPLETE':
+            #         ic(annotation)
+            #         print(f"\t\t{annotation.user} | {annotation.state} | {annotation.timestamp}")
 
 
 if __name__ == '__main__':
@@ -9,6 +9,8 @@ from xml.etree.ElementTree import Element
 from loguru import logger
 from tqdm import tqdm
 
+from globalise_tools.url_index import write_url_index, index_path_for
+
 
 @dataclass
 class Div:
@@ -84,6 +86,7 @@ def map_pagexml_to_iiif_url(data_dir: str):
         records = [r for r in csv.DictReader(f) if r['METS link'] != '']
 
     missing_files = []
+    mapping = {}
     print(f"writing {mapping_csv}...")
     with open(mapping_csv, "w") as f:
         writer = csv.writer(f)
@@ -98,9 +101,21 @@ def map_pagexml_to_iiif_url(data_dir: str):
             if Path(file_path).is_file():
                 for m in get_mappings(file_path):
                     writer.writerow(m)
+                    mapping[m[0]] = m[1]
             else:
                 missing_files.append(file_path)
     print_missing_files(missing_files)
+    # the WebAnnotationFactory uses the index next to the csv instead of parsing the csv
+    write_url_index(mapping, index_path_for(mapping_csv))
+
+
+@logger.catch
+def index_iiif_url_mapping(data_dir: str):
+    mapping_csv = f"{data_dir}/iiif-url-mapping.csv"
+    print(f"reading {mapping_csv}...")
+    with open(mapping_csv) as f:
+        mapping = {r['pagexml_id']: r['iiif_base_url'] for r in csv.DictReader(f)}
+    write_url_index(mapping, index_path_for(mapping_csv))
 
 
 @logger.catch
@@ -114,10 +129,17 @@ def get_arguments():
                         help="The data directory.",
                         type=str,
                         metavar="data_dir")
+    parser.add_argument("-i",
+                        "--index-only",
+                        required=False,
+                        help="Only (re)write iiif-url-mapping.idx for the existing iiif-url-mapping.csv",
+                        action="store_true")
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     args = get_arguments()
-    if args.data_dir:
+    if args.index_only:
+        index_iiif_url_mapping(args.data_dir)
+    elif args.data_dir:
         map_pagexml_to_iiif_url(args.data_dir)
@@ -1,19 +1,16 @@
 #!/usr/bin/env python3
 import argparse
 
-import spacy
 from cassis import *
 from loguru import logger
 from pagexml.parser import parse_pagexml_file
 
+import globalise_tools.tokenization as tk
 import globalise_tools.tools as gt
 from globalise_tools.model import CAS_SENTENCE, CAS_TOKEN, CAS_PARAGRAPH, CAS_MARGINALIUM, CAS_HEADER
 
 typesystem_xml = 'data/typesystem.xml'
-spacy_core = "nl_core_news_lg"
-
-logger.info(f"loading {spacy_core}")
-nlp = spacy.load(spacy_core)
+tokenizer = tk.get_tokenizer(sentences=True)
 
 
 @logger.catch
@@ -55,10 +52,10 @@ def convert(page_xml_path: str):
         ParagraphAnnotation = cas.typesystem.get_type(CAS_PARAGRAPH)
         MarginaliumAnnotation = cas.typesystem.get_type(CAS_MARGINALIUM)
         HeaderAnnotation = cas.typesystem.get_type(CAS_HEADER)
-        doc = nlp(text)
+        doc = tokenizer(text)
         for sentence in doc.sents:
             cas.add(SentenceAnnotation(begin=sentence.start_char, end=sentence.end_char))
-            for token in [t for t in sentence if t.text != "\n"]:
+            for token in tk.tokens(sentence):
                 begin = token.idx
                 end = token.idx + len(token.text)
                 cas.add(TokenAnnotation(begin=begin, end=end))
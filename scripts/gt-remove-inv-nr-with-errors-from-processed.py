@@ -1,22 +1,15 @@
 #!/usr/bin/env python3
-import json
+from globalise_tools.run_state import RunState
 
 
 def main():
-    with open("out/processed.json") as f:
-        processed = set(json.load(f))
-
-    path = "out/results.json"
-    with open(path) as f:
-        results = json.load(f)
-
-    for id in results.keys():
-        if results[id]['errors']:
-            processed.discard(id)
-
-    path = "out/processed.json"
-    with open(path, 'w') as f:
-        json.dump(list(processed), f)
+    # the results of the last gt-untangle-globalise run, and the log of the documents it will skip
+    results = RunState("out/results.jsonl", legacy_path="out/results.json")
+    with RunState("out/processed.jsonl", legacy_path="out/processed.json") as processed:
+        for id, result in results.items():
+            if result['errors']:
+                processed.remove(id)
+        processed.write_snapshot("out/processed.json", keys_only=True)
 
 
 if __name__ == '__main__':
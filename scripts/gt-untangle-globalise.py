@@ -6,27 +6,33 @@ import subprocess
 import sys
 import time
 from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime
 from itertools import groupby
-from typing import Tuple, Union
+from typing import Iterator, Tuple, Union
 
 import hydra
+import multiprocess as mp
 import pagexml.helper.pagexml_helper as pxh
 from loguru import logger
 from omegaconf import DictConfig
 from pagexml.model.physical_document_model import PageXMLTextRegion, PageXMLScan
-from pagexml.parser import parse_pagexml_file
 from provenance.client import ProvenanceClient, ProvenanceData, ProvenanceHow, ProvenanceWhy
 from textrepo.client import TextRepoClient, DocumentIdentifier
 from uri import URI
 
 import globalise_tools.lang_deduction as ld
+import globalise_tools.pagexml_cache as pxc
+import globalise_tools.textrepo_tools as tt
 import globalise_tools.tools as gt
 from globalise_tools.lang_deduction import LangDeduction
+from globalise_tools.annotation_sink import AnnotationSink
 from globalise_tools.model import AnnotationEncoder, WebAnnotation, DocumentMetadata2, DocumentMetadata, \
-    LogicalAnchorRange, SegmentedTextType
+    LogicalAnchorRange, SegmentedTextType, configure_web_annotations, ID_UUID4
 from globalise_tools.nav_provider import NavProvider
+from globalise_tools.run_state import RunState
 from globalise_tools.tools import WebAnnotationFactory, Annotation
+from globalise_tools.url_index import UrlIndex, read_url_mapping
 
 word_break_chars = '„¬-'
 
@@ -35,10 +41,14 @@ word_break_chars = '„¬-'
 @logger.catch
 def main(cfg: DictConfig) -> None:
     # logger.level('warning')
-    results = {}
+    # with annotation_ids=uuid5, a re-run on unchanged input exports the same annotation ids
+    configure_web_annotations(id_strategy=cfg.get('annotation_ids', ID_UUID4))
+    # the results only cover this run (out/results.json is the snapshot of them); resuming uses the processed log,
+    # which gt-remove-inv-nr-with-errors-from-processed edits
+    results = RunState("out/results.jsonl", encoder_cls=AnnotationEncoder, truncate=True)
     page_lang = ld.read_lang_deduction_for_page(cfg.automated_page_langs_file)
     # ic(page_lang)
-    processed = load_processed_files()
+    processed = RunState("out/processed.jsonl", legacy_path="out/processed.json")
 
     scan_url_mapping = read_scan_url_mapping()
 
@@ -46,8 +56,9 @@ def main(cfg: DictConfig) -> None:
     # metadata = read_na_file_metadata(cfg.documents_file)
     # base_provenance = generate_base_provenance(cfg)
     base_provenance = None
-    textrepo_client = TextRepoClient(cfg.textrepo.base_uri, api_key=cfg.textrepo.api_key, verbose=False,
-                                     timeout_in_seconds=60)
+    textrepo_client = tt.use_pooled_session(
+        TextRepoClient(cfg.textrepo.base_uri, api_key=cfg.textrepo.api_key, verbose=False, timeout_in_seconds=60)
+    )
     check_file_types(textrepo_client)
     provenance_client = ProvenanceClient(base_url=cfg.provenance.base_uri, api_key=cfg.provenance.api_key)
 
@@ -68,24 +79,90 @@ def main(cfg: DictConfig) -> None:
     nav_provider = NavProvider()
 
     total = len(dm_selection)
-    with textrepo_client as trc, provenance_client as prc:
-        for i, document_metadata in enumerate(dm_selection):
-            logger.info(f"processing {document_metadata.external_id} [{i + 1}/{total}]")
-            before = time.perf_counter()
-            annotations_stored = process_na_file(document_metadata, base_provenance, prc, trc, webannotation_factory,
-                                                 scan_url_mapping, results, nav_provider=nav_provider,
-                                                 page_lang=page_lang)
-            after = time.perf_counter()
-            diff = after - before
-            logger.debug(f"done in {diff} s = {diff / document_metadata.no_of_scans} s/pagexml")
-            for e in results[document_metadata.external_id]['errors']:
-                logger.error(e)
-            if annotations_stored and not results[document_metadata.external_id]['errors']:
-                processed.add(document_metadata.external_id)
-                path = "out/processed.json"
-                logger.info(f"=> {path}")
-                with open(path, "w") as f:
-                    json.dump(list(processed), fp=f)
+    workers = cfg.get('workers', 1)
+    with textrepo_client as trc, provenance_client as prc, results, processed:
+        try:
+            if workers > 1:
+                logger.info(f"untangling {total} documents using {workers} workers")
+                untangled_documents = untangle_in_parallel(dm_selection, workers, base_provenance, scan_url_mapping,
+                                                           page_lang)
+                for i, untangled in enumerate(untangled_documents):
+                    document_metadata = untangled.document_metadata
+                    logger.info(f"storing {document_metadata.external_id} [{i + 1}/{total}]")
+                    logger.debug(f"untangled in {untangled.duration} s = "
+                                 f"{untangled.duration / document_metadata.no_of_scans} s/pagexml")
+                    annotations_stored = store_untangled_document(untangled, trc, webannotation_factory, results)
+                    register_processed(document_metadata, annotations_stored, results, processed)
+            else:
+                for i, document_metadata in enumerate(dm_selection):
+                    logger.info(f"processing {document_metadata.external_id} [{i + 1}/{total}]")
+                    before = time.perf_counter()
+                    annotations_stored = process_na_file(document_metadata, base_provenance, prc, trc,
+                                                         webannotation_factory, scan_url_mapping, results,
+                                                         nav_provider=nav_provider, page_lang=page_lang)
+                    after = time.perf_counter()
+                    diff = after - before
+                    logger.debug(f"done in {diff} s = {diff / document_metadata.no_of_scans} s/pagexml")
+                    register_processed(document_metadata, annotations_stored, results, processed)
+        finally:
+            # also after an error or an interrupt, so the json snapshots match the logs of the documents done so far;
+            # they are read by gt-remove-inv-nr-with-errors-from-processed and gt-update-document-metadata
+            store_results(results)
+            processed.write_snapshot("out/processed.json", keys_only=True)
+
+
+def register_processed(document_metadata: DocumentMetadata, annotations_stored: bool, results: RunState,
+                       processed: RunState):
+    for e in results[document_metadata.external_id]['errors']:
+        logger.error(e)
+    if annotations_stored and not results[document_metadata.external_id]['errors']:
+        processed.mark_done(document_metadata.external_id)
+
+
+@dataclass
+class UntangledDocument:
+    document_metadata: DocumentMetadata
+    links: dict[str, any]
+    physical_segmented_text: dict[str, any]
+    logical_segmented_text: dict[str, any]
+    annotations: list[Annotation]
+    duration: float = 0.0
+
+
+# per-process state for the untangle workers, set once by init_untangle_worker
+_worker_context = {}
+
+
+def init_untangle_worker(base_provenance: ProvenanceData, scan_url_mapping: dict[str, str],
+                         page_lang: dict[str, LangDeduction]):
+    _worker_context['base_provenance'] = base_provenance
+    _worker_context['scan_url_mapping'] = scan_url_mapping
+    _worker_context['page_lang'] = page_lang
+    _worker_context['nav_provider'] = NavProvider()
+
+
+def untangle_in_worker(document_metadata: DocumentMetadata) -> UntangledDocument:
+    return untangle_document(
+        document_metadata,
+        base_provenance=_worker_context['base_provenance'],
+        scan_url_mapping=_worker_context['scan_url_mapping'],
+        nav_provider=_worker_context['nav_provider'],
+        page_lang=_worker_context['page_lang']
+    )
+
+
+def untangle_in_parallel(
+        dm_selection: list[DocumentMetadata],
+        workers: int,
+        base_provenance: ProvenanceData,
+        scan_url_mapping: dict[str, str],
+        page_lang: dict[str, LangDeduction]
+) -> Iterator[UntangledDocument]:
+    # the workers only parse and untangle the pagexml; all textrepo uploads and the processed/results bookkeeping
+    # stay in the parent process, so an interrupted run can be resumed safely
+    with mp.Pool(processes=workers, initializer=init_untangle_worker,
+                 initargs=(base_provenance, scan_url_mapping, page_lang)) as pool:
+        yield from pool.imap_unordered(untangle_in_worker, dm_selection)
 
 
 def get_available_inv_nrs():
@@ -109,23 +186,9 @@ def read_all_metadata():
     return metadata
 
 
-def read_scan_url_mapping() -> dict[str, str]:
-    path = "data/scan_url_mapping.json"
-    logger.info(f"<= {path}")
-    with open(path) as f:
-        scan_url_mapping = json.load(f)
-    return scan_url_mapping
-
-
-def load_processed_files():
-    processed_file = "out/processed.json"
-    if os.path.exists(processed_file):
-        logger.info(f"<= {processed_file}")
-        with open(processed_file) as f:
-            processed = set(json.load(f))
-    else:
-        processed = set()
-    return processed
+def read_scan_url_mapping() -> Union[UrlIndex, dict[str, str]]:
+    # the workers get the UrlIndex by path and share its pages, instead of each unpickling a copy of the dict
+    return read_url_mapping("data/scan_url_mapping.json")
 
 
 def process_na_file(
@@ -135,20 +198,25 @@ def process_na_file(
         tr_client: TextRepoClient,
         waf: WebAnnotationFactory,
         scan_url_mapping: dict[str, str],
-        results: dict[str, any],
+        results: RunState,
         nav_provider: NavProvider,
         page_lang: dict[str, LangDeduction]
 ) -> bool:
-    links = {'textrepo_links': {}, 'errors': []}
+    untangled = untangle_document(document_metadata, base_provenance, scan_url_mapping, nav_provider, page_lang)
+    return store_untangled_document(untangled, tr_client, waf, results)
 
-    document_identifier = create_or_update_tr_document(tr_client, document_metadata)
-
-    links['textrepo_links']['document'] = f"{tr_client.base_uri}/rest/documents/{document_identifier.id}"
-    links['textrepo_links']['metadata'] = f"{tr_client.base_uri}/rest/documents/{document_identifier.id}/metadata"
 
+def untangle_document(
+        document_metadata: DocumentMetadata,
+        base_provenance: ProvenanceData,
+        scan_url_mapping: dict[str, str],
+        nav_provider: NavProvider,
+        page_lang: dict[str, LangDeduction]
+) -> UntangledDocument:
+    before = time.perf_counter()
+    links = {'textrepo_links': {}, 'errors': []}
     physical_segmented_text, logical_segmented_text, text_provenance, annotations = untangle_na_file(
         document_id=document_metadata.nl_hana_nr,
-        textrepo_client=tr_client,
         pagexml_ids=document_metadata.pagexml_ids,
         base_provenance=base_provenance,
         links=links,
@@ -156,6 +224,33 @@ def process_na_file(
         nav_provider=nav_provider,
         page_lang=page_lang
     )
+    return UntangledDocument(
+        document_metadata=document_metadata,
+        links=links,
+        physical_segmented_text=physical_segmented_text,
+        logical_segmented_text=logical_segmented_text,
+        annotations=annotations,
+        duration=time.perf_counter() - before
+    )
+
+
+def store_untangled_document(
+        untangled: UntangledDocument,
+        tr_client: TextRepoClient,
+        waf: WebAnnotationFactory,
+        results: RunState
+) -> bool:
+    document_metadata = untangled.document_metadata
+    links = untangled.links
+    annotations = untangled.annotations
+
+    document_identifier = create_or_update_tr_document(tr_client, document_metadata)
+
+    links['textrepo_links']['document'] = f"{tr_client.base_uri}/rest/documents/{document_identifier.id}"
+    links['textrepo_links']['metadata'] = f"{tr_client.base_uri}/rest/documents/{document_identifier.id}/metadata"
+
+    physical_segmented_text = untangled.physical_segmented_text
+    logical_segmented_text = untangled.logical_segmented_text
     physical_version_identifier = store_segmented_text(tr_client, physical_segmented_text, SegmentedTextType.PHYSICAL,
                                                        document_metadata, links)
     logical_version_identifier = store_segmented_text(tr_client, logical_segmented_text, SegmentedTextType.LOGICAL,
@@ -172,8 +267,6 @@ def process_na_file(
     # links['provenance_links'] = [prov_json_link, prov_html_link]
     results[document_metadata.external_id] = links
 
-    store_results(results)
-
     if annotations:
         for a in annotations:
             a.physical_span.textrepo_version_id = physical_version_identifier.version_id
@@ -184,7 +277,7 @@ def process_na_file(
                 a.logical_span.begin_anchor = a.logical_span.offset
                 a.logical_span.end_anchor = a.logical_span.offset + a.logical_span.length - 1
 
-        web_annotations = [to_web_annotation(a, webannotation_factory=waf) for a in annotations]
+        web_annotations = to_web_annotations(annotations, webannotation_factory=waf)
         web_annotations.insert(
             0,
             document_web_annotation(annotations, document_metadata.nl_hana_nr, document_metadata.inventory_number, waf,
@@ -223,17 +316,23 @@ def store_segmented_text(tr_client, segmented_text, segmented_text_type: Segment
 
 def to_web_annotation(annotation: Annotation,
                       webannotation_factory: WebAnnotationFactory) -> WebAnnotation:
-    body_id = annotation.id
-    if 'text' in annotation.metadata:
-        annotation.metadata.pop('text')
-    body = {
-        "id": body_id,
-        "type": annotation.type,
-        "metadata": annotation.metadata
-    }
-    targets = webannotation_factory.annotation_targets(annotation)
-    body['metadata'].pop("coords", None)
-    return WebAnnotation(body=body, target=targets)
+    return to_web_annotations([annotation], webannotation_factory)[0]
+
+
+def to_web_annotations(annotations: list[Annotation],
+                       webannotation_factory: WebAnnotationFactory) -> list[WebAnnotation]:
+    targets_list = webannotation_factory.annotation_targets_batch(annotations)
+    web_annotations = []
+    for annotation, targets in zip(annotations, targets_list):
+        annotation.metadata.pop('text', None)
+        annotation.metadata.pop("coords", None)
+        body = {
+            "id": annotation.id,
+            "type": annotation.type,
+            "metadata": annotation.metadata
+        }
+        web_annotations.append(WebAnnotation(body=body, target=targets))
+    return web_annotations
 
 
 def document_web_annotation(all_annotations: list[Annotation], document_id: str, inventory_number: str,
@@ -291,10 +390,9 @@ def export_web_annotations(document_metadata, web_annotations: list[WebAnnotatio
     grouped_annotations = groupby(sorted_annotations, key=lambda a: a.body['type'])
     for body_type, annotations_grouper in grouped_annotations:
         out_path = f"{root_path}/{body_type.lower().replace(':', '_')}_annotations.json"
-        annotations = [a for a in annotations_grouper]
-        logger.info(f"{len(annotations)} {body_type} annotations to {out_path}")
-        with open(out_path, 'w') as f:
-            json.dump(annotations, fp=f, ensure_ascii=False, cls=AnnotationEncoder)
+        with AnnotationSink(out_path, encoder_cls=AnnotationEncoder) as sink:
+            sink.write_all(annotations_grouper)
+        logger.info(f"{sink.count} {body_type} annotations to {out_path}")
 
 
 def generate_base_provenance(cfg) -> ProvenanceData:
@@ -473,7 +571,6 @@ def page_id(scan_doc):
 
 def untangle_na_file(
         document_id: str,
-        textrepo_client: TextRepoClient,
         pagexml_ids: list[str],
         base_provenance: ProvenanceData,
         links: dict[str, any],
@@ -500,7 +597,7 @@ def untangle_na_file(
         # done = False
         # while not done:
         # page_xml_path, page_xml, error = download_page_xml(external_id, textrepo_client, output_directory)
-        page_xml_path, page_xml, error = read_page_xml(external_id)
+        page_xml_path, error = read_page_xml(external_id)
         # if error and tries < 10:
         #     logger.error(f"Error={error}")
         #     tries += 1
@@ -526,7 +623,7 @@ def untangle_na_file(
                 # page_links['paragraph_iiif_urls'] = []
                 # page_links['sentences'] = []
                 # logger.info(f"<= {page_xml_path}")
-                scan_doc: PageXMLScan = parse_pagexml_file(pagexml_file=page_xml_path, pagexml_data=page_xml)
+                scan_doc: PageXMLScan = pxc.parse_pagexml_file(pagexml_file=page_xml_path)
                 start_offset = len(document_lines)
                 scan_lines, scan_annotations = untangle_scan_doc(
                     scan_doc=scan_doc,
@@ -556,13 +653,9 @@ def read_page_xml(external_id):
     page_xml_dir = "/Users/bram/workspaces/globalise/pagexml"
     page_xml_path = f"{page_xml_dir}/{inv_nr}/{external_id}.xml"
     error = []
-    if os.path.isfile(page_xml_path):
-        with open(page_xml_path) as f:
-            page_xml = f.read()
-    else:
+    if not os.path.isfile(page_xml_path):
         error.append(f"file not found: {page_xml_path}")
-        page_xml = ""
-    return page_xml_path, page_xml, error
+    return page_xml_path, error
 
 
 def get_iiif_url(textrepo_client: TextRepoClient, external_id):
@@ -593,34 +686,26 @@ def download_page_xml(textrepo_client: TextRepoClient, external_id, output_direc
     return page_xml_path, page_xml, error
 
 
-def store_results(results: dict[str, any]):
-    path = "out/results.json"
-    logger.info(f"=> {path}")
-    with open(path, 'w') as f:
-        json.dump(results, fp=f, cls=AnnotationEncoder, indent=4, ensure_ascii=False)
+def store_results(results: RunState):
+    results.write_snapshot("out/results.json", indent=4)
 
 
 def create_or_update_tr_document(client: TextRepoClient, metadata: DocumentMetadata) -> DocumentIdentifier:
-    document_identifier = client.read_document_by_external_id(metadata.external_id)
-    if not document_identifier:
-        document_identifier = client.create_document(external_id=metadata.external_id)
-    document_id = document_identifier.id
-    # client.set_document_metadata(document_id=document_id, key='title', value=metadata.title)
-    # client.set_document_metadata(document_id=document_id, key='year_creation_or_dispatch',
-    #                              value=metadata.year_creation_or_dispatch)
-    client.set_document_metadata(document_id=document_id, key='inventory_number',
-                                 value=metadata.inventory_number)
-    # client.set_document_metadata(document_id=document_id, key='folio_or_page', value=metadata.folio_or_page)
-    # client.set_document_metadata(document_id=document_id, key='folio_or_page_range',
-    #                              value=metadata.folio_or_page_range)
-    client.set_document_metadata(document_id=document_id, key='scan_range', value=metadata.scan_range)
-    client.set_document_metadata(document_id=document_id, key='scan_start', value=metadata.scan_start)
-    client.set_document_metadata(document_id=document_id, key='scan_end', value=metadata.scan_end)
-    client.set_document_metadata(document_id=document_id, key='no_of_scans', value=str(metadata.no_of_scans))
-    # client.set_document_metadata(document_id=document_id, key='no_of_pages', value=str(metadata.no_of_pages))
-    # client.set_document_metadata(document_id=document_id, key='GM_id', value=metadata.GM_id)
-    # client.set_document_metadata(document_id=document_id, key='remarks', value=metadata.remarks)
-    return document_identifier
+    # only the changed metadata values are written
+    return tt.create_or_update_document(client, metadata.external_id, {
+        # 'title': metadata.title,
+        # 'year_creation_or_dispatch': metadata.year_creation_or_dispatch,
+        'inventory_number': metadata.inventory_number,
+        # 'folio_or_page': metadata.folio_or_page,
+        # 'folio_or_page_range': metadata.folio_or_page_range,
+        'scan_range': metadata.scan_range,
+        'scan_start': metadata.scan_start,
+        'scan_end': metadata.scan_end,
+        'no_of_scans': str(metadata.no_of_scans),
+        # 'no_of_pages': str(metadata.no_of_pages),
+        # 'GM_id': metadata.GM_id,
+        # 'remarks': metadata.remarks,
+    })
 
 
 def check_file_types(trc):
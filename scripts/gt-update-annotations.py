@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 import json
 import os.path
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
+from itertools import groupby
+from typing import Callable
 
 import hydra
 from annorepo.client import AnnoRepoClient
@@ -10,10 +14,12 @@ from loguru import logger
 from omegaconf import DictConfig
 
 import globalise_tools.lang_deduction as ld
+from globalise_tools.run_state import RunState
 
 page_id_field = "body.metadata.document"
 
 result_path = "out/gt-update-annnotations-missing-lang-detection.json"
+update_log_path = "out/gt-update-annotations-lang.jsonl"
 
 
 @dataclass_json
@@ -37,6 +43,10 @@ def main(cfg: DictConfig) -> None:
         logger.info(f"indexing {page_id_field}")
         ca.create_index(field=page_id_field, index_type="hashed")
 
+    if cfg.get('bulk', False):
+        bulk_update(ca, lang_deduction_for_page, project_results, max_in_flight=cfg.get('max_in_flight', 8))
+        return
+
     unprocessed_page_ids = sorted(page_ids - project_results.pages_processed)
     total = len(unprocessed_page_ids)
     for i, page_id in enumerate(unprocessed_page_ids):
@@ -72,6 +82,89 @@ def main(cfg: DictConfig) -> None:
                 success = False
 
 
+def bulk_update(ca, lang_deduction_for_page: dict[str, ld.LangDeduction], project_results: ProjectResults,
+                max_in_flight: int):
+    # one search per inventory, the updates for that inventory run concurrently;
+    # the outcome per page is appended to the update log
+    with RunState(update_log_path) as update_log:
+        done = project_results.pages_processed | {page_id for page_id, outcome in update_log.items()
+                                                  if not outcome.get("failed")}
+        unprocessed_page_ids = sorted(lang_deduction_for_page.keys() - done)
+        inventories = [(inv_nr, list(page_ids))
+                       for inv_nr, page_ids in groupby(unprocessed_page_ids, key=inventory_number)]
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="annorepo-update") as executor:
+            for i, (inv_nr, page_ids) in enumerate(inventories):
+                logger.info(f"inventory {inv_nr} ({i + 1}/{len(inventories)}): searching {len(page_ids)} pages")
+                try:
+                    names_per_page = annotations_to_update(ca, page_ids)
+                except Exception as e:
+                    # its pages are not logged, so the next run tries this inventory again
+                    logger.error(f"inventory {inv_nr}: search failed: {e}")
+                    continue
+                futures = {
+                    executor.submit(update_annotation, ca, anno_name, lang_deduction_for_page[page_id]):
+                        (page_id, anno_name)
+                    for page_id, anno_names in names_per_page.items()
+                    for anno_name in anno_names
+                }
+                logger.info(f"inventory {inv_nr}: updating {len(futures)} annotations")
+                outcomes = {page_id: {"updated": [], "failed": []} for page_id in page_ids}
+                for future in as_completed(futures):
+                    page_id, anno_name = futures[future]
+                    try:
+                        future.result()
+                        outcomes[page_id]["updated"].append(anno_name)
+                    except Exception as e:
+                        logger.error(f"updating annotation {anno_name} failed: {e}")
+                        outcomes[page_id]["failed"].append(anno_name)
+                for page_id, outcome in outcomes.items():
+                    update_log.mark_done(page_id, outcome)
+
+
+def inventory_number(page_id: str) -> str:
+    return page_id.split('_')[-2]
+
+
+def annotations_to_update(ca, page_ids: list[str]) -> dict[str, list[str]]:
+    # the names of the annotations without a lang, per page
+    def search() -> dict[str, list[str]]:
+        search_id = ca.create_search({page_id_field: {":isIn": page_ids}})
+        names_per_page = {}
+        for anno in ca.read_search_result_annotations(search_id.id):
+            if "lang" not in anno["body"]["metadata"]:
+                page_id = anno["body"]["metadata"]["document"]
+                names_per_page.setdefault(page_id, []).append(anno["id"].split("/")[-1])
+        return names_per_page
+
+    # a failure while paging restarts the search, so no page is missed
+    return with_retries(search, f"searching {page_ids[0]}..{page_ids[-1]}")
+
+
+def update_annotation(ca, anno_name: str, lang_deduction: ld.LangDeduction):
+    def update():
+        # the update needs the current etag, so the annotation is read again
+        anno_result = ca.read_annotation(anno_name)
+        anno = anno_result.annotation
+        anno["body"]["metadata"]["lang"] = lang_deduction.langs
+        anno["body"]["metadata"]["langCorrected"] = lang_deduction.corrected
+        ca.update_annotation(anno_name, anno_result.etag, anno)
+
+    with_retries(update, f"updating {anno_name}")
+
+
+def with_retries(call: Callable[[], any], description: str, max_retries: int = 3) -> any:
+    retry = 0
+    while True:
+        try:
+            return call()
+        except Exception as e:
+            retry += 1
+            if retry > max_retries:
+                raise
+            logger.warning(f"{type(e).__name__} {description}, retry={retry}")
+            time.sleep(2 ** retry)
+
+
 def load_project_results() -> ProjectResults:
     if os.path.exists(result_path):
         logger.info(f"<= {result_path}")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import json
+import random
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from loguru import logger
+
+from globalise_tools.model import AnnotationEncoder, WebAnnotation, dumps
+
+
+def random_web_annotations(n: int) -> list[WebAnnotation]:
+    rnd = random.Random(n)
+    web_annotations = []
+    for i in range(n):
+        page_id = f"NL-HaNA_1.04.02_{rnd.randint(1000, 9999)}_{rnd.randint(1, 999):04d}"
+        xywh = ",".join(str(rnd.randint(0, 4000)) for _ in range(4))
+        points = " ".join(f"L{rnd.randint(0, 4000)} {rnd.randint(0, 4000)}" for _ in range(8))
+        web_annotations.append(WebAnnotation(
+            body={
+                "id": f"urn:globalise:{page_id}:textline:{i}",
+                "type": "px:TextLine",
+                "metadata": {"text": "ende de gouverneur generaal ẽ raden van Indië", "n": i}
+            },
+            target=[
+                {"source": f"https://iiif.example.org/{page_id}.jp2/{xywh}/max/0/default.jpg", "type": "Image"},
+                {"source": f"https://iiif.example.org/{page_id}.jp2/full/max/0/default.jpg", "type": "Image",
+                 "selector": {"type": "SvgSelector", "value": f'<svg><path d="M{points[1:]} Z"/></svg>'}},
+                {"source": f"https://textrepo.example.org/rest/versions/{rnd.getrandbits(64):x}/contents",
+                 "type": "Text",
+                 "selector": {"type": "TextAnchorSelector", "start": i, "end": i + rnd.randint(0, 3)}}
+            ]
+        ))
+    return web_annotations
+
+
+def timed(serialize, web_annotations: list[WebAnnotation], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        before = time.perf_counter()
+        serialize(web_annotations)
+        elapsed = time.perf_counter() - before
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@logger.catch
+def main():
+    args = get_arguments()
+    layouts = {
+        "indent=2": dict(indent=2),
+        "indent=2, utf8": dict(indent=2, ensure_ascii=False),
+        "compact, utf8": dict(separators=(",", ":"), ensure_ascii=False),
+        "default, utf8": dict(ensure_ascii=False),
+    }
+    web_annotations = random_web_annotations(args.annotations)
+    # wrapped() makes new ids and timestamps on every call, so the output is compared on the wrapped annotations
+    wrapped = [wa.wrapped() for wa in web_annotations]
+    print(f"{'layout':16} {'AnnotationEncoder (s)':>22} {'dumps (s)':>10} {'speed-up':>9}")
+    for name, layout in layouts.items():
+        if json.dumps(wrapped, cls=AnnotationEncoder, **layout) != dumps(wrapped, **layout):
+            raise Exception(f"dumps output differs for {name}")
+        encoder_time = timed(lambda was: json.dumps(was, cls=AnnotationEncoder, **layout), web_annotations,
+                             args.repeat)
+        dumps_time = timed(lambda was: dumps(was, **layout), web_annotations, args.repeat)
+        print(f"{name:16} {encoder_time:22.3f} {dumps_time:10.3f} {encoder_time / dumps_time:8.1f}x")
+
+
+def get_arguments():
+    parser = ArgumentParser(
+        description="Compare serializing web annotations with json.dumps(cls=AnnotationEncoder) and with"
+                    " globalise_tools.model.dumps, and check that the output is the same",
+        formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-a",
+                        "--annotations",
+                        help="The number of web annotations to serialize",
+                        default=20000,
+                        type=int)
+    parser.add_argument("-r",
+                        "--repeat",
+                        help="The number of runs per layout; the fastest run is reported",
+                        default=3,
+                        type=int)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+import time
+import tomllib
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def scripts_are_packaged() -> bool:
+    try:
+        return importlib.util.find_spec("globalise_tools.scripts") is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def entry_point_commands() -> dict[str, list[str]]:
+    packaged = scripts_are_packaged()
+    with open(f"{ROOT_DIR}/pyproject.toml", 'rb') as f:
+        pyproject = tomllib.load(f)
+    commands = {}
+    for name, target in pyproject['tool']['poetry']['scripts'].items():
+        module = target.split(':')[0]
+        if not module.startswith("globalise_tools.scripts."):
+            continue
+        if packaged:
+            commands[name] = ["-m", module]
+        else:
+            # running from a checkout, where the scripts are not packaged as globalise_tools.scripts yet
+            commands[name] = [f"{ROOT_DIR}/scripts/{module.split('.')[-1]}.py"]
+    return commands
+
+
+def measure(command: list[str]) -> tuple[float, int, list[tuple[int, str]], int]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get("PYTHONPATH")])))
+    before = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command, env=env, capture_output=True, text=True)
+    wall_time = time.perf_counter() - before
+    top_level_imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level_imports.append((int(match.group(2)), match.group(4)))
+    import_time = sum(cumulative for cumulative, _ in top_level_imports)
+    top_level_imports.sort(reverse=True)
+    return wall_time, import_time, top_level_imports, result.returncode
+
+
+def main():
+    args = get_arguments()
+    commands = entry_point_commands()
+    for extra in args.command:
+        commands[extra] = extra.split()
+    failed = []
+    for name, command in commands.items():
+        wall_times = []
+        for _ in range(args.repeat):
+            wall_time, import_time, top_level_imports, return_code = measure(command + ["--help"])
+            wall_times.append(wall_time)
+        best = min(wall_times) * 1000
+        if return_code != 0:
+            status = "FAILED"
+        elif best > args.budget:
+            status = "OVER BUDGET"
+        else:
+            status = "ok"
+        slowest = ", ".join(f"{module} {cumulative / 1000:.0f}ms" for cumulative, module in top_level_imports[:3])
+        print(f"{name:32} {best:7.0f} ms (imports {import_time / 1000:5.0f} ms) {status:11} {slowest}")
+        if status != "ok":
+            failed.append(name)
+    if failed:
+        print(f"{len(failed)} of {len(commands)} commands failed or took longer than {args.budget} ms"
+              f" to show their help")
+        sys.exit(1)
+
+
+def get_arguments():
+    parser = ArgumentParser(
+        description="Measure the start-up time of the console scripts by running them with --help under"
+                    " python -X importtime, and check it against a time budget",
+        formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-b",
+                        "--budget",
+                        help="The maximum start-up time in ms",
+                        default=300,
+                        type=int)
+    parser.add_argument("-r",
+                        "--repeat",
+                        help="The number of runs per command; the fastest run is reported",
+                        default=3,
+                        type=int)
+    parser.add_argument("-c",
+                        "--command",
+                        help="An additional command to measure, e.g. 'scripts/tr-ctrl.py'",
+                        action="append",
+                        default=[],
+                        type=str)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
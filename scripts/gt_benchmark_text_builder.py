@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import random
+import string
+import time
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from loguru import logger
+
+from globalise_tools.text_builder import TextBuilder
+
+PARAGRAPHS_PER_PAGE = 20
+
+
+def random_paragraphs(pages: int, paragraph_length: int) -> list[str]:
+    rnd = random.Random(pages)
+    alphabet = string.ascii_lowercase + "    "
+    return ["".join(rnd.choices(alphabet, k=paragraph_length)) for _ in range(pages * PARAGRAPHS_PER_PAGE)]
+
+
+def assemble_with_concatenation(paragraphs: list[str]) -> tuple[str, list[tuple[int, int]]]:
+    text = ""
+    ranges = []
+    offset = 0
+    for p in paragraphs:
+        text += p
+        text_len = len(text)
+        ranges.append((offset, text_len))
+        offset = text_len
+    return text, ranges
+
+
+def assemble_with_text_builder(paragraphs: list[str]) -> tuple[str, list[tuple[int, int]]]:
+    builder = TextBuilder()
+    ranges = [builder.append(p) for p in paragraphs]
+    return builder.build(), ranges
+
+
+def timed(assemble, paragraphs: list[str]) -> float:
+    before = time.perf_counter()
+    assemble(paragraphs)
+    return time.perf_counter() - before
+
+
+@logger.catch
+def main():
+    args = get_arguments()
+    print(f"{'pages':>8} {'+= (s)':>10} {'us/page':>10} {'TextBuilder (s)':>16} {'us/page':>10}")
+    for pages in args.pages:
+        paragraphs = random_paragraphs(pages, args.paragraph_length)
+        expected = assemble_with_concatenation(paragraphs)
+        if assemble_with_text_builder(paragraphs) != expected:
+            raise Exception(f"TextBuilder result differs for {pages} pages")
+        concatenation_time = timed(assemble_with_concatenation, paragraphs)
+        text_builder_time = timed(assemble_with_text_builder, paragraphs)
+        print(f"{pages:8d} {concatenation_time:10.3f} {1e6 * concatenation_time / pages:10.1f}"
+              f" {text_builder_time:16.3f} {1e6 * text_builder_time / pages:10.1f}")
+
+
+def get_arguments():
+    parser = ArgumentParser(
+        description="Compare assembling a document text with += and with TextBuilder, for growing document sizes."
+                    " With linear assembly, the time per page stays flat.",
+        formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-p",
+                        "--pages",
+                        help="The document sizes (in pages) to measure",
+                        nargs="+",
+                        default=[100, 200, 400, 800],
+                        type=int)
+    parser.add_argument("-l",
+                        "--paragraph-length",
+                        help="The number of characters per paragraph",
+                        default=300,
+                        type=int)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,43 +3,96 @@ import csv
 import glob
 import os
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from itertools import groupby
 
-import pagexml.parser as px
 from loguru import logger
 
+import globalise_tools.pagexml_cache as pxc
+from globalise_tools.splitting import batched
+
+HEADER = ["inv_nr", "page_no", "textregion_id", "textregion_type", "line_id", "line_text"]
+
 
 def main():
     args = get_arguments()
-    run(args.input_directory, args.output_directory)
+    run(args.input_directory, args.output_directory, workers=args.workers, chunk_size=args.chunk_size,
+        force=args.force)
 
 
 @logger.catch
-def run(base_pagexml_path: str, output_directory: str):
+def run(base_pagexml_path: str, output_directory: str, workers: int = 1, chunk_size: int = 100,
+        force: bool = False):
     inv_nrs = sorted(
         [p.split("/")[-1] for p in glob.glob(f"{base_pagexml_path}/*") if os.path.isdir(p)])
-    for i in inv_nrs:
-        process_inv(i, base_pagexml_path, output_directory)
+    tasks = []
+    for inv_nr in inv_nrs:
+        paths = pagexml_paths(inv_nr, base_pagexml_path)
+        if not force and is_up_to_date(output_file_name(inv_nr, output_directory), paths):
+            logger.info(f"skipping {inv_nr}, {output_file_name(inv_nr, output_directory)} is up to date")
+        else:
+            chunks = [list(chunk) for chunk in batched(paths, chunk_size)] or [[]]
+            tasks.extend((inv_nr, chunk) for chunk in chunks)
+    if workers > 1:
+        import multiprocess as mp
+        with mp.Pool(processes=workers) as pool:
+            write_inventories(pool.imap(extract_rows, tasks), output_directory)
+    else:
+        write_inventories(map(extract_rows, tasks), output_directory)
 
 
 def pagexml_paths(inv_nr: str, base_pagexml_path: str) -> list[str]:
     return sorted(glob.glob(f"{base_pagexml_path}/{inv_nr}/NL-HaNA_1.04.02_{inv_nr}_*.xml"))
 
 
+def output_file_name(inv_nr: str, output_directory: str) -> str:
+    return f"{output_directory}/{inv_nr}-lines.tsv"
+
+
+def is_up_to_date(file_name: str, source_paths: list[str]) -> bool:
+    if not os.path.exists(file_name):
+        return False
+    file_mtime = os.path.getmtime(file_name)
+    return all(os.path.getmtime(p) < file_mtime for p in source_paths)
+
+
+def extract_rows(task: tuple[str, list[str]]) -> tuple[str, list[list[str]]]:
+    inv_nr, paths = task
+    rows = []
+    for path in paths:
+        rows.extend(page_rows(inv_nr, path))
+    return inv_nr, rows
+
+
+def page_rows(inv_nr: str, path: str) -> list[list[str]]:
+    parts = path.split('/')
+    page_no = parts[-1].split('_')[-1].replace('.xml', '')
+    scan_doc = pxc.parse_pagexml_file(pagexml_file=path)
+    rows = []
+    for tr in scan_doc.get_text_regions_in_reading_order():
+        if tr.lines:
+            for l in tr.lines:
+                if l.text:
+                    rows.append([inv_nr, page_no, tr.id, tr.type[-1], l.id, l.text])
+    return rows
+
+
+def write_inventories(chunk_results, output_directory: str):
+    # chunk_results arrive in task order, so all chunks of an inventory are consecutive and in page order
+    for inv_nr, inv_chunk_results in groupby(chunk_results, key=lambda r: r[0]):
+        file_name = output_file_name(inv_nr, output_directory)
+        tmp_file_name = f"{file_name}.tmp"
+        print(f"=> {file_name}")
+        with open(tmp_file_name, mode='w', newline='') as file:
+            writer = csv.writer(file, delimiter='\t')
+            writer.writerow(HEADER)
+            for _, rows in inv_chunk_results:
+                writer.writerows(rows)
+        os.replace(tmp_file_name, file_name)
+
+
 def process_inv(inv_nr: str, base_pagexml_path: str, output_directory: str):
-    file_name = f"{output_directory}/{inv_nr}-lines.tsv"
-    print(f"=> {file_name}")
-    with open(file_name, mode='w', newline='') as file:
-        writer = csv.writer(file, delimiter='\t')
-        writer.writerow(["inv_nr", "page_no", "textregion_id", "textregion_type", "line_id", "line_text"])
-        for path in pagexml_paths(inv_nr, base_pagexml_path):
-            parts = path.split('/')
-            page_no = parts[-1].split('_')[-1].replace('.xml', '')
-            scan_doc = px.parse_pagexml_file(pagexml_file=path)
-            for tr in scan_doc.get_text_regions_in_reading_order():
-                if tr.lines:
-                    for l in tr.lines:
-                        if l.text:
-                            writer.writerow([inv_nr, page_no, tr.id, tr.type[-1], l.id, l.text])
+    paths = pagexml_paths(inv_nr, base_pagexml_path)
+    write_inventories([extract_rows((inv_nr, paths))], output_directory)
 
 
 @logger.catch
@@ -58,6 +111,23 @@ def get_arguments():
                         default=".",
                         type=str
                         )
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to use",
+                        default=1,
+                        type=int
+                        )
+    parser.add_argument("-c",
+                        "--chunk-size",
+                        help="The maximum number of pages per task, large inventories are split into chunks of this size",
+                        default=100,
+                        type=int
+                        )
+    parser.add_argument("-f",
+                        "--force",
+                        help="Also process the inventories whose line tsv is newer than all of their PageXML files",
+                        action="store_true"
+                        )
     return parser.parse_args()
 
 
@@ -2,17 +2,18 @@
 import argparse
 import os.path
 from datetime import datetime
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from xml.dom.minidom import parseString, Document
 
 import lxml
-import pagexml.parser as px
 from loguru import logger
 from lxml import etree
 
-import globalise_tools.document_metadata as DM
 import globalise_tools.git_tools as git
-from globalise_tools.document_metadata import DocumentMetadata
+import globalise_tools.pagexml_cache as pxc
+
+if TYPE_CHECKING:
+    from globalise_tools.document_metadata import DocumentMetadata
 
 fixable_error_codes = ['3.1.1', '3.1.2', '3.2']
 
@@ -52,7 +53,7 @@ class PageXmlFixer:
         self.import_path = import_path
         self.output_directory = output_directory
         self.quality_check = quality_check
-        self.scan_doc = px.parse_pagexml_file(self.import_path)
+        self.scan_doc = pxc.parse_pagexml_file(self.import_path)
         self.error_codes = set()
 
     def fix(self):
@@ -246,6 +247,9 @@ class PageXmlFixer:
 
 @logger.catch
 def fix_reading_order(input_directory: str, output_directory: str, document_metadata_paths: list[str]):
+    # document_metadata is only imported here, so --help does not have to wait for dataclasses_json
+    import globalise_tools.document_metadata as DM
+
     relevant_documents = [r for r in DM.read_document_selection(document_metadata_paths) if is_relevant(r)]
     pagexml_paths = []
     quality_check = {}
@@ -264,7 +268,7 @@ def fix_reading_order(input_directory: str, output_directory: str, document_meta
             logger.warning(f"missing file: {import_path}")
 
 
-def is_relevant(document_metadata: DocumentMetadata) -> bool:
+def is_relevant(document_metadata: 'DocumentMetadata') -> bool:
     quality_check = document_metadata.quality_check
     return '3.1.1' in quality_check or '3.1.2' in quality_check or '3.2' in quality_check and document_metadata.scan_range != ""
 
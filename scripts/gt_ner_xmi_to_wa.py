@@ -7,50 +7,66 @@ import os
 import re
 import time
 import uuid
+import dataclasses
 from dataclasses import dataclass
 from datetime import datetime
 from itertools import groupby
+from collections import deque
+from concurrent.futures import Future
 from multiprocessing import Value
 from typing import Tuple
 
 import cassis as cas
 import multiprocess as mp
-import pagexml.parser as px
 from cassis.typesystem import FeatureStructure
 from circuitbreaker import circuit
 from icecream import ic
-from intervaltree import IntervalTree, Interval
 from loguru import logger
 from textrepo.client import TextRepoClient, FileType, VersionInfo
 from tqdm import tqdm
 
 import globalise_tools.git_tools as git
+import globalise_tools.pagexml_cache as pxc
 import globalise_tools.textrepo_tools as tt
 import globalise_tools.tools as gt
+from globalise_tools.annotation_sink import AnnotationSink
+from globalise_tools.document_data_store import DocumentDataStore
 from globalise_tools.events import wiki_base, time_roles, place_roles, NER_DATA_DICT
 from globalise_tools.model import ImageData
+from globalise_tools.run_state import RunState
 from globalise_tools.tools import inv_nr_sort_key
+from globalise_tools.word_offsets import WordOffsets, WordOffsetsWriter, load_word_offsets, close_mapped_files
 
 THIS_SCRIPT_PATH = "scripts/" + os.path.basename(__file__)
 
 counter = Value('i', 0)
 total = Value('i', 0)
-start_time = Value('f', 0)
+start_time = Value('d', 0)
+total_size = Value('d', 0)
+processed_size = Value('d', 0)
 
 # MANIFEST_BASE_URL = "https://brambg.github.io/static-file-server/globalise"
 MANIFEST_BASE_URL = "https://globalise-mirador.tt.di.huc.knaw.nl/globalise"
 # MANIFEST_BASE_URL = "http://localhost:8000/globalise"
 PRESENTATION_VERSION = 3
+UPLOAD_LOOKAHEAD = 16
+# data/document_data.json is only read; the document data with the entries added in a run is written here
+DEFAULT_DOCUMENT_DATA_OUTPUT = "out/document_data.json"
 
 
-def show_progress(future):
+def show_progress(finished_inventory_size: float = 0):
     with counter.get_lock():  # Ensure thread-safe increment
         counter.value += 1
+        processed_size.value += finished_inventory_size
         percentage_done = 100 * (counter.value / total.value)
         now = time.perf_counter()
         seconds_since_start = now - start_time.value
-        average_time_per_inv = seconds_since_start / counter.value
-        eta = total.value * average_time_per_inv
+        if total_size.value > 0 and processed_size.value > 0:
+            # inventory sizes vary a lot, so estimate using the processed share of the total size when it is known
+            eta = seconds_since_start * total_size.value / processed_size.value
+        else:
+            average_time_per_inv = seconds_since_start / counter.value
+            eta = total.value * average_time_per_inv
         seconds_remaining = gt.seconds_to_hhmmss(eta - seconds_since_start)
         logger.info(
             f"finished inventory {counter.value}/{total.value} ({percentage_done:.2f}% done); estimated time remaining: {seconds_remaining}")
@@ -73,26 +89,24 @@ class XMIProcessor:
         self.text_len = len(self.text)
         md5 = hashlib.md5(self.text.encode()).hexdigest()
         # ic(md5)
-        data = None
         path_parts = xmi_path.split('/')
         base_name = path_parts[-1].replace('.xmi', '')
 
         self.document_id = base_name
-        for k, v in document_data.items():
-            if v['plain_text_md5'] == md5:
-                self.document_id = k
-                data = v
+        document_id, data = document_data.find_by_md5(md5)
+        if data:
+            self.document_id = document_id
         self.event_argument_entity_dict = {}
         # source_list = [d['plain_text_source'] for d in document_data.values() if d['plain_text_md5'] == md5]
         if data:
             self.plain_text_source = data['plain_text_source']
-            self.itree = IntervalTree([Interval(*iv) for iv in data['text_intervals']])
+            self.itree = load_word_offsets(data)
         else:
             # logger.error(f"No document data found for {xmi_path}, using placeholder target source")
             # raise Exception(f"No document data found for {xmi_path}")
             # # todo: create plain_text_source and itree
             self.plain_text_source = "urn:placeholder"
-            self.itree = IntervalTree()
+            self.itree = WordOffsets()
 
     def text(self) -> str:
         return self.text
@@ -739,11 +753,8 @@ class XMIProcessorFactory:
                             presentation_version=presentation_version)
 
     @staticmethod
-    def _read_document_data() -> dict[str, any]:
-        path = "data/document_data.json"
-        logger.info(f"<= {path}")
-        with open(path) as f:
-            return json.load(f)
+    def _read_document_data() -> DocumentDataStore:
+        return DocumentDataStore("data/document_data.json")
 
     @staticmethod
     def _read_current_commit_id():
@@ -790,6 +801,21 @@ def get_arguments():
                         help="The directory to write the output files in",
                         type=str
                         )
+    parser.add_argument("-w",
+                        "--workers",
+                        help="The number of worker processes to use",
+                        type=int,
+                        default=5
+                        )
+    parser.add_argument("-d",
+                        "--document-data-output",
+                        help="Where to write data/document_data.json merged with the entries added in this run."
+                             " Added entries refer to their word offsets with a text_intervals_ref"
+                             " ({path, offset, length} into text_intervals/<inv_nr>.bin next to this file)"
+                             " instead of inline text_intervals",
+                        type=str,
+                        default=DEFAULT_DOCUMENT_DATA_OUTPUT
+                        )
     return parser.parse_args()
 
 
@@ -816,12 +842,6 @@ def get_arguments():
 #             json.dump(all_web_annotations, f, indent=2, ensure_ascii=False)
 
 
-def export_ner_annotations(ner_annotations: list, out_path: str):
-    logger.info(f"=> {out_path}")
-    with open(out_path, 'w') as f:
-        json.dump(ner_annotations, fp=f, indent=4)
-
-
 def export_annotation_list(annotations: list[dict[str, any]], out_path: str, presentation_version: int = 2):
     list_id = out_path.replace("out/", f"{MANIFEST_BASE_URL}/")
     anno_list = {
@@ -869,62 +889,93 @@ class InventoryProcessingContext:
     trc: TextRepoClient
     plain_text_type: FileType
     presentation_version: int
+    document_data_output: str = DEFAULT_DOCUMENT_DATA_OUTPUT
 
 
-def load_processed_inventories() -> list[str]:
-    path = "out/processed_ner_inv.json"
-    if os.path.exists(path):
-        logger.info(f"<= {path}")
-        with open(path) as f:
-            return json.load(f)
-    return []
-
-
-def store_processed_inventories(processed_inventories: list[str]):
-    path = "out/processed_ner_inv.json"
-    logger.info(f"=> {path}")
-    with open(path, "w") as f:
-        json.dump(processed_inventories, fp=f)
+def load_processed_inventories() -> RunState:
+    return RunState("out/processed_ner_inv.jsonl", legacy_path="out/processed_ner_inv.json")
 
 
 def extract_ner_web_annotations(pagexml_dir: str, xmi_dir: str, type_system_path: str, output_dir: str,
-                                textrepo_url: str, api_key: str):
+                                textrepo_url: str, api_key: str, workers: int = 5,
+                                document_data_output: str = DEFAULT_DOCUMENT_DATA_OUTPUT):
     trc = TextRepoClient(textrepo_url, api_key=api_key, verbose=False)
     plain_text_file_type = tt.get_file_type(trc, 'txt', 'text/plain')
-    xmi_dirs = sorted(glob.glob(f"{xmi_dir}/[0-9]*"), key=inv_nr_sort_key)
-    xpf = XMIProcessorFactory(type_system_path)
+    processed_inventories = load_processed_inventories()
+    xmi_dirs = [d for d in sorted(glob.glob(f"{xmi_dir}/[0-9]*"), key=inv_nr_sort_key)
+                if d.split('/')[-1] not in processed_inventories]
 
     total.value = len(xmi_dirs)
     logger.info(f"{total.value} inventories to process...")
-    run_in_parallel(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf)
-    # run_sequentially(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf)
+    with processed_inventories:
+        run_in_parallel(output_dir, pagexml_dir, plain_text_file_type, xmi_dirs, type_system_path, textrepo_url,
+                        api_key, processed_inventories, workers, document_data_output)
+    # xpf = XMIProcessorFactory(type_system_path)
+    # run_sequentially(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf, document_data_output)
     logger.info("done!")
 
 
-def run_in_parallel(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf):
-    contexts = [
-        InventoryProcessingContext(
-            xmi_dir,
-            output_dir,
-            pagexml_dir,
-            xpf,
-            trc,
-            plain_text_file_type,
-            PRESENTATION_VERSION
-        )
-        for xmi_dir in xmi_dirs
-    ]
-    with mp.Pool(5) as p:
-        results = p.map(func=process_inventory, iterable=contexts)
-    for result in results:
-        logger.info(f"finished {result}")
+# per-process state for the pool workers, set once by init_inventory_worker
+_worker_context = {}
+
+
+def init_inventory_worker(output_dir: str, pagexml_dir: str, plain_text_file_type: FileType, type_system_path: str,
+                          textrepo_url: str, api_key: str, document_data_output: str):
+    _worker_context['context'] = InventoryProcessingContext(
+        xmi_dir="",
+        output_dir=output_dir,
+        pagexml_dir=pagexml_dir,
+        xpf=XMIProcessorFactory(type_system_path),
+        trc=TextRepoClient(textrepo_url, api_key=api_key, verbose=False),
+        plain_text_type=plain_text_file_type,
+        presentation_version=PRESENTATION_VERSION,
+        document_data_output=document_data_output
+    )
+
+
+def process_inventory_in_worker(xmi_dir: str) -> tuple[str, dict[str, any]]:
+    context = dataclasses.replace(_worker_context['context'], xmi_dir=xmi_dir)
+    process_inventory(context)
+    # hand the document_data entries of this inventory back to the parent instead of keeping them in the worker
+    return xmi_dir, context.xpf.document_data.take_added_items()
+
+
+def inventory_size(xmi_dir: str) -> int:
+    return sum(os.path.getsize(p) for p in glob.glob(f"{xmi_dir}/*.xmi"))
+
+
+def run_in_parallel(output_dir, pagexml_dir, plain_text_file_type, xmi_dirs, type_system_path, textrepo_url,
+                    api_key, processed_inventories: RunState, workers: int = 5,
+                    document_data_output: str = DEFAULT_DOCUMENT_DATA_OUTPUT):
+    # every worker loads the typesystem and opens the document data once; the tasks only carry the xmi_dir
+    initargs = (output_dir, pagexml_dir, plain_text_file_type, type_system_path, textrepo_url, api_key,
+                 document_data_output)
+    # schedule the largest inventories first, so a huge inventory does not end up running alone at the end
+    size_for_xmi_dir = {xmi_dir: inventory_size(xmi_dir) for xmi_dir in xmi_dirs}
+    scheduled_xmi_dirs = sorted(xmi_dirs, key=lambda d: size_for_xmi_dir[d], reverse=True)
+    total_size.value = sum(size_for_xmi_dir.values())
+    document_data = DocumentDataStore("data/document_data.json")
+    # the document data of inventories finished in an interrupted run is only in the processed inventories log
+    for _, inventory_document_data in processed_inventories.items():
+        document_data.update(inventory_document_data or {})
+    # build the sidecar files here, once, before the workers open them
+    document_data.prepare()
+    start_time.value = time.perf_counter()
+    with mp.Pool(workers, initializer=init_inventory_worker, initargs=initargs) as p:
+        for xmi_dir, added_document_data in p.imap_unordered(process_inventory_in_worker, scheduled_xmi_dirs):
+            logger.info(f"finished {xmi_dir}")
+            document_data.update(added_document_data)
+            processed_inventories.mark_done(xmi_dir.split('/')[-1], added_document_data)
+            show_progress(size_for_xmi_dir[xmi_dir])
+    document_data.save(document_data_output)
     # with ThreadPoolExecutor() as executor:
     #     results = executor.map(process_inventory, contexts)
     #     for result in results:
     #         logger.info(f"finished {result}")
 
 
-def run_sequentially(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf):
+def run_sequentially(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dirs, xpf,
+                     document_data_output: str = DEFAULT_DOCUMENT_DATA_OUTPUT):
     start_time.value = time.perf_counter()
     for xmi_dir in xmi_dirs:
         context = InventoryProcessingContext(
@@ -934,10 +985,12 @@ def run_sequentially(output_dir, pagexml_dir, plain_text_file_type, trc, xmi_dir
             xpf,
             trc,
             plain_text_file_type,
-            PRESENTATION_VERSION
+            PRESENTATION_VERSION,
+            document_data_output
         )
         process_inventory(context)
-        # show_progress(None)
+        show_progress()
+    xpf.document_data.save(document_data_output)
 
 
 def process_inventory(context: InventoryProcessingContext):
@@ -959,23 +1012,37 @@ def process_inventory(context: InventoryProcessingContext):
         os.makedirs(f"{output_dir}/{inv_nr}", exist_ok=True)
         anno_out_path = f"{output_dir}/{inv_nr}/ner-annotations.json"
         text_out_path = f"{output_dir}/{inv_nr}/text.txt"
-        ner_annotations = []
         page_texts = []
         manifest = load_manifest(inv_nr)
         manifest_item_idx, iiif_base_uri_idx, canvas_id_idx = index_manifest_items(manifest)
-        for xmi_path in xmi_paths:
-            plain_text_source = handle_page_xml(xmi_path, pagexml_dir, xpf, trc, context.plain_text_type,
-                                                iiif_base_uri_idx, canvas_id_idx)
+
+        def handle_next_page():
+            xmi_path, page_text = pending_pages.popleft()
+            plain_text_source = register_page_text(xpf, word_offsets_writer, page_text)
             handle_xmi(xmi_path, ner_annotations, page_texts, xpf, plain_text_source, manifest, manifest_item_idx,
                        context.presentation_version)
+
+        # the uploads run in the background, while the next pages are parsed and the xmi of earlier pages is handled
+        word_offsets_path = f"{os.path.dirname(context.document_data_output) or '.'}/text_intervals/{inv_nr}.bin"
+        with tt.TextRepoUploader(trc.base_uri, api_key=trc.api_key, max_pending=UPLOAD_LOOKAHEAD) as uploader, \
+                WordOffsetsWriter(word_offsets_path) as word_offsets_writer, \
+                AnnotationSink(anno_out_path, indent=4, ensure_ascii=True) as ner_annotations:
+            pending_pages = deque()
+            for xmi_path in xmi_paths:
+                page_text = handle_page_xml(xmi_path, pagexml_dir, xpf, uploader, context.plain_text_type,
+                                            iiif_base_uri_idx, canvas_id_idx)
+                pending_pages.append((xmi_path, page_text))
+                if len(pending_pages) > UPLOAD_LOOKAHEAD:
+                    handle_next_page()
+            while pending_pages:
+                handle_next_page()
+        # the word offsets of this inventory are not read again
+        close_mapped_files()
         manifest['id'] = f"{MANIFEST_BASE_URL}/{inv_nr}/{inv_nr}.json"
         store_manifest(inv_nr, manifest)
-
-        export_ner_annotations(ner_annotations, anno_out_path)
         # export_text(page_texts, text_out_path)
         toc = time.perf_counter()
         logger.info(f"processed all xmi files from {xmi_dir} in {toc - tic:0.2f} seconds")
-    show_progress(None)
     return xmi_dir
 
 
@@ -1004,7 +1071,7 @@ def store_manifest(inv_nr: str, manifest: dict[str, any]):
 
 def handle_xmi(
         xmi_path: str,
-        ner_annotations: list,
+        ner_annotations: AnnotationSink,
         page_texts: list,
         xpf: XMIProcessorFactory,
         plain_text_source: str,
@@ -1020,10 +1087,10 @@ def handle_xmi(
     xp.plain_text_source = plain_text_source
     xp.document_id = basename
     nea = xp.get_named_entity_annotations()
-    ner_annotations.extend(nea)
+    ner_annotations.write_all(nea)
     entity_ids = [a['body']['id'] for a in nea if 'id' in a['body']]
     eva = xp.get_event_annotations(entity_ids)
-    ner_annotations.extend(eva)
+    ner_annotations.write_all(eva)
     inv_nr = basename_parts[-2]
     # annotation_list_path = f"out/{inv_nr}/iiif-annotations-{basename}.json"
     # export_annotation_list(annotations=xp.get_iiif_annotations(), out_path=annotation_list_path,
@@ -1061,17 +1128,31 @@ def get_base_name(path: str):
     return path.split("/")[-1].replace(".xmi", "")
 
 
+@dataclass
+class PageText:
+    base_name: str
+    plain_text_md5: str
+    word_offsets: WordOffsets
+    plain_text_source: Future
+
+
+def upload_plain_text(trc: TextRepoClient, external_id: str, contents: str, plain_text_file_type: FileType) -> str:
+    txt_version_identifier = upload_to_textrepo(trc, external_id, contents, plain_text_file_type)
+    txt_version_uri = f"{trc.base_uri}/rest/versions/{txt_version_identifier.version_id}"
+    return f"{txt_version_uri}/contents"
+
+
 def handle_page_xml(
         xmi_path: str,
         pagexml_dir: str,
         xpf: XMIProcessorFactory,
-        trc: TextRepoClient,
+        uploader: tt.TextRepoUploader,
         plain_text_file_type: FileType,
         iiif_base_uri_for_base_name: dict[str, str],
-        canvas_id_for_base_name: dict[str, str]) -> str:
+        canvas_id_for_base_name: dict[str, str]) -> PageText:
     base_name = get_base_name(xmi_path)
     page_xml_path = get_page_xml_path(xmi_path, pagexml_dir)
-    scan_doc = px.parse_pagexml_file(pagexml_file=page_xml_path)
+    scan_doc = pxc.parse_pagexml_file(pagexml_file=page_xml_path)
     if base_name in iiif_base_uri_for_base_name:
         iiif_base_uri = iiif_base_uri_for_base_name[base_name]
         canvas_id = canvas_id_for_base_name[base_name]
@@ -1084,15 +1165,29 @@ def handle_page_xml(
                                                                                                             canvas_id=canvas_id)
 
     plain_text = text
-    txt_version_identifier = upload_to_textrepo(trc, base_name, plain_text, plain_text_file_type)
-    txt_version_uri = f"{trc.base_uri}/rest/versions/{txt_version_identifier.version_id}"
-    plain_text_source = f"{txt_version_uri}/contents"
-
     md5 = hashlib.md5(plain_text.encode()).hexdigest()
-    xpf.document_data[base_name] = {
+    if xpf.document_data.plain_text_md5(base_name) == md5:
+        # this text was uploaded before, so the latest version in textrepo already has these contents
+        plain_text_source = tt.completed_future(xpf.document_data[base_name]["plain_text_source"])
+    else:
+        plain_text_source = uploader.submit(upload_plain_text, base_name, plain_text, plain_text_file_type)
+    return PageText(
+        base_name=base_name,
+        plain_text_md5=md5,
+        word_offsets=word_interval_tree,
+        plain_text_source=plain_text_source
+    )
+
+
+def register_page_text(xpf: XMIProcessorFactory, word_offsets_writer: WordOffsetsWriter, page_text: PageText) -> str:
+    plain_text_source = page_text.plain_text_source.result()
+    previous_ref = None
+    if page_text.base_name in xpf.document_data:
+        previous_ref = xpf.document_data[page_text.base_name].get("text_intervals_ref")
+    xpf.document_data[page_text.base_name] = {
         "plain_text_source": plain_text_source,
-        "plain_text_md5": md5,
-        "text_intervals": list(word_interval_tree)
+        "plain_text_md5": page_text.plain_text_md5,
+        "text_intervals_ref": word_offsets_writer.write(page_text.word_offsets, previous_ref)
     }
     return plain_text_source
 
@@ -1112,7 +1207,8 @@ def main():
     args = get_arguments()
     if args.xmi_dir:
         extract_ner_web_annotations(args.pagexml_dir, args.xmi_dir, args.type_system, args.output_dir, args.text_repo,
-                                    args.api_key)
+                                    args.api_key, workers=args.workers,
+                                    document_data_output=args.document_data_output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import glob
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from loguru import logger
+from tqdm import tqdm
+
+from globalise_tools.pagexml_cache import default_cache
+
+
+def main():
+    args = get_arguments()
+    cache = default_cache()
+    if args.cache_dir:
+        cache.cache_dir = args.cache_dir
+    if args.max_size:
+        cache.max_size = args.max_size * 1024 * 1024
+    if args.command == "warm":
+        warm(cache, args.pagexml_dir)
+    elif args.command == "prune":
+        prune(cache, args.pagexml_dir)
+    elif args.command == "stats":
+        logger.info(f"{cache.cache_dir}: {len(cache.entry_paths())} entries, {cache.size() / (1024 * 1024):.1f} MB")
+
+
+def pagexml_paths(pagexml_dirs: list[str]) -> list[str]:
+    paths = []
+    for pagexml_dir in pagexml_dirs:
+        paths.extend(sorted(glob.glob(f"{pagexml_dir}/**/*.xml", recursive=True)))
+    return paths
+
+
+@logger.catch
+def warm(cache, pagexml_dirs: list[str]):
+    paths = pagexml_paths(pagexml_dirs)
+    parsed = 0
+    for path in tqdm(paths, desc="warming pagexml cache"):
+        parsed += cache.warm([path])
+    logger.info(f"parsed {parsed} of {len(paths)} pagexml files into {cache.cache_dir}")
+
+
+@logger.catch
+def prune(cache, pagexml_dirs: list[str]):
+    if pagexml_dirs:
+        paths = pagexml_paths(pagexml_dirs)
+        removed = sum(1 for path in paths if cache.invalidate(path))
+        logger.info(f"removed {removed} cache entries for {len(paths)} pagexml files")
+    else:
+        removed, freed = cache.prune()
+        logger.info(f"removed {removed} cache entries, freed {freed / (1024 * 1024):.1f} MB")
+
+
+@logger.catch
+def get_arguments():
+    parser = ArgumentParser(
+        description="Manage the cache of parsed PageXML files shared by the globalise-tools scripts",
+        formatter_class=ArgumentDefaultsHelpFormatter)
+    parser.add_argument("command",
+                        choices=["warm", "prune", "stats"],
+                        help="warm: parse and cache all PageXML files in the given directories;"
+                             " prune: remove the cache entries for the given directories,"
+                             " or the least recently used entries above the maximum size when no directory is given;"
+                             " stats: show the cache size",
+                        type=str)
+    parser.add_argument("pagexml_dir",
+                        help="The directory (or directories) containing the PageXML files,"
+                             " either a single inventory or grouped by inventory number",
+                        nargs="*",
+                        type=str)
+    parser.add_argument("-c",
+                        "--cache-dir",
+                        help="The cache directory to use (default: $GT_PAGEXML_CACHE_DIR or ~/.cache/globalise-tools/pagexml)",
+                        type=str)
+    parser.add_argument("-s",
+                        "--max-size",
+                        help="The maximum cache size in MB",
+                        type=int)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
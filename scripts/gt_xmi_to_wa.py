@@ -7,17 +7,18 @@ import re
 import uuid
 from datetime import datetime
 from itertools import groupby
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
-import cassis as cas
-from cassis.typesystem import FeatureStructure
-from icecream import ic
-from intervaltree import IntervalTree, Interval
 from loguru import logger
 
 import globalise_tools.git_tools as git
+from globalise_tools.document_data_store import DocumentDataStore
 from globalise_tools.events import NER_DATA_DICT, wiki_base, time_roles, place_roles
 from globalise_tools.model import ImageData
+from globalise_tools.word_offsets import load_word_offsets
+
+if TYPE_CHECKING:
+    from cassis.typesystem import FeatureStructure
 
 THIS_SCRIPT_PATH = "scripts/" + os.path.basename(__file__)
 
@@ -31,22 +32,21 @@ class XMIProcessor:
         self.xmi_path = xmi_path
         self.commit_id = commit_id
         logger.info(f"<= {xmi_path}")
+        import cassis as cas
         with open(xmi_path, 'rb') as f:
             self.cas = cas.load_cas_from_xmi(f, typesystem=self.typesystem)
         self.text = self.cas.get_sofa().sofaString
         self.text_len = len(self.text)
         md5 = hashlib.md5(self.text.encode()).hexdigest()
-        data = None
         self.document_id = "unknown"
-        for k, v in document_data.items():
-            if v['plain_text_md5'] == md5:
-                self.document_id = k
-                data = v
+        document_id, data = document_data.find_by_md5(md5)
+        if data:
+            self.document_id = document_id
         self.event_argument_entity_dict = {}
         # source_list = [d['plain_text_source'] for d in document_data.values() if d['plain_text_md5'] == md5]
         if data:
             self.plain_text_source = data['plain_text_source']
-            self.itree = IntervalTree([Interval(*iv) for iv in data['text_intervals']])
+            self.itree = load_word_offsets(data)
         else:
             # logger.error(f"No document data found for {xmi_path}, using placeholder target source")
             raise Exception(f"No document data found for {xmi_path}")
@@ -142,12 +142,13 @@ class XMIProcessor:
             suffix = extended_suffix
         return suffix
 
-    def _as_web_annotation(self, feature_structure: FeatureStructure, body):
+    def _as_web_annotation(self, feature_structure: 'FeatureStructure', body):
         anno_id = self._annotation_id(feature_structure.xmiID)
         original_fs = feature_structure
         if feature_structure['begin'] is None:
             feature_structure = feature_structure['target']
         if not feature_structure:
+            from icecream import ic
             ic(original_fs)
             logger.error("missing feature_structure")
             exact = ""
@@ -233,7 +234,7 @@ class XMIProcessor:
         }
 
     @staticmethod
-    def _named_entity_body(feature_structure: FeatureStructure):
+    def _named_entity_body(feature_structure: 'FeatureStructure'):
         entity_id = feature_structure.value
         ner_data = NER_DATA_DICT[entity_id]
         entity_uri = ner_data['uri']
@@ -250,7 +251,7 @@ class XMIProcessor:
         ]
 
     @staticmethod
-    def _event_predicate_body(feature_structure: FeatureStructure):
+    def _event_predicate_body(feature_structure: 'FeatureStructure'):
         # ic(feature_structure)
         bodies = []
         raw_category = feature_structure['category']
@@ -427,7 +428,7 @@ class XMIProcessor:
             "target": entity_annotation_id
         }
 
-    def _event_inference_annotation(self, event_annotation: FeatureStructure,
+    def _event_inference_annotation(self, event_annotation: 'FeatureStructure',
                                     event_predicate_annotation,
                                     event_argument_annotation_ids: list[str] = [],
                                     event_linking_annotation_ids: list[str] = []):
@@ -525,6 +526,8 @@ class XMIProcessorFactory:
 
     def __init__(self, typesystem_path: str):
         logger.info(f"<= {typesystem_path}")
+        # cassis is only imported here, so --help does not have to wait for it
+        import cassis as cas
         with open(typesystem_path, 'rb') as f:
             self.typesystem = cas.load_typesystem(f)
         self.document_data = self._read_document_data()
@@ -534,11 +537,8 @@ class XMIProcessorFactory:
         return XMIProcessor(self.typesystem, self.document_data, self.commit_id, xmi_path)
 
     @staticmethod
-    def _read_document_data() -> dict[str, any]:
-        path = "data/document_data.json"
-        logger.info(f"<= {path}")
-        with open(path) as f:
-            return json.load(f)
+    def _read_document_data() -> DocumentDataStore:
+        return DocumentDataStore("data/document_data.json")
 
     @staticmethod
     def _read_current_commit_id():
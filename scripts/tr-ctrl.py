@@ -2,12 +2,13 @@
 import argparse
 import csv
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING
 
-from dataclasses_json import dataclass_json
-from icecream import ic
 from loguru import logger
-from textrepo.client import TextRepoClient, DocumentIdentifier
+
+if TYPE_CHECKING:
+    from textrepo.client import TextRepoClient
 
 ids = ["NL-HaNA_1.04.02_1092_0017",
        "NL-HaNA_1.04.02_1092_0018",
@@ -107,7 +108,6 @@ base_names = [
 ]
 
 
-@dataclass_json
 @dataclass
 class TRDocument:
     external_id: str
@@ -118,6 +118,7 @@ class TRDocument:
 
 @logger.catch
 def access_textrepo(base_uri: str, api_key: str):
+    from textrepo.client import TextRepoClient
     trc = TextRepoClient(base_uri, api_key=api_key, verbose=False)
     set_file_types(trc)
     # check_external_ids(trc)
@@ -126,7 +127,7 @@ def access_textrepo(base_uri: str, api_key: str):
     # show_document_urls(trc)
 
 
-def create_document(trc: TextRepoClient, document_name: str) -> TRDocument:
+def create_document(trc: 'TextRepoClient', document_name: str) -> TRDocument:
     # purge_existing_document(trc, document_name)
     tr_doc = TRDocument(document_name)
     # doc_id = trc.create_document(document_name)
@@ -163,7 +164,7 @@ def add_file(trc, document_name, file_path, type_name):
     return version_info
 
 
-def create_documents(trc: TextRepoClient):
+def create_documents(trc: 'TextRepoClient'):
     tr_docs = []
     for document_name in base_names:
         tr_docs.append(create_document(trc, document_name))
@@ -174,10 +175,12 @@ def store_versions(tr_docs):
     with open("out/tr-versions.csv", "w") as f:
         writer = csv.DictWriter(f, ["external_id", "txt_version", "segmented_version", "conll_version"])
         writer.writeheader()
-        writer.writerows([r.to_dict() for r in tr_docs])
+        writer.writerows([asdict(r) for r in tr_docs])
 
 
-def show_document_urls(trc: TextRepoClient):
+def show_document_urls(trc: 'TextRepoClient'):
+    from icecream import ic
+    from textrepo.client import DocumentIdentifier
     file_types = trc.read_file_types()
     type_ids = {ft.name: ft.id for ft in file_types}
     for document_name in base_names:
@@ -198,6 +201,7 @@ def show_document_urls(trc: TextRepoClient):
 
 
 def check_external_ids(trc):
+    from icecream import ic
     for external_id in ids:
         try:
             m = trc.find_file_metadata(external_id=external_id, type_name="pagexml")
@@ -0,0 +1,108 @@
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from globalise_tools.annorepo_tools import BulkUploader, AdaptiveBatchSize, BatchUploadError
+
+
+class FakeAnnoRepo:
+    """
+    Accepts POST /services/{container}/annotations-batch in a thread, like AnnoRepo, failing on request.
+    """
+
+    def __init__(self):
+        self.received = []
+        self.requests = 0
+        self.fail_next = []  # status codes to answer the next requests with
+        self.reject_index = None  # annotations with this "n" are refused with 400
+        self.max_batch = None  # larger batches are refused with 413
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                annotations = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests += 1
+                    if fake.fail_next:
+                        status = fake.fail_next.pop(0)
+                    elif fake.max_batch and len(annotations) > fake.max_batch:
+                        status = 413
+                    elif any(a["n"] == fake.reject_index for a in annotations):
+                        status = 400
+                    else:
+                        status = 200
+                        fake.received.extend(a["n"] for a in annotations)
+                body = json.dumps([{"annotationName": f"a{a['n']}"} for a in annotations]).encode() \
+                    if status == 200 else b"{}"
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_uri = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class BulkUploaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.annorepo = FakeAnnoRepo()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_path = f"{self.tmp_dir.name}/upload.jsonl"
+        self.annotations = [{"type": "Annotation", "n": n} for n in range(1000)]
+
+    def tearDown(self):
+        self.annorepo.close()
+        self.tmp_dir.cleanup()
+
+    def uploader(self, **kwargs) -> BulkUploader:
+        return BulkUploader(self.annorepo.base_uri, "test", max_in_flight=4, backoff_seconds=0.01,
+                            batch_size=AdaptiveBatchSize(initial=50, minimum=5), journal_path=self.journal_path,
+                            **kwargs)
+
+    def test_retries_and_splits_without_duplicates(self):
+        self.annorepo.fail_next = [503, 502]
+        self.annorepo.max_batch = 60
+        with self.uploader() as uploader:
+            report = uploader.upload(self.annotations)
+        self.assertEqual(list(range(1000)), sorted(self.annorepo.received))
+        self.assertEqual(1000, report.uploaded)
+        self.assertEqual(2, report.retries)
+
+    def test_resume_after_failure(self):
+        self.annorepo.reject_index = 500
+        with self.uploader() as uploader:
+            with self.assertRaises(BatchUploadError):
+                uploader.upload(self.annotations)
+        uploaded_before = len(self.annorepo.received)
+        self.assertNotIn(500, self.annorepo.received)
+
+        self.annorepo.reject_index = None
+        with self.uploader() as uploader:
+            report = uploader.upload(self.annotations)
+        self.assertEqual(uploaded_before, report.skipped)
+        self.assertEqual(list(range(1000)), sorted(self.annorepo.received))
+
+    def test_resume_refuses_other_annotations(self):
+        with self.uploader() as uploader:
+            uploader.upload(self.annotations[:100])
+        other_annotations = [{"type": "Annotation", "n": n, "changed": True} for n in range(1000)]
+        with self.uploader() as uploader:
+            with self.assertRaises(BatchUploadError):
+                uploader.upload(other_annotations)
+        self.assertEqual(list(range(100)), sorted(self.annorepo.received))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import gzip
+import json
+import tempfile
+import unittest
+
+from globalise_tools.annotation_sink import AnnotationSink
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ANNOTATIONS = [
+    {"body": {"id": "urn:globalise:1", "type": "px:Page", "text": "één\ntwee"}, "target": [{"source": "x"}]},
+    {"body": {"id": "urn:globalise:2", "type": "px:Page", "metadata": {}}, "target": []},
+]
+
+
+class AnnotationSinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_same_as_json_dump(self, annotations: list, **kwargs):
+        path = f"{self.tmp_dir.name}/annotations.json"
+        with AnnotationSink(path, **kwargs) as sink:
+            sink.write_all(annotations)
+        with open(path) as f:
+            self.assertEqual(json.dumps(annotations, ensure_ascii=False, **kwargs), f.read())
+
+    def test_json_array_is_the_same_as_json_dump(self):
+        for annotations in (ANNOTATIONS, ANNOTATIONS[:1], []):
+            self.assert_same_as_json_dump(annotations)
+            self.assert_same_as_json_dump(annotations, indent=4)
+
+    def test_gzipped_ndjson(self):
+        path = f"{self.tmp_dir.name}/annotations.jsonl.gz"
+        with AnnotationSink(path, flush_every=1) as sink:
+            sink.write_all(ANNOTATIONS)
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(ANNOTATIONS, [json.loads(line) for line in f])
+        self.assertEqual(2, sink.count)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed (install the zstd extra)")
+    def test_zstd_ndjson(self):
+        path = f"{self.tmp_dir.name}/annotations.jsonl.zst"
+        with AnnotationSink(path) as sink:
+            sink.write_all(ANNOTATIONS)
+        with open(path, "rb") as f:
+            lines = zstandard.ZstdDecompressor().stream_reader(f).read().decode("utf8").splitlines()
+        self.assertEqual(ANNOTATIONS, [json.loads(line) for line in lines])
+
+    def test_array_is_closed_on_error(self):
+        path = f"{self.tmp_dir.name}/annotations.json"
+        with self.assertRaises(KeyError):
+            with AnnotationSink(path) as sink:
+                sink.write(ANNOTATIONS[0])
+                raise KeyError("oops")
+        with open(path) as f:
+            self.assertEqual(ANNOTATIONS[:1], json.load(f))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from globalise_tools.document_data_store import DocumentDataStore
+
+
+class DocumentDataStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp_dir.name}/document_data.json"
+        self.document_data = {
+            "doc1": {"plain_text_source": "source1", "plain_text_md5": "md5-1", "text_intervals": [[0, 4, {}]]},
+            "doc2": {"plain_text_source": "source2", "plain_text_md5": "md5-2", "text_intervals": []}
+        }
+        with open(self.path, "w") as f:
+            json.dump(self.document_data, f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_find_by_md5(self):
+        store = DocumentDataStore(self.path)
+        self.assertEqual(("doc2", self.document_data["doc2"]), store.find_by_md5("md5-2"))
+        self.assertEqual((None, None), store.find_by_md5("md5-3"))
+
+    def test_added_entries_are_indexed(self):
+        store = DocumentDataStore(self.path)
+        store["doc3"] = {"plain_text_source": "source3", "plain_text_md5": "md5-3", "text_intervals": []}
+        self.assertEqual("doc3", store.document_id_for_md5("md5-3"))
+        self.assertEqual(["doc1", "doc2", "doc3"], store.keys())
+        self.assertEqual(["doc3"], list(store.added_items().keys()))
+
+    def test_pickle_keeps_only_additions(self):
+        store = DocumentDataStore(self.path)
+        store["doc3"] = {"plain_text_source": "source3", "plain_text_md5": "md5-3", "text_intervals": []}
+        unpickled = pickle.loads(pickle.dumps(store))
+        self.assertEqual(self.document_data["doc1"], unpickled["doc1"])
+        self.assertEqual("doc3", unpickled.document_id_for_md5("md5-3"))
+
+    def test_take_added_items_and_save(self):
+        store = DocumentDataStore(self.path)
+        store["doc3"] = {"plain_text_source": "source3", "plain_text_md5": "md5-3", "text_intervals": []}
+        added = store.take_added_items()
+        self.assertIsNone(store.document_id_for_md5("md5-3"))
+        merged = DocumentDataStore(self.path)
+        merged.update(added)
+        merged.save()
+        self.assertEqual(("doc3", added["doc3"]), DocumentDataStore(self.path).find_by_md5("md5-3"))
+
+    def test_save_keeps_the_sidecar_files_fresh(self):
+        store = DocumentDataStore(self.path)
+        store["doc3"] = {"plain_text_source": "source3", "plain_text_md5": "md5-3", "text_intervals": []}
+        store.save()
+        self.assertIsNotNone(DocumentDataStore(self.path)._read_index(f"{self.path}.index.json"))
+
+    def test_save_to_another_path(self):
+        store = DocumentDataStore(self.path)
+        store["doc3"] = {"plain_text_source": "source3", "plain_text_md5": "md5-3", "text_intervals": []}
+        out_path = f"{self.tmp_dir.name}/out/document_data.json"
+        store.save(out_path)
+        with open(self.path) as f:
+            self.assertEqual(self.document_data, json.load(f))
+        self.assertEqual("doc3", store.document_id_for_md5("md5-3"))
+        self.assertEqual(["doc1", "doc2", "doc3"], DocumentDataStore(out_path).keys())
+        self.assertIsNotNone(DocumentDataStore(out_path)._read_index(f"{out_path}.index.json"))
+
+    def test_concurrent_builds(self):
+        def build(_):
+            store = DocumentDataStore(self.path)
+            store.prepare()
+            return store["doc1"]
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(build, range(6)))
+        self.assertEqual([self.document_data["doc1"]] * 6, results)
+        self.assertEqual([], [f for f in os.listdir(self.tmp_dir.name) if f.endswith(".tmp")])
+
+
+if __name__ == '__main__':
+    unittest.main()
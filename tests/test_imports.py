@@ -0,0 +1,16 @@
+import subprocess
+import sys
+import unittest
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def test_model_imports_on_its_own(self):
+        # tools imports model, so model must not need tools at import time
+        for module in ("globalise_tools.model", "globalise_tools.tools"):
+            result = subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True, text=True)
+            self.assertEqual(0, result.returncode, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
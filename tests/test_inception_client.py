@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from globalise_tools.inception_client import InceptionClient
+
+
+def api_response(body: any) -> MagicMock:
+    response = MagicMock()
+    response.json.return_value = {"body": body, "messages": []}
+    return response
+
+
+PROJECTS = [{"id": 1, "name": "globalise-2023", "title": "Globalise"},
+            {"id": 2, "name": "test", "title": "Test"}]
+
+
+class InceptionClientCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = InceptionClient(base_uri="http://localhost:8080/", user="user", password="password")
+        self.client.session.get = MagicMock(return_value=api_response(PROJECTS))
+        self.client.session.post = MagicMock(return_value=api_response({"id": 3, "name": "new"}))
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_project_list_is_downloaded_once(self):
+        self.assertEqual(1, self.client.get_project_by_name("globalise-2023").id)
+        self.assertEqual(2, self.client.get_project_by_name("test").id)
+        self.assertEqual(1, self.client.get_project_by_name("globalise-2023").id)
+        self.assertEqual(1, self.client.session.get.call_count)
+
+    def test_create_invalidates_the_cache(self):
+        self.client.get_project_by_name("test")
+        self.client.create_project(name="new")
+        self.client.get_project_by_name("test")
+        self.assertEqual(2, self.client.session.get.call_count)
+
+    def test_unknown_name_reloads(self):
+        self.assertIsNone(self.client.get_project_by_name("unknown"))
+        self.assertEqual(1, self.client.session.get.call_count)
+        self.assertEqual(2, self.client.get_project_by_name("test").id)
+        self.assertEqual(1, self.client.session.get.call_count)
+
+    def test_ttl(self):
+        self.client = InceptionClient(base_uri="http://localhost:8080/", user="user", password="password",
+                                      cache_ttl=60)
+        self.client.session.get = MagicMock(return_value=api_response(PROJECTS))
+        with patch("globalise_tools.inception_client.time.monotonic", return_value=1000.0):
+            self.client.get_project_by_name("test")
+        with patch("globalise_tools.inception_client.time.monotonic", return_value=1030.0):
+            self.client.get_project_by_name("test")
+        self.assertEqual(1, self.client.session.get.call_count)
+        with patch("globalise_tools.inception_client.time.monotonic", return_value=1061.0):
+            self.client.get_project_by_name("test")
+        self.assertEqual(2, self.client.session.get.call_count)
+
+    def test_document_lookup_uses_the_uploaded_name(self):
+        self.client.session.get = MagicMock(return_value=api_response(
+            [{"id": 10, "name": "NL-HaNA_1.04.02_1234 - 1650 - a title", "state": "NEW"}]))
+        document = self.client.get_project_document_by_name(1, "NL-HaNA_1.04.02_1234 - 1650 - a title?")
+        self.assertEqual(10, document.id)
+        self.client.get_project_document_by_name(1, "NL-HaNA_1.04.02_1234 - 1650 - a title")
+        self.assertEqual(1, self.client.session.get.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
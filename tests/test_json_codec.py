@@ -0,0 +1,73 @@
+import json
+import random
+import unittest
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple
+
+from globalise_tools import json_codec
+from globalise_tools.json_codec import encode
+
+NO_ORJSON = "orjson is not installed (install the fast-json extra), so encode() only uses json"
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Interval(NamedTuple):
+    begin: int
+    end: int
+    data: dict
+
+
+def default(obj):
+    if isinstance(obj, Point):
+        return [obj.x, obj.y]
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+
+
+DOCUMENTS = [
+    {"id": "urn:globalise:annotation:4e5f0d2c-1e3a-4b5c-9d7e-8f9a0b1c2d3e", "text": "één \x01\x7f 😀 \"\\\n\t",
+     "coords": Point(1, 2), "when": datetime(2024, 1, 2, 3, 4, 5), "empty": [{}, []], "n": [0, -1, 2.5, True, None]},
+    {"values": [1e16, 1e-7, 2.5e300], "text": "1e16"},
+    {1: "non-str key", "big": 2 ** 70},
+    {"conf": 5e-05, "values": [-1.5e-05, 9.99e-05, 0.0001, 10.00001, 0.0], "text": "0.00005"},
+    {"text": "x\x7fy"},
+    {"intervals": [Interval(1, 2, {"x": 1})], "pair": (1, 2)},
+    [],
+]
+
+
+class EncodeTestCase(unittest.TestCase):
+    @unittest.skipIf(json_codec.orjson is None, NO_ORJSON)
+    def test_same_as_json_dumps(self):
+        layouts = [
+            dict(),
+            dict(indent=2),
+            dict(indent=4),
+            dict(separators=(",", ":")),
+        ]
+        for document in DOCUMENTS:
+            for layout in layouts:
+                for ensure_ascii in (True, False):
+                    expected = json.dumps(document, default=default, ensure_ascii=ensure_ascii, **layout)
+                    self.assertEqual(expected, encode(document, default=default, ensure_ascii=ensure_ascii, **layout))
+
+    @unittest.skipIf(json_codec.orjson is None, NO_ORJSON)
+    def test_random_floats(self):
+        rnd = random.Random(42)
+        values = [rnd.uniform(-1, 1) * 10 ** rnd.randint(-8, 20) for _ in range(20000)]
+        for layout in (dict(indent=2), dict(separators=(",", ":"))):
+            self.assertEqual(json.dumps(values, **layout), encode(values, **layout))
+
+    def test_unknown_types_are_left_to_default(self):
+        with self.assertRaises(TypeError):
+            encode({"x": object()}, indent=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
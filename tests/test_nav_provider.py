@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from globalise_tools.nav_provider import NavProvider, write_nav_index
+
+
+class NavProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp_dir.name}/page_nav_idx.sqlite"
+        inventories = []
+        for inv_nr in ["1234", "5678"]:
+            pagexml_ids = [f"NL-HaNA_1.04.02_{inv_nr}_{i:04d}" for i in range(1, 4)]
+            prev_next_idx = {
+                pagexml_ids[0]: {'next': pagexml_ids[1]},
+                pagexml_ids[1]: {'prev': pagexml_ids[0], 'next': pagexml_ids[2]},
+                pagexml_ids[2]: {'prev': pagexml_ids[1]},
+            }
+            inventories.append((inv_nr, pagexml_ids, prev_next_idx))
+        write_nav_index(inventories, self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_nav_fields_across_inventories(self):
+        nav_provider = NavProvider(self.path)
+        self.assertEqual({'prevPageId': 'urn:globalise:NL-HaNA_1.04.02_5678_0001',
+                          'nextPageId': 'urn:globalise:NL-HaNA_1.04.02_5678_0003'},
+                         nav_provider.nav_fields("NL-HaNA_1.04.02_5678_0002"))
+        self.assertEqual({'nextPageId': 'urn:globalise:NL-HaNA_1.04.02_1234_0002'},
+                         nav_provider.nav_fields("NL-HaNA_1.04.02_1234_0001"))
+        self.assertEqual(3, nav_provider.page_number("NL-HaNA_1.04.02_1234_0003"))
+
+    def test_unknown_page_is_deduced(self):
+        nav_provider = NavProvider(self.path)
+        self.assertEqual({'prevPageId': 'urn:globalise:NL-HaNA_1.04.02_1234_0009',
+                          'nextPageId': 'urn:globalise:NL-HaNA_1.04.02_1234_0011'},
+                         nav_provider.nav_fields("NL-HaNA_1.04.02_1234_0010"))
+
+    def test_no_tmp_file_is_left(self):
+        self.assertEqual(["page_nav_idx.sqlite"], os.listdir(self.tmp_dir.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from globalise_tools.pagexml_cache import PageXMLCache
+
+
+class PageXMLCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = PageXMLCache(cache_dir=f"{self.tmp_dir.name}/cache")
+        self.pagexml_path = self._write_file("page.xml", "<PcGts/>")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get(self.pagexml_path))
+        self.cache.put(self.pagexml_path, {"id": "page"})
+        self.assertEqual({"id": "page"}, self.cache.get(self.pagexml_path))
+
+    def test_changed_file_misses(self):
+        self.cache.put(self.pagexml_path, {"id": "page"})
+        os.utime(self.pagexml_path, ns=(0, 0))
+        self.assertIsNone(self.cache.get(self.pagexml_path))
+
+    def test_prune_removes_least_recently_used(self):
+        other_path = self._write_file("other.xml", "<PcGts></PcGts>")
+        self.cache.put(self.pagexml_path, "x" * 1000)
+        self.cache.put(other_path, "y" * 1000)
+        for entry_path in self.cache.entry_paths():
+            os.utime(entry_path, (1, 1))
+        self.cache.get(self.pagexml_path)
+        removed, _ = self.cache.prune(max_size=self.cache.size() - 1)
+        self.assertEqual(1, removed)
+        self.assertIsNotNone(self.cache.get(self.pagexml_path))
+        self.assertIsNone(self.cache.get(other_path))
+
+    def _write_file(self, name: str, contents: str) -> str:
+        path = f"{self.tmp_dir.name}/{name}"
+        with open(path, "w") as f:
+            f.write(contents)
+        return path
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from globalise_tools.run_state import RunState
+
+
+class RunStateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp_dir.name}/processed.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume(self):
+        with RunState(self.path) as state:
+            state.mark_done("a")
+            state["b"] = {"errors": []}
+            state["b"] = {"errors": ["oops"]}
+        resumed = RunState(self.path)
+        self.assertTrue(resumed.is_done("a"))
+        self.assertEqual({"errors": ["oops"]}, resumed["b"])
+        self.assertNotIn("c", resumed)
+        self.assertEqual(2, len(resumed))
+
+    def test_incomplete_last_line_is_dropped(self):
+        with RunState(self.path) as state:
+            state.mark_done("a")
+        with open(self.path, "a") as f:
+            f.write('{"key": "b", "val')
+        with RunState(self.path) as state:
+            self.assertEqual(["a"], list(state.keys()))
+            state.mark_done("c")
+        self.assertEqual(["a", "c"], list(RunState(self.path).keys()))
+
+    def test_legacy_json_is_imported(self):
+        legacy_path = f"{self.tmp_dir.name}/processed.json"
+        with open(legacy_path, "w") as f:
+            json.dump(["a", "b"], f)
+        state = RunState(self.path, legacy_path=legacy_path)
+        self.assertEqual(["a", "b"], list(state.keys()))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_remove(self):
+        with RunState(self.path) as state:
+            state.mark_done("a")
+            state.mark_done("b")
+            state.remove("a")
+            state.remove("c")
+        self.assertEqual(["b"], list(RunState(self.path).keys()))
+        self.assertEqual([], list(RunState(self.path, truncate=True).keys()))
+
+    def test_compact_and_snapshot(self):
+        with RunState(self.path) as state:
+            for i in range(3):
+                state["a"] = i
+            state.compact()
+            state.mark_done("b")
+            snapshot_path = f"{self.tmp_dir.name}/processed.json"
+            state.write_snapshot(snapshot_path, keys_only=True)
+        with open(self.path) as f:
+            self.assertEqual(2, len(f.readlines()))
+        with open(snapshot_path) as f:
+            self.assertEqual(["a", "b"], json.load(f))
+
+
+if __name__ == '__main__':
+    unittest.main()
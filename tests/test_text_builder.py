@@ -0,0 +1,25 @@
+import unittest
+
+from globalise_tools.text_builder import TextBuilder
+
+
+class TextBuilderTestCase(unittest.TestCase):
+    def test_append_returns_offsets(self):
+        builder = TextBuilder()
+        self.assertEqual((0, 5), builder.append("Batav"))
+        self.assertEqual((5, 5), builder.append(""))
+        self.assertEqual((5, 6), builder.append("\n"))
+        self.assertEqual((6, 9), builder.append("ia."))
+        self.assertEqual(9, len(builder))
+        self.assertEqual("Batav\nia.", builder.build())
+
+    def test_append_after_build(self):
+        builder = TextBuilder()
+        builder.extend(["a", "b"])
+        self.assertEqual("ab", builder.build())
+        self.assertEqual((2, 3), builder.append("c"))
+        self.assertEqual("abc", str(builder))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import MagicMock
+
+import globalise_tools.textrepo_tools as tt
+
+
+class MetadataChangesTestCase(unittest.TestCase):
+
+    def test_only_changed_values_are_written(self):
+        current = {'inventory_number': '1234', 'scan_range': '1-10', 'obsolete': 'x'}
+        wanted = {'inventory_number': '1234', 'scan_range': '1-12', 'no_of_scans': 12, 'title': None}
+        self.assertEqual({'scan_range': '1-12', 'no_of_scans': '12'}, tt.metadata_changes(current, wanted))
+
+    def test_existing_document(self):
+        client = MagicMock()
+        document_identifier = MagicMock(id='doc-1')
+        client.read_document_by_external_id.return_value = document_identifier
+        client.read_document_metadata.return_value = {'inventory_number': '1234', 'scan_start': '0001'}
+        result = tt.create_or_update_document(client, 'NL-HaNA_1.04.02_1234',
+                                              {'inventory_number': '1234', 'scan_start': '0002', 'scan_end': '0009'})
+        self.assertEqual(document_identifier, result)
+        client.create_document.assert_not_called()
+        written = sorted((c.kwargs['key'], c.kwargs['value']) for c in client.set_document_metadata.call_args_list)
+        self.assertEqual([('scan_end', '0009'), ('scan_start', '0002')], written)
+
+    def test_new_document(self):
+        client = MagicMock()
+        client.read_document_by_external_id.return_value = None
+        client.create_document.return_value = MagicMock(id='doc-2')
+        tt.create_or_update_document(client, 'NL-HaNA_1.04.02_1234', {'inventory_number': '1234'})
+        client.read_document_metadata.assert_not_called()
+        client.set_document_metadata.assert_called_once_with(document_id='doc-2', key='inventory_number',
+                                                             value='1234')
+
+    def test_map_concurrently_keeps_the_order(self):
+        self.assertEqual([i * i for i in range(50)], tt.map_concurrently(lambda i: i * i, range(50)))
+
+
+if __name__ == '__main__':
+    unittest.main()
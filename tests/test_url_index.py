@@ -0,0 +1,48 @@
+import json
+import pickle
+import tempfile
+import unittest
+
+from globalise_tools.url_index import UrlIndex, write_url_index, read_url_mapping, index_path_for
+
+
+class UrlIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp_dir.name}/scan_url_mapping.idx"
+        self.mapping = {
+            f"NL-HaNA_1.04.02_{inv_nr}_{page:04d}": f"https://example.org/iiif/{inv_nr}/{page}.jp2"
+            for inv_nr in [1053, 7922, 1] for page in range(1, 20)
+        }
+        self.mapping["NL-HaNA_1.04.02_1_ü"] = "https://example.org/iiif/ü.jp2"
+        write_url_index(self.mapping, self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self):
+        url_index = UrlIndex(self.path)
+        self.assertEqual(len(self.mapping), len(url_index))
+        for k, v in self.mapping.items():
+            self.assertEqual(v, url_index[k])
+        self.assertNotIn("NL-HaNA_1.04.02_1053_0000", url_index)
+        self.assertIsNone(url_index.get("NL-HaNA_1.04.02_9999_0001"))
+        self.assertEqual(self.mapping, dict(url_index.items()))
+
+    def test_pickled_index_maps_the_file_itself(self):
+        url_index = UrlIndex(self.path)
+        url_index.get("x")
+        unpickled = pickle.loads(pickle.dumps(url_index))
+        self.assertEqual(self.mapping["NL-HaNA_1.04.02_7922_0003"], unpickled["NL-HaNA_1.04.02_7922_0003"])
+
+    def test_read_url_mapping_prefers_index(self):
+        json_path = f"{self.tmp_dir.name}/scan_url_mapping.json"
+        with open(json_path, "w") as f:
+            json.dump(self.mapping, f)
+        self.assertIsInstance(read_url_mapping(json_path), dict)
+        write_url_index(self.mapping, index_path_for(json_path))
+        self.assertIsInstance(read_url_mapping(json_path), UrlIndex)
+
+
+if __name__ == '__main__':
+    unittest.main()
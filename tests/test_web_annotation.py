@@ -0,0 +1,41 @@
+import unittest
+
+from globalise_tools.model import WebAnnotation, configure_web_annotations, dumps
+
+
+def web_annotation(n: int) -> WebAnnotation:
+    return WebAnnotation(body={"id": f"urn:globalise:test:{n}", "type": "px:TextLine"},
+                         target=[{"source": "https://example.org/contents", "type": "Text"}])
+
+
+class WebAnnotationTestCase(unittest.TestCase):
+    def tearDown(self):
+        configure_web_annotations()
+
+    def test_uuid5_ids_are_reproducible(self):
+        configure_web_annotations(id_strategy="uuid5", generated="2024-01-01T00:00:00")
+        first_run = dumps([web_annotation(1), web_annotation(2)])
+        configure_web_annotations(id_strategy="uuid5", generated="2024-01-01T00:00:00")
+        second_run = dumps([web_annotation(1), web_annotation(2)])
+        self.assertEqual(first_run, second_run)
+        self.assertNotEqual(web_annotation(1).wrapped()["id"], web_annotation(2).wrapped()["id"])
+
+    def test_counter_ids(self):
+        configure_web_annotations(id_strategy="counter")
+        ids = [web_annotation(1).wrapped()["id"] for _ in range(3)]
+        self.assertEqual(["urn:globalise:annotation:1", "urn:globalise:annotation:2", "urn:globalise:annotation:3"],
+                         ids)
+
+    def test_generated_is_fixed_per_run(self):
+        configure_web_annotations()
+        wrapped = [web_annotation(n).wrapped() for n in range(3)]
+        self.assertEqual(1, len({w["generated"] for w in wrapped}))
+        self.assertEqual(3, len({w["id"] for w in wrapped}))
+
+    def test_unknown_id_strategy(self):
+        with self.assertRaises(ValueError):
+            configure_web_annotations(id_strategy="uuid1")
+
+
+if __name__ == '__main__':
+    unittest.main()
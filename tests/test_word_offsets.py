@@ -0,0 +1,75 @@
+import json
+import tempfile
+import unittest
+
+import globalise_tools.word_offsets as wo
+from globalise_tools.word_offsets import WordOffsets, WordOffsetsWriter, load_word_offsets
+
+
+def word_data(coords):
+    return {"iiif_base_uri": "iiif", "canvas_id": "canvas", "coords": coords}
+
+
+class WordOffsetsTestCase(unittest.TestCase):
+    def setUp(self):
+        # "Den 3 Julij"
+        self.word_offsets = WordOffsets()
+        self.word_offsets.append(0, 3, [[0, 0]], "iiif", "canvas")
+        self.word_offsets.append(4, 5, [[1, 1]], "iiif", "canvas")
+        self.word_offsets.append(6, 11, [[2, 2]], "iiif", "canvas")
+
+    def test_overlap(self):
+        self.assertEqual([(4, 5, word_data([(1, 1)]))], self.word_offsets[4:5])
+        self.assertEqual([0, 4], [iv.begin for iv in self.word_offsets[2:5]])
+        self.assertEqual([0, 4, 6], [iv.begin for iv in self.word_offsets[0:100]])
+        self.assertEqual([], self.word_offsets[3:4])
+        self.assertEqual([], self.word_offsets[5:5])
+        self.assertEqual([6], [iv.begin for iv in self.word_offsets[10]])
+
+    def test_round_trip_through_text_intervals(self):
+        text_intervals = json.loads(json.dumps(list(self.word_offsets)))
+        reloaded = WordOffsets.from_intervals(reversed(text_intervals))
+        self.assertEqual(list(self.word_offsets), list(reloaded))
+
+    def test_round_trip_through_bytes(self):
+        reloaded = WordOffsets.from_buffer(self.word_offsets.to_bytes())
+        self.assertEqual(list(self.word_offsets), list(reloaded))
+        self.assertEqual([(4, 5, word_data([(1, 1)]))], reloaded[4:5])
+
+    def test_writer_appends_and_reuses_unchanged_blobs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = f"{tmp_dir}/text_intervals/inv.bin"
+            with WordOffsetsWriter(path) as writer:
+                ref = writer.write(self.word_offsets)
+                self.assertEqual(ref, writer.write(self.word_offsets, ref))
+                other = WordOffsets.from_intervals([(0, 2, word_data([[5, 5]]))])
+                other_ref = writer.write(other, ref)
+            self.assertNotEqual(ref, other_ref)
+            self.assertEqual(list(self.word_offsets), list(load_word_offsets({"text_intervals_ref": ref})))
+            self.assertEqual(list(other), list(load_word_offsets({"text_intervals_ref": other_ref})))
+
+    def test_mapped_files_are_released(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i in range(3 * wo.MAX_MAPPED_FILES):
+                with WordOffsetsWriter(f"{tmp_dir}/text_intervals/{i}.bin") as writer:
+                    ref = writer.write(self.word_offsets)
+                self.assertEqual(list(self.word_offsets), list(load_word_offsets({"text_intervals_ref": ref})))
+                self.assertLessEqual(len(wo._mmaps), wo.MAX_MAPPED_FILES)
+            wo.close_mapped_files()
+            self.assertEqual(0, len(wo._mmaps))
+
+    def test_load_inline_text_intervals(self):
+        entry = {"text_intervals": [[0, 3, word_data([[0, 0]])]]}
+        self.assertEqual([(0, 3, word_data([(0, 0)]))], list(load_word_offsets(entry)))
+
+    def test_nested_intervals(self):
+        word_offsets = WordOffsets.from_intervals([(0, 10, word_data([])), (2, 3, word_data([])), (5, 6, word_data([]))])
+        self.assertEqual([(0, 10), (5, 6)], [(iv.begin, iv.end) for iv in word_offsets[4:6]])
+
+    def test_append_out_of_order(self):
+        with self.assertRaises(ValueError):
+            self.word_offsets.append(1, 2, [], "iiif", "canvas")
+
+
+if __name__ == '__main__':
+    unittest.main()